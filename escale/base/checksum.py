@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import hashlib
+import time
+import os
+from escale.base.essential import asbytes, asstr
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# hash algorithms that clients older than 0.7.14 can also handle;
+# the corresponding checksums are written untagged in the placeholders
+# and indices, for backward compatibility
+legacy_algorithms = ['md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512']
+
+# hexadecimal digest length -> legacy algorithm
+_legacy_digest_length = dict(md5=32, sha1=40, sha224=56, sha256=64, sha384=96, sha512=128)
+_legacy_digest_length = { n: a for a, n in _legacy_digest_length.items() }
+
+default_algorithm = 'sha512'
+
+# non-legacy algorithms; checksums are tagged
+fast_algorithms = ['xxh3', 'xxh128', 'blake2b', 'blake2s']
+
+# clients older than 0.7.14 fail to parse meta attributes with more than
+# one colon; the tag separator therefore cannot be ':'
+__tag_separator__ = '$'
+
+_known_digests = dict(
+    sha256='9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08',
+    sha512='ee26b0dd4af7e749aa1a8ee3c10ae9923f618980772e473f8819a5d4940e0db27ac185f8a0e1d5f84f88bc887fd67b143732c304cc5fa9ad8e6f57f50028a8ff',
+    blake2b='a71079d42853dea26e453004338670a53814b78137ffbed07603a41d76a483aa9bc33b582f77d30a65e6f29a896c0411f38312e1d66e0bf16386c86a89bea572',
+    blake2s='f308fc02ce9172ad02a7d75800ecfc027109bc67987ea32aba9b8dcc7b10150e',
+    )
+
+_xxhash_algorithms = dict(xxh3='xxh3_64', xxh64='xxh64', xxh128='xxh3_128')
+
+
+def new_hash(algorithm):
+    """
+    Make a hash object.
+
+    Arguments:
+
+        algorithm (str): algorithm name, as supported by :func:`hashlib.new`
+            or *xxh3*, *xxh64* or *xxh128* if the :mod:`xxhash` library
+            is installed.
+
+    Returns:
+
+        hash object with `update` and `hexdigest` methods.
+
+    Raises:
+
+        ValueError: if the algorithm is not available.
+    """
+    try:
+        constructor = _xxhash_algorithms[algorithm]
+    except KeyError:
+        return hashlib.new(algorithm)
+    if xxhash is None:
+        raise ValueError("the 'xxhash' library is required for algorithm '{}'".format(algorithm))
+    return getattr(xxhash, constructor)()
+
+
+def available_algorithms():
+    """
+    List the hash algorithms available on this machine.
+    """
+    available = set(hashlib.algorithms_available)
+    if xxhash is not None:
+        available |= set(_xxhash_algorithms)
+    return available
+
+
+def is_available(algorithm):
+    try:
+        new_hash(algorithm)
+    except (ValueError, TypeError):
+        return False
+    else:
+        return True
+
+
+def tag_checksum(algorithm, digest):
+    """
+    Prepend the algorithm name to an hexadecimal digest, except for
+    legacy algorithms.
+    """
+    if algorithm in legacy_algorithms:
+        return digest
+    else:
+        return __tag_separator__.join((algorithm, digest))
+
+
+def split_checksum(checksum):
+    """
+    Split a checksum into algorithm name and hexadecimal digest.
+
+    Untagged checksums are assumed to be generated by a legacy algorithm,
+    identified by the length of the digest.
+    The algorithm is ``None`` if it cannot be determined.
+    """
+    checksum = asstr(checksum)
+    try:
+        algorithm, digest = checksum.split(__tag_separator__, 1)
+    except ValueError:
+        digest = checksum
+        algorithm = _legacy_digest_length.get(len(digest), None)
+    return algorithm, digest
+
+
+def checksum_algorithm(checksum):
+    """
+    Hash algorithm a checksum has been generated with, or ``None``.
+    """
+    return split_checksum(checksum)[0]
+
+
+def hash_file(path, algorithm, blocksize=1048576):
+    """
+    Calculate the tagged checksum of the content of a file.
+
+    The file is read chunk by chunk.
+    """
+    h = new_hash(algorithm)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(blocksize)
+            if not chunk:
+                break
+            h.update(chunk)
+    return tag_checksum(algorithm, h.hexdigest())
+
+
+class HashFunction(object):
+    """
+    Callable that returns tagged checksums.
+
+    Attributes:
+
+        algorithm (str): hash algorithm name.
+
+        blocksize (int): size of chunks read from files, in bytes.
+
+    """
+    __slots__ = ['algorithm', 'blocksize']
+
+    def __init__(self, algorithm=default_algorithm, blocksize=1048576):
+        new_hash(algorithm) # raises ValueError if not supported
+        self.algorithm = algorithm
+        self.blocksize = blocksize
+
+    def __call__(self, data):
+        h = new_hash(self.algorithm)
+        h.update(asbytes(data))
+        return tag_checksum(self.algorithm, h.hexdigest())
+
+    def file(self, path):
+        return hash_file(path, self.algorithm, self.blocksize)
+
+    def compatible(self, checksum):
+        """
+        Tell whether `checksum` was generated with the same algorithm.
+        """
+        return checksum_algorithm(checksum) == self.algorithm
+
+    def selftest(self):
+        try:
+            digest = _known_digests[self.algorithm]
+        except KeyError:
+            return True
+        return self('test') == tag_checksum(self.algorithm, digest)
+
+
+def hash_throughput(algorithms=None, size=67108864, repeat=3, blocksize=1048576):
+    """
+    Measure the throughput of hash algorithms on random data.
+
+    Arguments:
+
+        algorithms (list): algorithm names; default to the legacy
+            algorithms 'sha256' and 'sha512' and the available fast algorithms.
+
+        size (int): amount of data to be hashed per measurement, in bytes.
+
+        repeat (int): number of measurements; the best one is kept.
+
+        blocksize (int): size of the chunks passed to the hash object.
+
+    Returns:
+
+        dict: throughput in bytes per second for each algorithm name.
+    """
+    if not algorithms:
+        algorithms = ['sha256', 'sha512'] + \
+            [ a for a in fast_algorithms if is_available(a) ]
+    block = os.urandom(blocksize)
+    nblocks = max(1, size // blocksize)
+    throughput = {}
+    for algorithm in algorithms:
+        best = None
+        for _ in range(repeat):
+            h = new_hash(algorithm)
+            t0 = time.time()
+            for _ in range(nblocks):
+                h.update(block)
+            h.hexdigest()
+            t = time.time() - t0
+            if best is None or t < best:
+                best = t
+        throughput[algorithm] = nblocks * blocksize / max(best, 1e-9)
+    return throughput
+
@@ -97,6 +97,18 @@ default_cache_dirs = { user_cfg_dir: user_cache_dir,
 # 'pulloverwrite' added in version 0.7.6
 # 'verbosity' added in version 0.7.6
 # 'allow_page_deletion' added in version 0.7.7
+# 'engine' and 'concurrency' added in version 0.7.14
+# 'localwatch', 'remotewatch' and 'idlerefresh' added in version 0.7.14
+# 'changeprobe' added in version 0.7.14
+# 'maxconnections' added in version 0.7.14
+# 'manifest' and 'manifestcompat' added in version 0.7.14
+# 'placeholdercache' and 'metadataconcurrency' added in version 0.7.14
+# 'statsinterval', 'statsfile' and 'profile' added in version 0.7.14
+# 'simulate*' added in version 0.7.14
+# 'uploadrate' and 'downloadrate' added in version 0.7.14
+# 'transferorder', 'directorypriority' and 'transferdeadline' added in version 0.7.14
+# 'resumetransfers' and 'partsize' added in version 0.7.14
+# 'downloadsegments' added in version 0.7.14
 fields = dict(
     path=('path', ['local path', 'path']),
     address=['host address', 'relay address', 'remote address', 'address'],
@@ -138,11 +150,48 @@ fields = dict(
     pulloverwrite=('bool', ['pull overwrite']),
     verbosity=('int', ['verbosity', 'verbosity level']),
     allow_page_deletion=('bool', ['allow page deletion', 'page deletion']),
+    engine=('str', ['engine', 'synchronization engine']),
+    concurrency=('int', ['concurrency', 'max concurrent files']),
+    localwatch=(('bool', 'float'), ['watch local changes', 'local watch']),
+    remotewatch=(('bool', 'float'), ['watch remote changes', 'remote watch']),
+    idlerefresh=('float', ['idle refresh', 'max idle refresh']),
+    changeprobe=(('bool', 'int'), ['change probe', 'max listing age']),
+    maxconnections=('int', ['max connections']),
+    manifest=(('bool', 'int'), ['manifest', 'manifest mode', 'batch size']),
+    manifestcompat=('bool', ['manifest compatibility', 'legacy placeholders']),
+    placeholdercache=(('bool', 'path'), ['placeholder cache']),
+    metadataconcurrency=('int', ['metadata concurrency', 'prefetch concurrency']),
+    statsinterval=('int', ['stats interval', 'statistics interval']),
+    statsfile=(('bool', 'path'), ['stats file', 'statistics file']),
+    profile=(('bool', 'str'), ['profile', 'profiling']),
+    simulatelatency=('float', ['simulate latency']),
+    simulatebandwidth=('number_unit', ['simulate bandwidth']),
+    simulateerrors=('float', ['simulate errors', 'simulate error rate']),
+    simulateerrorcodes=('list', ['simulate error codes']),
+    simulatelistingdelay=('float', ['simulate listing delay']),
+    simulateseed=('int', ['simulate seed']),
+    uploadrate=('number_unit', ['upload rate', 'max upload rate']),
+    downloadrate=('number_unit', ['download rate', 'max download rate']),
+    transferorder=('list', ['transfer order', 'transfer priority']),
+    directorypriority=('list', ['directory priority', 'directory priorities']),
+    transferdeadline=('list', ['transfer deadline', 'transfer deadlines']),
+    resumetransfers=(('bool', 'path'), ['resume transfers', 'resumable transfers']),
+    partsize=('number_unit', ['part size']),
+    downloadsegments=('int', ['download segments', 'segmented download']),
     )
 
 # new in 0.7.12
 global_fields = dict(
     keepalive=(('bool', 'int'), ['keep alive']),
+    # 'multiplex', 'maxconcurrentsections' and 'bandwidth' added in version 0.7.14
+    multiplex=('bool', ['multiplex', 'single process']),
+    maxconcurrentsections=('int', ['max concurrent sections']),
+    bandwidth=('number_unit', ['bandwidth', 'bandwidth limit']),
+    # 'uploadbandwidth' and 'downloadbandwidth' added in version 0.7.14
+    uploadbandwidth=('number_unit', ['upload bandwidth']),
+    downloadbandwidth=('number_unit', ['download bandwidth']),
+    # 'metrics' added in version 0.7.14
+    metrics=(('int', 'str'), ['metrics', 'metrics endpoint']),
     )
 
 
@@ -24,7 +24,9 @@ import traceback
 
 from .exceptions import *
 from .essential import *
-from .config import parse_cfg, default_section, global_fields
+from .config import parse_cfg, default_section, global_fields, storage_space_unit
+from .timer import TokenBucket
+from .metrics import Metrics, MetricsServer, metrics_address
 from escale.log import *
 # separate imports instead of single escale.manager
 # single import breaks Sphinx
@@ -33,11 +35,15 @@ from escale.manager.manager import Manager
 from escale.manager.index import IndexManager
 from escale.manager.access import AccessController, access_modifier_prefix
 from escale.manager.history import History, usage_statistics_prefix
-from escale.manager.cache import checksum_cache_prefix
+from escale.manager.cache import checksum_cache_prefix, placeholder_cache_prefix
+from escale.manager.stats import stats_file_prefix, profile_file_prefix
+from escale.relay.shaping import make_shaper
+from escale.relay.parts import part_store_prefix
 from escale.cli.controller import DirectController, UIController
 
 
-def make_client(config, repository, log_handler=None, ui_connector=None):
+def make_client(config, repository, log_handler=None, ui_connector=None,
+        bandwidth=None, share_connections=False, metrics=None):
     """
     Initialize an escale client.
     
@@ -53,10 +59,20 @@ def make_client(config, repository, log_handler=None, ui_connector=None):
 
         ui_connector (tuple): arguments passed to :class:`UIController`.
 
+        bandwidth (dict): shared bandwidth budgets; see :func:`bandwidth_buckets`.
+
+        share_connections (bool): let the relays share their connections
+            with the other clients in the same process.
+
+        metrics (escale.base.metrics.Metrics or bool): statistics of the clients
+            in the same process, or ``True`` if the client runs in a subprocess
+            and reports to the parent `ui_connector`.
+
     Returns:
 
         escale.manager.Manager or escale.manager.index.IndexManager: client manager.
 
+    *new in 0.7.14:* `bandwidth`, `share_connections` and `metrics`
     """
     # set logger
     logger = logging.getLogger(log_root).getChild(repository)
@@ -77,11 +93,18 @@ def make_client(config, repository, log_handler=None, ui_connector=None):
     # ui
     if ui_connector is None:
         ui_controller = DirectController(logger=logger)
+        if metrics is not None and metrics is not True:
+            ui_controller.metrics = metrics
     else:
         ui_controller = UIController(*ui_connector)
         ui_controller.logger = logger
     # parse config
     relay, args = parse_section(config, repository, logger)
+    for field in global_fields:
+        if field != 'keepalive':
+            args.pop(field, None)
+    if share_connections:
+        args['share_connections'] = True
     # local repository
     path = args.pop('path', None)
     mode = args.pop('mode', None)
@@ -101,24 +124,90 @@ def make_client(config, repository, log_handler=None, ui_connector=None):
     if isinstance(checksum_cache, bool) and checksum_cache:
         checksum_cache = get_cache_file(config, repository,
                 prefix=checksum_cache_prefix)
+    # placeholder cache
+    placeholder_cache = args.pop('placeholdercache', True)
+    if isinstance(placeholder_cache, bool) and placeholder_cache:
+        placeholder_cache = get_cache_file(config, repository,
+                prefix=placeholder_cache_prefix)
+    # progress of the transfers of large files
+    part_store = args.pop('resumetransfers', True)
+    if isinstance(part_store, bool) and part_store:
+        part_store = get_cache_file(config, repository,
+                prefix=part_store_prefix)
+    # statistics and profiles
+    stats_file = args.pop('statsfile', True)
+    if isinstance(stats_file, bool):
+        if stats_file:
+            stats_file = get_cache_file(config, repository,
+                    prefix=stats_file_prefix)
+        else:
+            stats_file = None
+    if args.get('profile'):
+        profile_file = get_cache_file(config, repository,
+                prefix=profile_file_prefix)
+    else:
+        profile_file = None
+    # bandwidth limits
+    shaper = make_shaper(bandwidth,
+            upload_rate=bandwidth_limit(args.pop('uploadrate', None)),
+            download_rate=bandwidth_limit(args.pop('downloadrate', None)))
     # extra UI options
     ui_controller.maintainer = args.pop('maintainer', None)
     # ready
     index = args.pop('index', False)
+    engine = args.pop('engine', None)
     if index:
         Mngr = IndexManager
+        if engine and engine != 'sync':
+            logger.warning("engine '%s' is not supported with indexing", engine)
+        args.pop('concurrency', None)
+    elif engine in ['async', 'asyncio']:
+        if PYTHON_VERSION == 2:
+            raise ValueError("engine '{}' requires Python 3".format(engine))
+        from escale.manager.asynchronous import AsyncManager
+        Mngr = AsyncManager
     else:
+        if engine and engine != 'sync':
+            logger.warning("unsupported engine: '%s'", engine)
+        args.pop('concurrency', None)
         Mngr = Manager
     manager = Mngr(relay,
             repository=lr_controller,
             ui_controller=ui_controller,
             tq_controller=tq_controller,
             checksum_cache=checksum_cache,
+            placeholder_cache=placeholder_cache,
+            part_store=part_store,
+            stats_file=stats_file,
+            profile_file=profile_file,
+            report_stats=bool(metrics),
+            shaper=shaper,
             **args)
     return manager
 
 
-def escale(config, repository, log_handler=None, ui_connector=None):
+def on_wakeup(callback):
+    """
+    Call `callback` whenever the process receives the SIGUSR1 signal
+    (see also ``escalectl wakeup``).
+
+    Has no effect on platforms without SIGUSR1 or if not called from the
+    main thread.
+
+    *new in 0.7.14*
+    """
+    import signal
+    def handler(signum, frame):
+        # not in the signal handler, that may interrupt a lock owner
+        threading.Thread(target=callback).start()
+    try:
+        signal.signal(signal.SIGUSR1, handler)
+    except (AttributeError, ValueError):
+        pass
+
+
+def escale(config, repository, log_handler=None, ui_connector=None, metrics=None,
+        bandwidth=None):
     """
     Read the section related to a repository in a loaded configuration object and runs a 
     :class:`~escale.manager.Manager` for that repository.
@@ -132,8 +221,16 @@ def escale(config, repository, log_handler=None, ui_connector=None):
         log_handler (log handler): input argument to :meth:`~logging.Logger.addHandler`.
 
         ui_connector (any): connector to user-interface controller.
+
+        metrics (escale.base.metrics.Metrics or bool): see :func:`make_client`.
+
+        bandwidth (dict): see :func:`make_client`.
+
+    *changed in 0.7.14:* `metrics` and `bandwidth` arguments
     """
-    manager = make_client(config, repository, log_handler=log_handler, ui_connector=ui_connector)
+    manager = make_client(config, repository, log_handler=log_handler,
+            ui_connector=ui_connector, metrics=metrics, bandwidth=bandwidth)
+    on_wakeup(manager.tq_controller.notify)
     try:
         result = manager.run()
     except ExpressInterrupt as exc:
@@ -144,6 +241,95 @@ def escale(config, repository, log_handler=None, ui_connector=None):
         manager.ui_controller.success(repository, type(result), result)
 
 
+def bandwidth_limit(value):
+    """
+    Convert a `bandwidth` option value into bytes per second.
+
+    Arguments:
+
+        value (tuple or number): value and unit as returned by
+            :func:`~escale.base.config.getnum`; the default unit is MB.
+
+    Returns:
+
+        float: bandwidth in bytes per second, or ``None``.
+
+    *new in 0.7.14*
+    """
+    if not value:
+        return None
+    if isinstance(value, tuple):
+        value, unit = value
+        if unit:
+            value *= storage_space_unit[unit]
+    return float(value) * 1048576
+
+
+def bandwidth_buckets(global_config, shared=False):
+    """
+    Make the bandwidth budgets shared by all the clients.
+
+    Arguments:
+
+        global_config (dict): global options.
+
+        shared (bool): make the budgets usable by subprocesses.
+
+    Returns:
+
+        dict: :class:`~escale.base.timer.TokenBucket` objects for the `bandwidth`,
+        `upload bandwidth` and `download bandwidth` options, with keys
+        *'total'*, *'upload'* and *'download'* respectively.
+
+    *new in 0.7.14*
+    """
+    buckets = {}
+    for key, option in (('total', 'bandwidth'), ('upload', 'uploadbandwidth'),
+            ('download', 'downloadbandwidth')):
+        rate = bandwidth_limit(global_config.get(option, None))
+        if rate:
+            buckets[key] = TokenBucket(rate, shared=shared)
+    return buckets
+
+
+def escale_multiplexer(config, sections, logger, keep_alive=False, restart_delay=0,
+        concurrency=None, bandwidth=None, metrics=None):
+    """
+    Run the clients for several sections in the current process.
+
+    The clients share a pool of worker threads, a bandwidth budget and,
+    where supported, the connections to the relay hosts.
+
+    Arguments:
+
+        config (ConfigParser): configuration object.
+
+        sections (list): configuration section names.
+
+        logger (Logger): main logger.
+
+        keep_alive (bool): restart clients on error.
+
+        restart_delay (int or float): waiting time before restart, in seconds.
+
+        concurrency (int): maximum number of clients running at the same time.
+
+        bandwidth (dict): shared bandwidth budgets; see :func:`bandwidth_buckets`.
+
+        metrics (escale.base.metrics.Metrics): statistics of the clients.
+
+    *new in 0.7.14*
+    """
+    from .scheduler import Scheduler
+    def factory(section):
+        return make_client(config, section, bandwidth=bandwidth,
+                share_connections=True, metrics=metrics)
+    scheduler = Scheduler(factory, sections, concurrency=concurrency,
+            keep_alive=keep_alive, restart_delay=restart_delay, logger=logger)
+    on_wakeup(scheduler.wakeup)
+    scheduler.run()
+
+
 
 def escale_launcher(cfg_file, msgs=[], verbosity=logging.NOTSET, keep_alive=None):
     """
@@ -171,14 +357,29 @@ def escale_launcher(cfg_file, msgs=[], verbosity=logging.NOTSET, keep_alive=None
     flush_init_messages(logger, msgs)
     # parse keep_alive
     restart_delay = 0
+    global_config = parse_fields(config, default_section, global_fields, logger)
     if keep_alive is None:
         # read from config
-        global_config = parse_fields(config, default_section, global_fields, logger)
         keep_alive = global_config.get('keepalive', False)
     # `in` may coerce bools to ints
     if keep_alive not in [False, True] and isinstance(keep_alive, (int, float)):
         restart_delay = keep_alive
         keep_alive = True
+    # metrics endpoint
+    metrics = metrics_server = None
+    address = metrics_address(global_config.get('metrics', None))
+    if address:
+        metrics = Metrics()
+        metrics_server = MetricsServer(metrics, address)
+        try:
+            metrics_server.start()
+        except (IOError, OSError) as e:
+            logger.error('cannot start the metrics endpoint on %s:%s: %s',
+                    address[0], address[1], e)
+            metrics = metrics_server = None
+        else:
+            logger.info('metrics available at http://%s:%s/metrics',
+                    *metrics_server.address)
     # wrap Process.start
     pidfile = get_pid_file(config)
     def startWorker(worker):
@@ -191,7 +392,19 @@ def escale_launcher(cfg_file, msgs=[], verbosity=logging.NOTSET, keep_alive=None
                 f.write(str(worker.pid))
     # launch each client
     sections = config.sections()
-    if sections[1:] or keep_alive: # if multiple sections
+    if global_config.get('multiplex', False):
+        try:
+            escale_multiplexer(config, sections, logger,
+                keep_alive=keep_alive, restart_delay=restart_delay,
+                concurrency=global_config.get('maxconcurrentsections', None),
+                bandwidth=bandwidth_buckets(global_config),
+                metrics=metrics)
+        except ExpressInterrupt as exc:
+            logger.debug(type(exc).__name__)
+            raise
+    elif sections[1:] or keep_alive: # if multiple sections
+        # the subprocesses handle the wakeup signal
+        on_wakeup(lambda: None)
         if PYTHON_VERSION == 3:
             log_queue = Queue()
             log_listener = QueueListener(log_queue)
@@ -208,14 +421,18 @@ def escale_launcher(cfg_file, msgs=[], verbosity=logging.NOTSET, keep_alive=None
         result_queue = Queue()
         # user interface
         ui_controller = UIController(logger=logger, parent=result_queue)
+        ui_controller.metrics = metrics
         ui_thread = threading.Thread(target=ui_controller.listen)
         ui_thread.start()
+        # bandwidth budgets in shared memory
+        bandwidth = bandwidth_buckets(global_config, shared=True)
         # escale subprocesses
         workers = {}
         for section in config.sections():
             worker = Process(target=escale,
                 name='{}.{}'.format(log_root, section),
-                args=(config, section, log_handler, ui_controller.conn))
+                args=(config, section, log_handler, ui_controller.conn,
+                    metrics is not None, bandwidth))
             workers[section] = worker
             startWorker(worker)
         # wait for everyone to terminate
@@ -233,7 +450,8 @@ def escale_launcher(cfg_file, msgs=[], verbosity=logging.NOTSET, keep_alive=None
                         worker = Process(target=escale,
                             name='{}.{}'.format(log_root, section),
                             args=(config, section, log_handler,
-                                ui_controller.conn))
+                                ui_controller.conn, metrics is not None,
+                                bandwidth))
                         workers[section] = worker
                         ui_controller.restartWorker(section, restart_delay)
                         startWorker(worker)
@@ -257,10 +475,13 @@ def escale_launcher(cfg_file, msgs=[], verbosity=logging.NOTSET, keep_alive=None
         logger_thread.join(1)
     else:
         try:
-            escale(config, sections[0])
+            escale(config, sections[0], metrics=metrics,
+                    bandwidth=bandwidth_buckets(global_config))
         except ExpressInterrupt as exc:
             logger.debug(type(exc).__name__)
             raise
+    if metrics_server is not None:
+        metrics_server.stop()
     logger.debug('exiting')
 
 
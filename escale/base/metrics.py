@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Metrics endpoint of the launcher.
+
+The clients send a snapshot of their :class:`~escale.manager.stats.Stats`
+to the user-interface controller after each synchronization cycle
+(see :meth:`~escale.cli.controller.DirectController.reportStats`).
+The snapshots are exported in the Prometheus text format at ``/metrics``.
+
+*new in 0.7.14*
+"""
+
+
+import threading
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError: # Python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+default_metrics_host = 'localhost'
+
+
+def metrics_address(value):
+    """
+    Convert a `metrics` option value into a (host, port) pair.
+
+    Arguments:
+
+        value (int or str): port, or *host:port*.
+
+    Returns:
+
+        (str, int): address, or ``None`` if `value` is empty.
+    """
+    if not value:
+        return None
+    if isinstance(value, int):
+        return (default_metrics_host, value)
+    host, _, port = value.rpartition(':')
+    return (host or default_metrics_host, int(port))
+
+
+class Metrics(object):
+    """
+    Last statistics snapshot of each client, with the section names as keys.
+    """
+    __slots__ = ['snapshots', '_lock']
+
+    def __init__(self):
+        self.snapshots = {}
+        self._lock = threading.Lock()
+
+    def update(self, section, snapshot):
+        with self._lock:
+            self.snapshots[section] = snapshot
+
+    def format(self):
+        """
+        Export the snapshots in the Prometheus text format.
+        """
+        with self._lock:
+            snapshots = dict(self.snapshots)
+        return format_metrics(snapshots)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join([ '{}="{}"'.format(name, _escape(value))
+        for name, value in sorted(labels.items()) ])
+
+
+def format_metrics(snapshots):
+    """
+    Format statistics snapshots as Prometheus metrics.
+
+    Arguments:
+
+        snapshots (dict): :meth:`~escale.manager.stats.Stats.snapshot` outputs,
+            with section names as keys.
+
+    Returns:
+
+        str: metrics in the text exposition format.
+    """
+    metrics = []
+    def metric(name, kind, help, samples):
+        metrics.append('# HELP escale_{} {}'.format(name, help))
+        metrics.append('# TYPE escale_{} {}'.format(name, kind))
+        for labels, value in samples:
+            if value is not None:
+                metrics.append('escale_{}{{{}}} {}'.format(name, labels, repr(float(value))))
+    def operation(name, key, snapshot):
+        counters = snapshot.get('operations', {}).get(name)
+        if not counters:
+            return 0
+        if key == 'successes':
+            return counters['count'] - counters['errors']
+        return counters[key]
+    sections = sorted(snapshots)
+    def per_section(func):
+        return [ (_labels(section=section), func(snapshots[section]))
+            for section in sections ]
+    metric('files_pulled_total', 'counter', 'Files downloaded.',
+        per_section(lambda s: operation('pulled', 'successes', s)))
+    metric('bytes_pulled_total', 'counter', 'Bytes downloaded.',
+        per_section(lambda s: operation('pulled', 'bytes', s)))
+    metric('files_pushed_total', 'counter', 'Files uploaded.',
+        per_section(lambda s: operation('pushed', 'successes', s)))
+    metric('bytes_pushed_total', 'counter', 'Bytes uploaded.',
+        per_section(lambda s: operation('pushed', 'bytes', s)))
+    metric('push_failures_total', 'counter', 'Files that could not be uploaded.',
+        per_section(lambda s: operation('pushed', 'errors', s)))
+    metric('pending_uploads', 'gauge', 'Local files missing on the relay after the last cycle.',
+        per_section(lambda s: s.get('gauges', {}).get('pending uploads')))
+    metric('page_lock_waits_total', 'counter', 'Index pages found locked by another client.',
+        per_section(lambda s: operation('relay.acquirePageLock', 'errors', s)))
+    metric('used_space_bytes', 'gauge', 'Space used on the relay host.',
+        per_section(lambda s: s.get('gauges', {}).get('used space')))
+    metric('quota_bytes', 'gauge', 'Quota on the relay host.',
+        per_section(lambda s: s.get('gauges', {}).get('quota')))
+    metric('cycles_total', 'counter', 'Synchronization cycles.',
+        per_section(lambda s: s.get('cycles', 0)))
+    metric('cycle_duration_seconds', 'gauge', 'Duration of the last synchronization cycle.',
+        per_section(lambda s: s.get('gauges', {}).get('last cycle duration')))
+    metric('cycle_seconds_total', 'counter', 'Time spent in synchronization cycles.',
+        per_section(lambda s: operation('cycle', 'time', s)))
+    metric('last_report_timestamp_seconds', 'gauge', 'Time of the last report.',
+        per_section(lambda s: s.get('time')))
+    def simulated_faults(snapshot):
+        operations = snapshot.get('operations', {})
+        errors = [ counters['errors'] for name, counters in operations.items()
+                if name.startswith('simulation.') ]
+        return sum(errors) if errors else None
+    metric('simulated_faults_total', 'counter', 'Errors injected by the relay simulation.',
+        per_section(simulated_faults))
+    # all the recorded operations and caches
+    samples = { key: [] for key in ('count', 'errors', 'time', 'bytes') }
+    for section in sections:
+        for name, counters in sorted(snapshots[section].get('operations', {}).items()):
+            labels = _labels(section=section, operation=name)
+            for key in samples:
+                samples[key].append((labels, counters[key]))
+    metric('operation_calls_total', 'counter', 'Calls to an operation.', samples['count'])
+    metric('operation_errors_total', 'counter', 'Failed calls to an operation.', samples['errors'])
+    metric('operation_seconds_total', 'counter', 'Time spent in an operation.', samples['time'])
+    metric('operation_bytes_total', 'counter', 'Bytes processed by an operation.', samples['bytes'])
+    samples = { key: [] for key in ('hits', 'misses') }
+    for section in sections:
+        for name, counters in sorted(snapshots[section].get('caches', {}).items()):
+            labels = _labels(section=section, cache=name)
+            for key in samples:
+                samples[key].append((labels, counters[key]))
+    metric('cache_hits_total', 'counter', 'Cache hits.', samples['hits'])
+    metric('cache_misses_total', 'counter', 'Cache misses.', samples['misses'])
+    return '\n'.join(metrics) + '\n'
+
+
+class MetricsServer(object):
+    """
+    HTTP server that exports :class:`Metrics` at ``/metrics``, in a daemon thread.
+
+    Attributes:
+
+        metrics (Metrics): statistics of the clients.
+
+        address ((str, int)): host and port.
+
+    """
+    __slots__ = ['metrics', 'address', '_server', '_thread']
+
+    def __init__(self, metrics, address):
+        self.metrics = metrics
+        self.address = address
+        self._server = self._thread = None
+
+    def start(self):
+        metrics = self.metrics
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.format().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        self._server = HTTPServer(self.address, Handler)
+        # the actual port if 0 was requested
+        self.address = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = self._thread = None
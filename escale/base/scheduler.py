@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import time
+import heapq
+import itertools
+import threading
+import traceback
+
+from .essential import *
+from .exceptions import *
+
+try:
+    from queue import Queue, Empty
+except ImportError: # Python 2
+    from Queue import Queue, Empty
+
+
+class Scheduler(Reporter):
+    """
+    Run several managers in a single process.
+
+    Managers are advanced one synchronization cycle at a time
+    (see :meth:`~escale.manager.Manager.cycles`) by a pool of worker threads,
+    earliest due first.
+    An idle manager is run again before it is due if its time controller
+    is notified of a change; the change watchers of the idle managers are
+    polled in a dedicated thread
+    (see :meth:`~escale.manager.history.TimeQuotaController.poll`), so that
+    slow probes do not delay the dispatch of the due managers.
+    A failing manager does not affect the other ones; it can be made again
+    and restarted after a delay.
+
+    Attributes:
+
+        factory (callable): takes a section name and returns a manager.
+
+        sections (list): section names.
+
+        concurrency (int): number of worker threads, i.e. maximum number of
+            managers running a synchronization cycle at the same time.
+
+        keep_alive (bool): restart managers that failed on any error;
+            if ``False``, only :class:`~escale.base.exceptions.RestartRequest`
+            triggers a restart.
+
+        restart_delay (int or float): waiting time before restart, in seconds.
+
+    *new in 0.7.14*
+    """
+    __slots__ = ['factory', 'sections', 'concurrency', 'keep_alive', 'restart_delay',
+            '_todo', '_done', '_cycles', '_managers', '_idle', '_stop']
+
+    def __init__(self, factory, sections, concurrency=None, keep_alive=False, restart_delay=0,
+            **super_args):
+        Reporter.__init__(self, **super_args)
+        self.factory = factory
+        self.sections = list(sections)
+        if not concurrency:
+            concurrency = min(len(self.sections), 8)
+        self.concurrency = concurrency
+        self.keep_alive = keep_alive
+        self.restart_delay = restart_delay
+        self._todo = Queue()
+        self._done = Queue()
+        self._cycles = {}
+        self._managers = {}
+        # sections waiting for their next cycle
+        self._idle = set()
+        self._stop = threading.Event()
+
+    def _work(self):
+        while True:
+            section = self._todo.get()
+            if section is None:
+                break
+            self._step(section)
+
+    def _step(self, section):
+        try:
+            cycles = self._cycles.get(section, None)
+            if cycles is None:
+                manager = self._managers[section] = self.factory(section)
+                cycles = self._cycles[section] = manager.cycles()
+            delay = next(cycles)
+        except StopIteration:
+            self._done.put((section, None, None))
+        except BaseException as exc:
+            self._done.put((section, exc, traceback.format_exc()))
+        else:
+            self._done.put((section, delay, None))
+
+    def _watch(self, interval=1.):
+        while not self._stop.wait(interval):
+            for section in list(self._idle):
+                manager = self._managers.get(section, None)
+                if manager is None or section not in self._idle:
+                    continue
+                try:
+                    changed = manager.tq_controller.poll()
+                except ExpressInterrupt:
+                    raise
+                except Exception as e:
+                    self.logger.debug("failed to poll the watchers of '%s': %s", section, e)
+                    continue
+                if changed:
+                    # wake the dispatcher up
+                    self._done.put((None, None, None))
+
+    def wakeup(self):
+        """
+        Run all the idle managers as soon as possible.
+
+        Can be called from any thread.
+        """
+        for manager in list(self._managers.values()):
+            manager.tq_controller.notify()
+
+    def run(self):
+        workers = [ threading.Thread(target=self._work) for _ in range(self.concurrency) ]
+        watcher = threading.Thread(target=self._watch)
+        for worker in workers + [watcher]:
+            worker.daemon = True
+            worker.start()
+        order = itertools.count()
+        due = [ (0, next(order), section) for section in self.sections ]
+        running = 0
+        active = len(self.sections)
+        try:
+            while 0 < active:
+                now = time.time()
+                # wake the idle managers up on changes
+                woken = False
+                for i, (t, n, section) in enumerate(due):
+                    manager = self._managers.get(section, None)
+                    if now < t and manager is not None and manager.tq_controller.notified():
+                        due[i] = (now, n, section)
+                        woken = True
+                if woken:
+                    heapq.heapify(due)
+                while due and due[0][0] <= now and running < self.concurrency:
+                    _, _, section = heapq.heappop(due)
+                    self._idle.discard(section)
+                    self._todo.put(section)
+                    running += 1
+                # wake up at least every second so that interrupts are handled
+                timeout = 1.
+                if due and running < self.concurrency:
+                    timeout = min(timeout, max(0., due[0][0] - now))
+                try:
+                    section, result, backtrace = self._done.get(True, timeout)
+                except Empty:
+                    continue
+                if section is None:
+                    # change detected by the watcher thread
+                    continue
+                running -= 1
+                if isinstance(result, (int, float)):
+                    heapq.heappush(due, (time.time() + result, next(order), section))
+                    self._idle.add(section)
+                    continue
+                # the manager returned
+                self._cycles.pop(section, None)
+                manager = self._managers.pop(section, None)
+                if result is None:
+                    self.logger.info("'%s' is returning", section)
+                    active -= 1
+                    continue
+                if isinstance(result, ExpressInterrupt):
+                    raise result
+                if manager is not None:
+                    manager.ui_controller.failure(section, type(result), backtrace)
+                self.logger.debug("'%s' failed: %s", section, backtrace)
+                if self.keep_alive or isinstance(result, RestartRequest):
+                    self.ui_controller.restartWorker(section)
+                    heapq.heappush(due, (time.time() + self.restart_delay, next(order), section))
+                else:
+                    self.logger.error("'%s' failed: %s", section, result)
+                    active -= 1
+        finally:
+            self._stop.set()
+            for _ in workers:
+                self._todo.put(None)
+            # close the idle managers
+            for cycles in list(self._cycles.values()):
+                try:
+                    cycles.close()
+                except ValueError: # generator already executing
+                    pass
+
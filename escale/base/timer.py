@@ -13,6 +13,7 @@
 
 from math import *
 import time
+import threading
 
 class Clock(object):
     '''
@@ -107,3 +108,96 @@ class Clock(object):
         #    logger.debug('sleeping %{}f seconds'.format(precision), delay)
         time.sleep(delay)
 
+
+
+class TokenBucket(object):
+    '''
+    Thread-safe token bucket that limits a rate, typically a bandwidth.
+
+    Tokens are added at constant `rate` up to `capacity`.
+    :meth:`consume` blocks until enough tokens are available.
+    Requests are served in the order of :meth:`reserve` calls, one `chunk`
+    at a time, so that a large transfer does not monopolize the bucket;
+    transfers that share a bucket are interleaved chunk by chunk.
+
+    The state of a `shared` bucket lives in shared memory, so that the bucket
+    can be passed to subprocesses (see :mod:`multiprocessing`) and limit
+    the total rate of the processes.
+
+    Attributes:
+
+        rate (float): tokens per second (e.g. bytes per second).
+
+        capacity (float): maximum number of tokens (burst size).
+
+        chunk (float): maximum number of tokens per reservation.
+
+    *new in 0.7.14*
+    '''
+    __slots__ = ['rate', 'capacity', 'chunk', '_tat', '_lock']
+
+    def __init__(self, rate, capacity=None, chunk=65536, shared=False):
+        self.rate = float(rate)
+        if capacity is None:
+            capacity = self.rate # 1-second burst
+        self.capacity = float(capacity)
+        self.chunk = float(min(chunk, self.capacity)) if chunk else self.capacity
+        # theoretical arrival time; the bucket holds `(now - _tat) * rate` tokens
+        t = time.time() - self.capacity / self.rate
+        if shared:
+            import multiprocessing
+            self._tat = multiprocessing.RawValue('d', t)
+            self._lock = multiprocessing.Lock()
+        else:
+            import ctypes
+            self._tat = ctypes.c_double(t)
+            self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        '''
+        Take `amount` tokens in advance, without waiting.
+
+        Returns:
+
+            float: time in seconds before the tokens are actually available.
+        '''
+        with self._lock:
+            t = time.time()
+            tat = max(self._tat.value, t - self.capacity / self.rate)
+            tat += float(amount) / self.rate
+            self._tat.value = tat
+        return max(0., tat - t)
+
+    def consume(self, amount):
+        '''
+        Take `amount` tokens, sleeping as long as necessary.
+
+        Returns:
+
+            float: time slept in seconds.
+        '''
+        return consume_tokens((self,), amount, self.chunk)
+
+
+def consume_tokens(buckets, amount, chunk=None):
+    '''
+    Take `amount` tokens from all the buckets, `chunk` by chunk, sleeping as long
+    as necessary.
+
+    Returns:
+
+        float: time slept in seconds.
+
+    *new in 0.7.14*
+    '''
+    if chunk is None:
+        chunk = min([ bucket.chunk for bucket in buckets ])
+    slept = 0.
+    while 0 < amount:
+        step = min(amount, chunk)
+        delay = max([ bucket.reserve(step) for bucket in buckets ])
+        if 0 < delay:
+            time.sleep(delay)
+            slept += delay
+        amount -= step
+    return slept
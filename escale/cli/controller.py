@@ -47,6 +47,7 @@ class DirectController(object):
     def __init__(self, logger=None, maintainer=None):
         self.logger = logger
         self.maintainer = maintainer
+        self.metrics = None
 
     @property
     def error_file(self):
@@ -159,6 +160,21 @@ class DirectController(object):
         else:
             self.logger.info("restarting %s for '%s'", PROGRAM_NAME, repository)
 
+    def reportStats(self, repository, snapshot):
+        """
+        Receive the statistics of a client after a synchronization cycle.
+
+        Arguments:
+
+            repository (str): configuration section name.
+
+            snapshot (dict): see :meth:`escale.manager.stats.Stats.snapshot`.
+
+        *new in 0.7.14*
+        """
+        if self.metrics is not None:
+            self.metrics.update(repository, snapshot)
+
     def __dynamic__(self, package, protocol, function, *args, **kwargs):
         if isinstance(protocol, list):
             for p in protocol:
@@ -275,6 +291,13 @@ class UIController(Listener, DirectController):
         self.parent.put(args)
         return True
 
+    def reportStats(self, *args):
+        return self.__signal__('_reportStats', args)
+
+    def _reportStats(self, *args):
+        DirectController.reportStats(self, *args)
+        return True
+
     def __signal__(self, method_name, arguments):
         if self.parent is None:
             request = (False, method_name) + arguments
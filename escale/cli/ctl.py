@@ -35,6 +35,10 @@ from escale.base.launcher import *
 from escale.manager.migration import *
 from escale.manager.backup import *
 from escale.relay.index import *
+from escale.base.checksum import hash_throughput
+from escale.manager.filter import filter_throughput
+from escale.manager.benchmark import sync_benchmark
+from escale.manager.stats import stats_file_prefix, load_stats, format_summary
 
 import tarfile
 import shutil
@@ -148,6 +152,31 @@ def restart(pidfile=None):
     return start(pidfile)
 
 
+def wakeup(pidfile=None):
+    """
+    Ask all the running escale processes to synchronize without waiting.
+
+    *new in 0.7.14*
+    """
+    if not pidfile:
+        pidfile = get_pid_file()
+    if not os.path.exists(pidfile):
+        print("{} is not running".format(PROGRAM_NAME))
+        return 1
+    import signal
+    if not hasattr(signal, 'SIGUSR1'):
+        print('not supported on this platform')
+        return 1
+    with open(pidfile, 'r') as f:
+        pids = [ line.strip() for line in f.readlines() ]
+    for pid in pids:
+        if pid:
+            try:
+                os.kill(int(pid), signal.SIGUSR1)
+            except OSError:
+                pass
+
+
 def access(modifiers=None, resource=None, repository=None):
     """
     Get or set access modifiers of a resource.
@@ -378,8 +407,7 @@ def recover(repository=None, timestamp=None, overwrite=True, update=None, fast=N
                         timestamp = os.path.getmtime(local)
                         content = client.encryption.encrypt(local)
                         try:
-                            with open(content, 'rb') as f:
-                                checksum = client.hash_function(f.read())
+                            checksum = client.hash_function.file(content)
                         finally:
                             client.encryption.finalize(content)
                     if checksum:
@@ -432,6 +460,8 @@ def rebase(repository=None, extra_path=None):
     client = make_client(cfg, repository)
     if isinstance(client.relay, TopDirectoriesIndex):
         raise NotImplementedError('cannot add upper directories with directory-based indexing')
+    if isinstance(client.relay, AdaptiveIndex):
+        raise NotImplementedError('cannot add upper directories with adaptive indexing')
     client.relay.open()
     client.remoteListing()
     fd, tmp = tempfile.mkstemp()
@@ -681,3 +711,146 @@ def list_pending(repository=None, page=None, fast=True, directories=False):
         finally:
             client.relay.close()
 
+
+def benchmark(target=None, json=False, size=None, algorithms=None, paths=None,
+        files=None, relay=None, index=False, latency=None, bandwidth=None, depth=None,
+        errors=None, listing_delay=None, engine=None, connections=None):
+    """
+    Measure the performance of some components on the local machine.
+
+    Arguments:
+
+        target (str): either 'checksum' (hash algorithms), 'filter'
+            (include/exclude patterns) or 'sync' (complete synchronization
+            between two clients).
+
+        json (bool): print the results in the JSON format.
+
+        size (int): amount of data, in MB.
+
+        algorithms (list): hash algorithms, for target 'checksum'.
+
+        paths (int): number of file paths, for target 'filter'.
+
+        files (int): number of files, for target 'sync'.
+
+        relay (str): 'memory', 'file' or 'ftp', for target 'sync'.
+
+        index (bool): index-based relay repository management, for target 'sync'.
+
+        latency (float): delay per relay request in seconds, for target 'sync'.
+
+        bandwidth (float): transfer rate in MB/s, for target 'sync'.
+
+        depth (int): number of directory levels, for target 'sync'.
+
+        errors (float): probability for a relay request to fail, for target 'sync'.
+
+        listing_delay (float): additional delay per listing request in seconds,
+            for target 'sync'.
+
+        engine (str): 'sync' or 'async', for target 'sync'.
+
+        connections (int): maximum number of control connections per client,
+            for target 'sync' and relay 'ftp'.
+
+    *changed in 0.7.14:* targets 'filter' and 'sync'
+    """
+    if target == 'checksum':
+        if not size:
+            size = 64
+        results = hash_throughput(algorithms, size=size * 1048576)
+        results = { algorithm: dict(throughput=throughput)
+                for algorithm, throughput in results.items() }
+        if json:
+            import json as _json
+            print(_json.dumps({target: results}, indent=2, sort_keys=True))
+        else:
+            for algorithm in sorted(results,
+                    key=lambda a: results[a]['throughput'], reverse=True):
+                print('{}:\t{:.0f} MB/s'.format(algorithm,
+                    results[algorithm]['throughput'] / 1048576.))
+    elif target == 'filter':
+        if not paths:
+            paths = 1000000
+        results = filter_throughput(npaths=paths)
+        results = { implementation: dict(throughput=throughput)
+                for implementation, throughput in results.items() }
+        if json:
+            import json as _json
+            print(_json.dumps({target: results}, indent=2, sort_keys=True))
+        else:
+            for implementation in sorted(results,
+                    key=lambda a: results[a]['throughput'], reverse=True):
+                print('{}:\t{:.0f} paths/s'.format(implementation,
+                    results[implementation]['throughput']))
+    elif target == 'sync':
+        if not files:
+            files = 1000
+        if not size:
+            size = 16
+        results = sync_benchmark(relay=relay or 'memory', index=index, nfiles=files,
+                mean_size=size * 1048576 // files, depth=2 if depth is None else depth,
+                latency=latency or 0,
+                bandwidth=bandwidth * 1048576 if bandwidth else None,
+                error_rate=errors or 0, listing_delay=listing_delay or 0,
+                engine=engine or 'sync', max_connections=connections)
+        if json:
+            import json as _json
+            print(_json.dumps({target: results}, indent=2, sort_keys=True))
+        else:
+            for phase in ('cold sync', 'idle cycle', 'incremental update'):
+                requests = results[phase]['requests']
+                print('{}:\t{:.3f} s\t({:g} relay requests)'.format(phase,
+                    results[phase]['time'], sum(requests.values())))
+            print('throughput:\t{:.1f} MB/s'.format(
+                results['cold sync']['throughput'] / 1048576.))
+            if results['faults']['errors']:
+                print('faults:\t{} simulated errors\t({} failed cycles)'.format(
+                    results['faults']['errors'], results['faults']['failed_cycles']))
+            if results['memory peak'] is not None:
+                print('memory peak:\t{:.1f} MB'.format(results['memory peak'] / 1048576.))
+    else:
+        raise ValueError("unsupported benchmark target: '{}'".format(target))
+
+
+def stats(repository=None, json=False):
+    """
+    Print the synchronization statistics of the running clients.
+
+    Arguments:
+
+        repository (str or list): section(s) in the configuration file;
+            all by default.
+
+        json (bool): print the statistics in the JSON format.
+
+    *new in 0.7.14*
+    """
+    cfg, _, _ = parse_cfg()
+    if repository:
+        if isinstance(repository, (tuple, list)):
+            repositories = repository
+        else:
+            repositories = [ repository ]
+    else:
+        repositories = cfg.sections()
+    results = {}
+    for repository in repositories:
+        args = parse_fields(cfg, repository, fields)
+        stats_file = args.get('statsfile', True)
+        if stats_file is False:
+            continue
+        elif stats_file is True:
+            stats_file = get_cache_file(config=cfg, section=repository,
+                    prefix=stats_file_prefix)
+        try:
+            results[repository] = load_stats(stats_file)
+        except (IOError, OSError, ValueError):
+            pass
+    if json:
+        import json as _json
+        print(_json.dumps(results, indent=2, sort_keys=True))
+    else:
+        for repository in sorted(results):
+            print('{}:\t{}'.format(repository, format_summary(results[repository])))
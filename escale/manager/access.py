@@ -19,6 +19,7 @@ from escale.base.essential import *
 import os
 import itertools
 import traceback
+import threading
 
 
 if PYTHON_VERSION == 2:
@@ -58,6 +59,10 @@ class Accessor(object):
         self.delete = delete
 
 
+# dbm databases cannot be opened several times simultaneously
+_table_lock = threading.RLock()
+
+
 class TableEntry(object):
 
     __slots__ = [ 'default', 'table', 'key' ]
@@ -68,11 +73,19 @@ class TableEntry(object):
         self.default = default
 
     def __enter__(self):
-        self.table = dbm.open(self.table, 'c')
+        _table_lock.acquire()
+        try:
+            self.table = dbm.open(self.table, 'c')
+        except:
+            _table_lock.release()
+            raise
         return self
 
     def __exit__(self, *args):
-        self.table.close()
+        try:
+            self.table.close()
+        finally:
+            _table_lock.release()
 
     def get(self):
         try: # Python2 does not implement the `get` method of the `dict` interface
@@ -280,9 +293,9 @@ class AccessController(Reporter):
             ui_controller=None,
             push_only=False, pull_only=False,
             mode=None, create=False, unsafe=False,
-            verbosity=1,
+            verbosity=1, logger=None,
             **ignored):
-        Reporter.__init__(self, ui_controller=ui_controller)
+        Reporter.__init__(self, logger=logger, ui_controller=ui_controller)
         self.name = repository
         if not path:
             msg = 'no local repository defined'
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+"""
+Asynchronous synchronization engine (Python 3 only).
+
+Each synchronization cycle runs in an :mod:`asyncio` event loop.
+Files are processed concurrently: the blocking steps (hashing, encryption,
+relay requests) run in a thread pool, so that listing, hashing,
+encryption and transfers overlap for many files at once.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .manager import Manager
+
+
+default_concurrency = 4
+
+
+class ConcurrentRelay(object):
+    """
+    Adapter that makes a synchronous relay safe to call from several threads.
+
+    Relays with the `__thread_safe__` class attribute set to ``True`` admit
+    up to `concurrency` simultaneous calls.
+    Other relays are called one at a time.
+
+    Attributes:
+
+        relay (escale.relay.AbstractRelay): adapted relay.
+
+        concurrency (int): maximum number of simultaneous calls.
+
+    """
+    __slots__ = ['relay', 'concurrency', '_semaphore']
+
+    def __init__(self, relay, concurrency=default_concurrency):
+        self.relay = relay
+        if not getattr(relay, '__thread_safe__', False):
+            concurrency = 1
+        self.concurrency = concurrency
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+
+    def __getattr__(self, name):
+        attr = getattr(self.relay, name)
+        if callable(attr):
+            semaphore = self._semaphore
+            def call(*args, **kwargs):
+                with semaphore:
+                    return attr(*args, **kwargs)
+            return call
+        else:
+            return attr
+
+
+class AsyncManager(Manager):
+    """
+    Manager with an :mod:`asyncio` synchronization engine.
+
+    Attributes:
+
+        concurrency (int): maximum number of files processed at the same time.
+
+    *new in 0.7.14*
+    """
+    def __init__(self, relay, concurrency=None, **kwargs):
+        Manager.__init__(self, relay, **kwargs)
+        if not concurrency:
+            concurrency = default_concurrency
+        self.concurrency = concurrency
+        # the quota callback is called in the worker threads
+        self.relay = ConcurrentRelay(self.relay, concurrency)
+        self.tq_controller.quota_read_callback = self.relay.storageSpace
+        self._loop = None
+        self._executor = None
+
+    def synchronize(self, check_sanity=False):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._executor = ThreadPoolExecutor(self.concurrency)
+        return self._loop.run_until_complete(self._synchronize(check_sanity))
+
+    def cycles(self):
+        try:
+            for delay in Manager.cycles(self):
+                yield delay
+        finally:
+            if self._loop is not None:
+                self._executor.shutdown(wait=True)
+                self._loop.close()
+                self._loop = self._executor = None
+
+    def _call(self, func, *args):
+        return self._loop.run_in_executor(self._executor, func, *args)
+
+    async def _map(self, func, items, *args):
+        """
+        Apply `func` on every item in the thread pool, with at most
+        `concurrency` pending calls.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async def bounded(item):
+            async with semaphore:
+                return await self._call(func, item, *args)
+        results = await asyncio.gather(*[ bounded(item) for item in items ],
+                return_exceptions=True)
+        # let all the files be processed before raising
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return any(results)
+
+    async def _synchronize(self, check_sanity):
+        new = False
+        # crawl the local and remote repositories simultaneously
+        listing = self._call(self.remoteListing)
+        if self.mode != 'download':
+            local = self._call(self.localFiles)
+        else:
+            local = None
+        await listing
+        if check_sanity:
+            await self._call(self.sanityChecks)
+        if local is not None:
+            local = await local
+        precomputing = None
+        if self.mode != 'upload':
+            remote = self.filter(self.relay.listReady())
+            await self._call(self.relay.prefetchMetadata, remote, self.timestamp)
+            if local and self.hash_function:
+                # hash the local files that will not be overwritten
+                # while downloading
+                pending = set(remote)
+                precomputing = asyncio.ensure_future(self._map(self._precompute,
+                    [ resource for resource in local if resource not in pending ]))
+            with self.stats.timer('download'):
+                new |= await self._map(self.downloadFile, remote)
+        if self.mode != 'download':
+            if precomputing is not None:
+                await precomputing
+            remote = set(self.relay.listTransferred('', end2end=False))
+            if not (self.max_pending_transfers and \
+                    self.max_pending_transfers <= len(self.relay.listReady())):
+                with self.stats.timer('upload'):
+                    if getattr(self.relay, 'manifest', None):
+                        # the batches are pushed one after the other
+                        new |= await self._call(self.uploadFiles, local, remote)
+                    else:
+                        new |= await self._map(self.uploadFile, local, remote)
+            self.stats.set('pending uploads', self.pendingUploads(local, remote))
+        elif precomputing is not None:
+            await precomputing
+        return new
+
+    def _precompute(self, resource):
+        try:
+            self.checksum(resource)
+        except OSError:
+            pass
+        return False
+
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Synchronization benchmarks on synthetic repositories.
+
+Two clients run in the current process: one uploads a synthetic local repository
+and the other one downloads it.
+The relay repository is a temporary directory (:class:`~escale.relay.LocalMount`),
+is kept in memory (:class:`~escale.relay.memory.MemoryRelay`) or is served by
+an in-process FTP server (:class:`~escale.relay.FTP`; requires the `pyftpdlib
+<https://pypi.org/project/pyftpdlib/>`_ library), with optional latency,
+bandwidth limit and random errors (see :mod:`escale.relay.simulation`).
+
+See also ``escalectl benchmark sync``.
+
+*new in 0.7.14*
+"""
+
+
+import os
+import math
+import time
+import random
+import shutil
+import logging
+import tempfile
+import threading
+import itertools
+
+import escale
+from escale.base.exceptions import ExpressInterrupt
+from escale.log.log import log_root
+from escale.relay import by_protocol
+from escale.relay.memory import clear_hosts
+from .access import AccessController
+from .manager import Manager
+from .index import IndexManager
+
+
+size_distributions = ['lognormal', 'uniform', 'fixed']
+
+_instances = itertools.count()
+
+
+def _random_bytes(rng, n):
+    try:
+        return rng.getrandbits(8 * n).to_bytes(n, 'little') if n else b''
+    except AttributeError: # Python 2
+        return bytes(bytearray([ rng.getrandbits(8) for _ in range(n) ]))
+
+
+def file_sizes(nfiles, mean_size, distribution='lognormal', rng=random):
+    """
+    Draw file sizes.
+
+    Arguments:
+
+        nfiles (int): number of files.
+
+        mean_size (int): mean file size in bytes.
+
+        distribution (str): *'lognormal'* (with :math:`\\sigma=1`), *'uniform'*
+            (between 0 and twice the mean size) or *'fixed'*.
+
+        rng (random.Random): random number generator.
+
+    Returns:
+
+        list of int: file sizes in bytes.
+    """
+    if distribution == 'lognormal':
+        sigma = 1.
+        mu = math.log(max(mean_size, 1)) - sigma * sigma / 2
+        return [ int(rng.lognormvariate(mu, sigma)) for _ in range(nfiles) ]
+    elif distribution == 'uniform':
+        return [ rng.randint(0, 2 * mean_size) for _ in range(nfiles) ]
+    elif distribution == 'fixed':
+        return [ int(mean_size) ] * nfiles
+    else:
+        raise ValueError("unsupported size distribution: '{}'".format(distribution))
+
+
+def make_repository(path, nfiles=1000, mean_size=16384, distribution='lognormal',
+        depth=2, fanout=4, seed=None):
+    """
+    Make a synthetic local repository.
+
+    Arguments:
+
+        path (str): root directory; created if missing.
+
+        nfiles (int): number of files.
+
+        mean_size (int): mean file size in bytes.
+
+        distribution (str): see :func:`file_sizes`.
+
+        depth (int): number of directory levels above the files.
+
+        fanout (int): number of subdirectories per directory.
+
+        seed (any): seed for reproducible repositories.
+
+    Returns:
+
+        dict: file sizes with relative paths as keys.
+    """
+    rng = random.Random(seed)
+    files = {}
+    for i, size in enumerate(file_sizes(nfiles, mean_size, distribution, rng)):
+        dirs = [ 'd{}'.format(rng.randrange(fanout)) for _ in range(depth) ]
+        resource = '/'.join(dirs + [ 'f{}.dat'.format(i) ])
+        local_file = os.path.join(path, *resource.split('/'))
+        dirname = os.path.dirname(local_file)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(local_file, 'wb') as f:
+            f.write(_random_bytes(rng, size))
+        files[resource] = size
+    return files
+
+
+def _quiet_logger(name):
+    logger = logging.getLogger(log_root).getChild('benchmark').getChild(name)
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+def _relay_requests(managers):
+    requests = {}
+    for manager in managers:
+        for operation, counters in manager.stats.snapshot()['operations'].items():
+            if operation.startswith('relay.'):
+                operation = operation[6:]
+                requests[operation] = requests.get(operation, 0) + counters['count']
+    return requests
+
+
+def _difference(after, before):
+    return { operation: count - before.get(operation, 0)
+        for operation, count in after.items() if count != before.get(operation, 0) }
+
+
+def sync_benchmark(relay='memory', index=False, nfiles=1000, mean_size=16384,
+        distribution='lognormal', depth=2, latency=0, bandwidth=None, updates=10,
+        idle_cycles=3, max_cycles=100, seed=0, error_rate=0, error_codes=None,
+        listing_delay=0, engine='sync', max_connections=None):
+    """
+    Measure the performance of a complete synchronization between two clients.
+
+    Arguments:
+
+        relay (str): *'memory'*, *'file'* (temporary directory) or *'ftp'*
+            (local FTP server; checks the MLSD listing and the pool of control
+            connections of the FTP relay).
+
+        index (bool or str): index-based relay repository management, as the
+            ``index`` option of the configuration file.
+
+        nfiles (int): number of files in the synthetic repository.
+
+        mean_size (int): mean file size in bytes.
+
+        distribution (str): see :func:`file_sizes`.
+
+        depth (int): number of directory levels above the files.
+
+        latency (float): delay in seconds per request to the relay host.
+
+        bandwidth (float): transfer rate in bytes per second.
+
+        updates (int): number of files modified for the incremental update.
+
+        idle_cycles (int): number of cycles without changes.
+
+        max_cycles (int): maximum number of cycles for a synchronization to complete.
+
+        seed (any): seed for the synthetic repository and the simulated errors.
+
+        error_rate (float): probability for a request to the relay host to fail;
+            failed synchronization cycles are counted and the benchmark goes on.
+
+        error_codes (list of int): simulated errors;
+            see :class:`~escale.relay.simulation.Simulation`.
+
+        listing_delay (float): additional delay in seconds per listing request.
+
+        engine (str): *'sync'* (:class:`~escale.manager.Manager`) or *'async'*
+            (:class:`~escale.manager.asynchronous.AsyncManager`); ignored with `index`.
+
+        max_connections (int): maximum number of control connections per client,
+            for relay *'ftp'*.
+
+    Returns:
+
+        dict: measurements, with keys:
+
+        * *'cold sync'*: time in seconds for the downloading client to get all
+          the files, number of files and bytes, throughput in bytes per second,
+          number of cycles and relay requests per primitive;
+        * *'idle cycle'*: mean time of a cycle of both clients when nothing changes,
+          and relay requests per such cycle;
+        * *'incremental update'*: time in seconds between the modification of
+          `updates` files and their availability to the downloading client, and
+          relay requests;
+        * *'faults'*: number of simulated errors and of synchronization cycles
+          of either client that failed;
+        * *'memory peak'*: peak memory allocated by Python in bytes
+          (``None`` in Python 2);
+        * *'parameters'*: arguments of the benchmark and version of escale.
+    """
+    simulation = dict(error_rate=error_rate, error_codes=error_codes,
+            listing_delay=listing_delay, seed=seed)
+    if relay == 'memory':
+        relay_args = dict(latency=latency, bandwidth=bandwidth)
+    elif relay in ('file', 'local'):
+        relay, relay_args = 'file', {}
+        simulation.update(latency=latency, bandwidth=bandwidth)
+    elif relay == 'ftp':
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.ioloop import IOLoop
+        from pyftpdlib.servers import ThreadedFTPServer
+        relay_args = dict(username='benchmark', password='benchmark', protocol='ftp')
+        if max_connections:
+            relay_args['max_connections'] = max_connections
+        simulation.update(latency=latency, bandwidth=bandwidth)
+    else:
+        raise ValueError("unsupported relay: '{}'".format(relay))
+    if not (error_rate or listing_delay or simulation.get('latency') \
+            or simulation.get('bandwidth')):
+        simulation = None
+    try:
+        import tracemalloc
+    except ImportError: # Python 2
+        tracemalloc = None
+    else:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'): # Python 3.9+
+            tracemalloc.reset_peak()
+    if index:
+        Mngr = IndexManager
+    elif engine in ('async', 'asyncio'):
+        from .asynchronous import AsyncManager
+        Mngr = AsyncManager
+    else:
+        Mngr = Manager
+    Relay = by_protocol(relay, index=index, simulation=simulation)
+    tmpdir = tempfile.mkdtemp()
+    server = None
+    if relay == 'memory':
+        address = 'benchmark-{}-{}'.format(os.getpid(), next(_instances))
+    else:
+        address = os.path.join(tmpdir, 'relay')
+        os.makedirs(os.path.join(address, 'repository'))
+    if relay == 'ftp':
+        # pyftpdlib changes the working directory of the process
+        cwd = os.getcwd()
+        server_logger = logging.getLogger('pyftpdlib')
+        if not server_logger.handlers: # otherwise pyftpdlib logs every command
+            server_logger.addHandler(logging.NullHandler())
+        server_logger.setLevel(logging.WARNING)
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(relay_args['username'], relay_args['password'], address,
+                perm='elradfmwMT')
+        handler = type('BenchmarkFTPHandler', (FTPHandler,), dict(authorizer=authorizer))
+        server = ThreadedFTPServer(('127.0.0.1', 0), handler, ioloop=IOLoop())
+        # the stop event is a class attribute and is never cleared
+        server._exit = threading.Event()
+        address = '{}:{}'.format(*server.address[:2])
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+    try:
+        paths = dict(upload=os.path.join(tmpdir, 'upload'),
+                download=os.path.join(tmpdir, 'download'))
+        for path in paths.values():
+            os.makedirs(path)
+        files = make_repository(paths['upload'], nfiles, mean_size, distribution,
+                depth, seed=seed)
+        managers = {}
+        for mode, path in paths.items():
+            logger = _quiet_logger(mode)
+            repository = AccessController(mode, path=path, mode=mode, logger=logger)
+            manager = Mngr(Relay, repository=repository, address=address,
+                    directory='repository', clientname=mode, logger=logger,
+                    **relay_args)
+            manager.relay.open()
+            if simulation and hasattr(manager.relay, 'lock_args'):
+                # page locks left behind on errors are released by their owner
+                # in its next cycle; do not wait too long
+                manager.relay.lock_args['blocking'] = .1
+            managers[mode] = manager
+        uploader, downloader = managers['upload'], managers['download']
+        def complete(resources, content=None):
+            for resource in resources:
+                local_file = os.path.join(paths['download'], *resource.split('/'))
+                if not os.path.isfile(local_file):
+                    return False
+                if content is not None:
+                    with open(local_file, 'rb') as f:
+                        if f.read() != content:
+                            return False
+                elif isinstance(resources, dict) \
+                        and os.path.getsize(local_file) != resources[resource]:
+                    return False
+            return True
+        failed_cycles = []
+        def cycle(manager, check_sanity=False):
+            try:
+                manager.synchronize(check_sanity)
+            except ExpressInterrupt:
+                raise
+            except Exception:
+                if not simulation:
+                    raise
+                failed_cycles.append(manager.repository.name)
+                return False
+            return True
+        def cycles(sanity):
+            # as in Manager.run, check for corrupted files after an error
+            if simulation:
+                # a client may wait for the other one to repair its locks
+                def run(mode, manager, check_sanity):
+                    sanity[mode] = not cycle(manager, check_sanity)
+                threads = [ threading.Thread(target=run, args=(mode, manager, sanity[mode]))
+                        for mode, manager in managers.items() ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            else:
+                for mode, manager in (('upload', uploader), ('download', downloader)):
+                    sanity[mode] = not cycle(manager, sanity[mode])
+        def synchronize(resources, content=None, check_sanity=False):
+            sanity = dict(upload=check_sanity, download=check_sanity)
+            for n in range(1, max_cycles + 1):
+                cycles(sanity)
+                if complete(resources, content):
+                    return n
+            raise RuntimeError('the synchronization did not complete in {} cycles'.format(max_cycles))
+        results = {}
+        # cold sync
+        requests = _relay_requests(managers.values())
+        t0 = time.time()
+        ncycles = synchronize(files, check_sanity=True)
+        t = time.time() - t0
+        total = sum(files.values())
+        results['cold sync'] = dict(time=t, files=len(files), bytes=total,
+                throughput=total / max(t, 1e-9), cycles=ncycles,
+                requests=_difference(_relay_requests(managers.values()), requests))
+        # idle cycles
+        requests = _relay_requests(managers.values())
+        t0 = time.time()
+        sanity = dict(upload=False, download=False)
+        for _ in range(idle_cycles):
+            cycles(sanity)
+        t = time.time() - t0
+        results['idle cycle'] = dict(time=t / max(idle_cycles, 1),
+                requests={ operation: float(count) / max(idle_cycles, 1)
+                    for operation, count in _difference(
+                        _relay_requests(managers.values()), requests).items() })
+        # incremental update
+        rng = random.Random(seed)
+        modified = rng.sample(sorted(files), min(updates, len(files)))
+        content = b'modified'
+        # index update timestamps and page index modification times are compared
+        # at the second level; the next update must not share its second with
+        # the last one
+        t = time.time()
+        time.sleep(math.floor(t) + 1.5 - t)
+        mtime = time.time() + 2 # timestamps are compared at the second level
+        for resource in modified:
+            local_file = os.path.join(paths['upload'], *resource.split('/'))
+            with open(local_file, 'wb') as f:
+                f.write(content)
+            os.utime(local_file, (mtime, mtime))
+        requests = _relay_requests(managers.values())
+        t0 = time.time()
+        ncycles = synchronize(modified, content)
+        results['incremental update'] = dict(time=time.time() - t0, files=len(modified),
+                cycles=ncycles,
+                requests=_difference(_relay_requests(managers.values()), requests))
+        results['faults'] = dict(errors=sum([ counters['errors']
+                for manager in managers.values()
+                for operation, counters in manager.stats.snapshot()['operations'].items()
+                if operation.startswith('simulation.') ]),
+            failed_cycles=len(failed_cycles))
+        for manager in managers.values():
+            manager.relay.close()
+    finally:
+        if server is not None:
+            server.close_all()
+            os.chdir(cwd)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        if relay == 'memory':
+            clear_hosts(address)
+        if tracemalloc is None:
+            peak = None
+        else:
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+    results['memory peak'] = peak
+    results['parameters'] = dict(relay=relay, index=index, files=nfiles,
+            mean_size=mean_size, distribution=distribution, depth=depth,
+            latency=latency, bandwidth=bandwidth, updates=updates, seed=seed,
+            error_rate=error_rate, listing_delay=listing_delay, engine=engine,
+            max_connections=max_connections, version=escale.__version__)
+    return results
@@ -15,8 +15,10 @@
 # knowledge of the CeCILL-C license and that you accept its terms.
 
 from escale.base.essential import PYTHON_VERSION, asstr
+from escale.relay.info import parse_metadata
 from .config import *
 from collections import defaultdict
+import threading
 
 if PYTHON_VERSION == 2:
 	#import gdbm as dbm
@@ -37,12 +39,16 @@ else:
 
 
 checksum_cache_prefix = 'cc'
+placeholder_cache_prefix = 'pc'
 
 
 class ChecksumCache(dict):
 
 	__separator__ = ';'
 
+	# dbm databases cannot be opened several times simultaneously
+	__lock__ = threading.Lock()
+
 	def __init__(self, cache):
 		cache = os.path.expanduser(cache)
 		dirname = os.path.dirname(cache)
@@ -52,23 +58,135 @@ class ChecksumCache(dict):
 
 	def __setitem__(self, key, value):
 		timestamp, checksum = value
-		db = dbm.open(self.cache, 'c')
-		try:
-			db[key] = '{}{}{}'.format(timestamp, self.__separator__, checksum)
-		finally:
-			db.close()
+		with self.__lock__:
+			db = dbm.open(self.cache, 'c')
+			try:
+				db[key] = '{}{}{}'.format(timestamp, self.__separator__, checksum)
+			finally:
+				db.close()
 	
 	def __getitem__(self, key):
-		db = dbm.open(self.cache, 'c')
-		try:
-			value = asstr(db[key])
-		finally:
-			db.close()
+		with self.__lock__:
+			db = dbm.open(self.cache, 'c')
+			try:
+				value = asstr(db[key])
+			finally:
+				db.close()
 		timestamp, checksum = value.split(self.__separator__)
 		return int(timestamp), checksum
 
 
 
+class PlaceholderCache(dict):
+	"""
+	Placeholder cache (see :attr:`escale.relay.Relay.placeholder_cache`) persisted
+	in a dbm database.
+
+	The entries are loaded on construction and the modified entries are written
+	on calls to :meth:`flush`.
+	The meta information is stored in the placeholder format.
+
+	The cache is keyed by relay address and repository and is cleared if
+	the client connects to another relay.
+
+	The placeholder modification times are compared with those found in the
+	listings of the relay repository, so that only the modified placeholders
+	are downloaded again.
+
+	*new in 0.7.14*
+	"""
+
+	__slots__ = ('cache', 'relay', '_modified', '_deleted')
+
+	# key for the relay address and repository; regular files have relative paths
+	__relay_key__ = '/'
+
+	# dbm databases cannot be opened several times simultaneously
+	__lock__ = threading.Lock()
+
+	def __init__(self, cache, address=None, repository=None, log=None):
+		dict.__init__(self)
+		cache = os.path.expanduser(cache)
+		dirname = os.path.dirname(cache)
+		if not os.path.isdir(dirname):
+			os.makedirs(dirname)
+		self.cache = cache
+		self.relay = '{}/{}'.format(address, repository)
+		self._modified = set()
+		self._deleted = set()
+		with self.__lock__:
+			db = dbm.open(self.cache, 'c')
+			try:
+				if self.__relay_key__ in db and asstr(db[self.__relay_key__]) == self.relay:
+					for key in db.keys():
+						key = asstr(key)
+						if key == self.__relay_key__:
+							continue
+						try:
+							mtime, meta = asstr(db[key]).split('\n', 1)
+							mtime = float(mtime)
+							meta = parse_metadata(meta, target=key)
+							dict.__setitem__(self, key, (mtime, meta))
+						except (KeyboardInterrupt, SystemExit):
+							raise
+						except Exception as e:
+							if log is not None:
+								log("invalid placeholder cache entry for '{}': {}".format(key, e))
+				else:
+					# new cache or different relay
+					for key in list(db.keys()):
+						del db[key]
+					db[self.__relay_key__] = asbinary(self.relay)
+			finally:
+				db.close()
+
+	def __setitem__(self, key, value):
+		# the listings set the same entries again and again
+		if dict.get(self, key) == value:
+			return
+		dict.__setitem__(self, key, value)
+		self._modified.add(key)
+		self._deleted.discard(key)
+
+	def __delitem__(self, key):
+		dict.__delitem__(self, key)
+		self._modified.discard(key)
+		self._deleted.add(key)
+
+	def flush(self):
+		"""
+		Write the modified entries down.
+		"""
+		if not (self._modified or self._deleted):
+			return
+		with self.__lock__:
+			db = dbm.open(self.cache, 'c')
+			try:
+				for key in list(self._deleted):
+					try:
+						del db[asbinary(key)]
+					except KeyError:
+						pass
+				for key in list(self._modified):
+					try:
+						mtime, meta = dict.__getitem__(self, key)
+					except KeyError:
+						continue
+					if meta is None:
+						# will be downloaded again anyway
+						try:
+							del db[asbinary(key)]
+						except KeyError:
+							pass
+						continue
+					db[asbinary(key)] = asbinary('{}\n{}'.format(float(mtime), repr(meta)))
+			finally:
+				db.close()
+			self._modified.clear()
+			self._deleted.clear()
+
+
+
 def read_checksum_cache(path, log=None):
 	"""deprecated
 	
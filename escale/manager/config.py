@@ -24,6 +24,15 @@ except ImportError:
 	from ConfigParser import NoOptionError # Py2
 
 
+# new in 0.7.14
+simulation_fields = [('simulatelatency', 'latency'),
+	('simulatebandwidth', 'bandwidth'),
+	('simulateerrors', 'error_rate'),
+	('simulateerrorcodes', 'error_codes'),
+	('simulatelistingdelay', 'listing_delay'),
+	('simulateseed', 'seed')]
+
+
 def get_client_name(repository, config={}):
 	"""
 	Read client name from config or fall back to default.
@@ -183,8 +192,17 @@ def parse_section(config, repository, logger):
 				args['config']['encryption'] = _cipher
 			else:
 				args['encryption'] = _cipher
+	# latency and fault injection
+	simulation = {}
+	for field, arg in simulation_fields:
+		if field in args:
+			simulation[arg] = args.pop(field)
+	if 'bandwidth' in simulation:
+		from escale.base.launcher import bandwidth_limit
+		simulation['bandwidth'] = bandwidth_limit(simulation['bandwidth'])
 	import escale.relay as relay
 	relay_class = relay.by_protocol(args['protocol'], logger=logger,
+		simulation=simulation,
 		**{a:v for a,v in args.items() if a!='protocol'})
 	return (relay_class, args)
 
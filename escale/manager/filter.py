@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import os
+import re
+import time
+import traceback
+from escale.base.exceptions import ExpressInterrupt
+
+
+# patterns with numbered backreferences cannot be combined with other patterns
+_backreference = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def translate(exp):
+    """
+    Convert a filename pattern from the configuration file into a regular expression.
+
+    Patterns surrounded by slashes (or beginning with a slash) are regular expressions,
+    other patterns are globs in which only ``*`` is special.
+    Patterns are matched against the beginning of the names.
+    """
+    if exp[0] == '/':
+        if exp[-1] == '/':
+            exp = exp[1:-1]
+        else:
+            exp = exp[1:]
+    else:
+        exp = exp.replace('.', '\\.').replace('*', '.*')
+    return exp
+
+
+class Patterns(object):
+    """
+    Set of regular expressions that are matched at once.
+
+    The expressions are combined into a single alternation, except those that
+    cannot be combined (e.g. with backreferences), which are matched one after
+    the other.
+
+    Iterating over a :class:`Patterns` object yields the individual compiled
+    expressions.
+
+    *new in 0.7.14*
+    """
+    __slots__ = ['expressions', '_combined', '_others']
+
+    def __init__(self, expressions):
+        self.expressions = list(expressions)
+        self._combined = None
+        self._others = []
+        combinable = []
+        for exp in self.expressions:
+            if exp.flags & ~re.UNICODE or _backreference.search(exp.pattern):
+                self._others.append(exp)
+            else:
+                combinable.append(exp)
+        if combinable:
+            try:
+                self._combined = re.compile('|'.join([ '(?:{})'.format(exp.pattern)
+                    for exp in combinable ]))
+            except re.error:
+                # e.g. global inline flags
+                self._others = self.expressions
+                self._combined = None
+
+    def match(self, name):
+        """
+        Tell whether any expression matches the beginning of `name`.
+        """
+        if self._combined is not None and self._combined.match(name):
+            return True
+        for exp in self._others:
+            if exp.match(name):
+                return True
+        return False
+
+    def __iter__(self):
+        return iter(self.expressions)
+
+    def __len__(self):
+        return len(self.expressions)
+
+
+def compile_patterns(patterns, kind='filename', logger=None):
+    """
+    Compile the filename or directory name patterns from the configuration file.
+
+    Arguments:
+
+        patterns (str or list of str): patterns.
+
+        kind (str): *'filename'* or *'directory name'*, for the error messages.
+
+        logger (logging.Logger): logger for the invalid patterns.
+
+    Returns:
+
+        Patterns: compiled patterns, or ``None`` if `patterns` is empty.
+    """
+    if not patterns:
+        return None
+    if not isinstance(patterns, (tuple, list)):
+        patterns = [ patterns ]
+    expressions = []
+    for exp in patterns:
+        exp = translate(exp)
+        try:
+            expressions.append(re.compile(exp))
+        except ExpressInterrupt:
+            raise
+        except:
+            if logger is not None:
+                logger.error("wrong %s pattern '%s'", kind, exp)
+                logger.debug(traceback.format_exc())
+    return Patterns(expressions)
+
+
+class Filter(object):
+    """
+    Select files by extension, basename and directory name.
+
+    The decisions for directories are cached, so that the files in a same
+    directory are tested against the directory patterns only once.
+
+    Attributes:
+
+        filetype (frozenset): admitted file extensions, including the leading dot.
+
+        include (Patterns): patterns for the basenames to be included.
+
+        exclude (Patterns): patterns for the basenames to be excluded.
+
+        include_directory (Patterns): patterns for the directories to be included.
+
+        exclude_directory (Patterns): patterns for the directories to be excluded.
+
+        max_cached_directories (int): maximum number of cached directory decisions.
+
+    *new in 0.7.14*
+    """
+    __slots__ = ['filetype', 'include', 'exclude', 'include_directory', 'exclude_directory',
+            'max_cached_directories', '_directories']
+
+    def __init__(self, filetype=None, include=None, exclude=None,
+            include_directory=None, exclude_directory=None, max_cached_directories=100000):
+        self.filetype = frozenset(filetype) if filetype else None
+        self.include = include if include else None
+        self.exclude = exclude if exclude else None
+        self.include_directory = include_directory if include_directory else None
+        self.exclude_directory = exclude_directory if exclude_directory else None
+        self.max_cached_directories = max_cached_directories
+        self._directories = {}
+
+    def file(self, basename):
+        """
+        Tell if a file is to be selected, by extension and basename.
+        """
+        if self.filetype and os.path.splitext(basename)[1] not in self.filetype:
+            return False
+        if self.include is not None and not self.include.match(basename):
+            return False
+        if self.exclude is not None and self.exclude.match(basename):
+            return False
+        return True
+
+    def directory(self, dirname):
+        """
+        Tell if a directory (relative path) is to be crawled.
+        """
+        if self.include_directory is None and self.exclude_directory is None:
+            return True
+        try:
+            return self._directories[dirname]
+        except KeyError:
+            pass
+        ok = True
+        if self.include_directory is not None:
+            ok = self.include_directory.match(dirname)
+        if ok and self.exclude_directory is not None:
+            ok = not self.exclude_directory.match(dirname)
+        if self.max_cached_directories <= len(self._directories):
+            self._directories.clear()
+        self._directories[dirname] = ok
+        return ok
+
+    def paths(self, files):
+        """
+        Select file paths.
+
+        Arguments:
+
+            files (iterable): relative file paths, with ``/`` as separator.
+
+        Returns:
+
+            list: selected file paths from `files`.
+        """
+        selected = []
+        for f in files:
+            dirname, _, basename = f.rpartition('/')
+            if self.directory(dirname) and self.file(basename):
+                selected.append(f)
+        return selected
+
+
+def filter_throughput(npaths=1000000, npatterns=24, repeat=1):
+    """
+    Measure how fast file paths are filtered, with a combined :class:`Filter`
+    and with the patterns matched one after the other (as before 0.7.14).
+
+    The paths and the patterns are synthetic.
+
+    Arguments:
+
+        npaths (int): number of file paths.
+
+        npatterns (int): approximate number of patterns of each kind.
+
+        repeat (int): number of measurements; the best one is kept.
+
+    Returns:
+
+        dict: number of paths per second for *'combined'* and *'sequential'*.
+    """
+    extensions = ['.txt', '.csv', '.dat', '.h5', '.json', '.log', '.tmp', '']
+    paths = [ 'project{}/run{}/sample{}/file{}{}'.format(i % 17, i % 101, i % 1009, i,
+            extensions[i % len(extensions)]) for i in range(npaths) ]
+    filetype = [ '.txt', '.csv', '.dat', '.h5', '.json' ]
+    include = [ 'file{}*'.format(i) for i in range(1, 10) ] + \
+        [ '/.*_{}[a-z]+/'.format(i) for i in range(npatterns - 9) ]
+    exclude = [ '*~', '*.swp', '/\\.#.*/' ] + \
+        [ 'file{}0*'.format(i) for i in range(npatterns - 3) ]
+    include_directory = [ 'project{}'.format(i) for i in range(npatterns) ]
+    exclude_directory = [ 'project{}/run{}/'.format(i, i) for i in range(npatterns) ]
+    kinds = dict(include=include, exclude=exclude,
+            include_directory=include_directory, exclude_directory=exclude_directory)
+    compiled = { kind: compile_patterns(patterns) for kind, patterns in kinds.items() }
+    expressions = { kind: list(patterns) for kind, patterns in compiled.items() }
+    def sequential(files):
+        # the former implementation of `Manager.filter`
+        files = [ f for f in files if os.path.splitext(f)[1] in filetype ]
+        files = [ f for f in files if any([ exp.match(os.path.basename(f)) for exp in expressions['include'] ]) ]
+        files = [ f for f in files if not any([ exp.match(os.path.basename(f)) for exp in expressions['exclude'] ]) ]
+        files = [ f for f in files if any([ exp.match(os.path.dirname(f)) for exp in expressions['include_directory'] ]) ]
+        files = [ f for f in files if not any([ exp.match(os.path.dirname(f)) for exp in expressions['exclude_directory'] ]) ]
+        return files
+    def combined(files):
+        return Filter(filetype, **compiled).paths(files)
+    throughput = {}
+    selected = {}
+    for name, func in (('sequential', sequential), ('combined', combined)):
+        best = None
+        for _ in range(repeat):
+            t0 = time.time()
+            selected[name] = func(paths)
+            t = time.time() - t0
+            if best is None or t < best:
+                best = t
+        throughput[name] = npaths / max(best, 1e-9)
+    if selected['sequential'] != selected['combined']:
+        raise RuntimeError('the filters do not select the same files')
+    return throughput
+
@@ -16,6 +16,7 @@ from escale.base.timer import Clock
 from escale.base.config import storage_space_unit
 import time
 import os
+import threading
 
 
 class TimeQuotaController(object):
@@ -26,9 +27,18 @@ class TimeQuotaController(object):
 
 		quota (int or float): maximum used space on relay host, in MB.
 
+		watchers (list of escale.manager.watch.Watcher): change watchers that
+			interrupt the waiting time between two synchronization cycles.
+
+		idle_refresh (int or float): maximum refresh interval in seconds for
+			idle repositories; the waiting time keeps on doubling beyond
+			`refresh` as long as nothing changes.
+
+	*new in 0.7.14:* `watchers` and `idle_refresh`
+
 	"""
 	def __init__(self, refresh=True, quota=None, quota_read_interval=None, quota_read_callback=None,
-			logger=None):
+			logger=None, watchers=[], idle_refresh=None):
 		self.logger = logger
 		if isinstance(refresh, bool) and refresh:
 			refresh = 30 # seconds
@@ -62,17 +72,135 @@ class TimeQuotaController(object):
 			self.quota_read_callback = quota_read_callback
 		#self._max_space = None # attribute will be dynamically created
 		self._used_space = None
+		self.watchers = list(watchers)
+		self.idle_refresh = idle_refresh
+		self.poll_interval = 1 # second
+		self._wakeup = threading.Event()
 
-	def wait(self):
+	def reset(self):
+		"""
+		Reset the adaptive timer after changes.
+		"""
+		self.clock.reset()
+
+	def delay(self):
+		"""
+		Next waiting time in seconds, or ``None`` if the controller timed out.
+		"""
 		if self.clock is None:
+			return None
+		try:
+			delay = self.clock.next()
+		except StopIteration:
+			return None
+		if self.idle_refresh and delay < self.idle_refresh:
+			# back off further once the clock has reached its maximum delay
+			idle_cycles = self.clock.count - self.clock.count_at_max_delay
+			if 0 < idle_cycles:
+				delay = min(self.idle_refresh, delay * 2 ** min(idle_cycles, 32))
+		return delay
+
+	def watch(self):
+		"""
+		Take the current state of the watched resources as a reference.
+
+		Called at the beginning of every synchronization cycle, so that the
+		changes that occur during the cycle are detected afterwards.
+		"""
+		for watcher in self.watchers:
+			watcher.reset()
+
+	def notify(self):
+		"""
+		Interrupt the current or next waiting time.
+
+		Can be called from any thread (e.g. by a push-notification adapter or
+		a signal handler).
+		"""
+		self._wakeup.set()
+
+	def notified(self):
+		"""
+		Tell whether a change was notified, without reading the watchers.
+
+		A notification is consumed.
+		"""
+		if self._wakeup.is_set():
+			self._wakeup.clear()
+			return True
+		return False
+
+	def poll(self):
+		"""
+		Read the watchers and notify the changes they detect.
+
+		Returns:
+
+			bool: ``True`` if a change was detected.
+		"""
+		for watcher in self.watchers:
+			if watcher.changed():
+				self.notify()
+				return True
+		return False
+
+	def changed(self):
+		"""
+		Tell whether a change was notified or detected by a watcher since
+		the last call to :meth:`watch`.
+
+		A notification is consumed.
+		"""
+		if self.notified():
+			return True
+		if self.poll():
+			self._wakeup.clear()
+			return True
+		return False
+
+	def sleep(self, delay):
+		"""
+		Wait for `delay` seconds or until a change is notified or detected.
+
+		Returns:
+
+			bool: ``True`` if interrupted by a change.
+		"""
+		deadline = time.time() + delay
+		while not self.changed():
+			remaining = deadline - time.time()
+			if remaining <= 0:
+				return False
+			if self.watchers:
+				remaining = min(remaining, self.poll_interval)
+			self._wakeup.wait(remaining)
+		return True
+
+	def wait(self):
+		delay = self.delay()
+		if delay is None:
 			return False
 		else:
-			try:
-				self.clock.wait(self.logger)
-			except StopIteration:
-				return False
-			else:
-				return True
+			self.sleep(delay)
+			return True
+
+	def usage(self):
+		"""
+		Last known storage space usage on the relay host.
+
+		Returns:
+
+			(float, float): used space and quota (or maximum space), in MB;
+			either is ``None`` if not known.
+
+		*new in 0.7.14*
+		"""
+		max_space = getattr(self, '_max_space', None)
+		if self.quota and max_space:
+			quota = min(max_space, self.quota)
+		else:
+			quota = self.quota or max_space
+		return self._used_space, quota
 
 	def pull(self, local_file):
 		return self
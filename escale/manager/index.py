@@ -22,6 +22,7 @@
 
 from escale.base import *
 from .manager import Manager
+from .stats import file_size
 from ..base.config import storage_space_unit
 from ..relay.info import Metadata, parse_metadata
 from ..relay.index import AbstractIndexRelay
@@ -176,8 +177,9 @@ class IndexManager(Manager):
                                     pass
                                 self.encryption.decrypt(encrypted, archive)
                                 try:
-                                    with tarfile.open(archive, mode='r:bz2') as tar:
-                                        tar.extractall(self.extraction_repository)
+                                    with self.stats.timer('decompression', os.path.getsize(archive)):
+                                        with tarfile.open(archive, mode='r:bz2') as tar:
+                                            tar.extractall(self.extraction_repository)
                                 except Exception as e: # ReadError: not a bzip2 file
                                     self.logger.error("%s", e)
                                     missing = [ m for m, _, _, _ in get_files ]
@@ -211,9 +213,11 @@ class IndexManager(Manager):
                                 else:
                                     #self.logger.info("file '%s' successfully downloaded", remote)
                                     successful.append(remote)
+                                    self.stats.record('pulled', nbytes=file_size(local))
                                     if mtime:
                                         if self.checksum_cache is not None \
-                                            and metadata and metadata.checksum:
+                                            and metadata and metadata.checksum \
+                                            and self.hash_function.compatible(metadata.checksum):
                                             resource = remote
                                             self.checksum_cache[resource] = (mtime, metadata.checksum)
                                         # set last modification time
@@ -235,20 +239,38 @@ class IndexManager(Manager):
         new = False
         indexed = defaultdict(list)
         not_indexed = []
-        for resource in self.localFiles():
+        local = self.localFiles()
+        for resource in local:
             remote_file = resource
             if self.relay.indexed(remote_file):
                 indexed[self.relay.page(remote_file)].append(resource)
             else:
                 not_indexed.append(resource)
         local_file_count = {p: len(indexed[p]) for p in indexed}
+        # missing files per page, as in `escalectl list-pending`
+        pending = {}
         if 1 < self.verbosity:
             self.logger.debug('upload has listed %s local files', sum(local_file_count.values()))
         #
+        if self.transfer_order:
+            rank = dict([ (resource, n) for n, resource in enumerate(local) ])
         t0 = None
         while True:
             any_page_update, any_postponed = False, False
+            # pages may have been split or merged (see `AdaptiveIndex`)
+            regrouped = defaultdict(list)
             for page in indexed:
+                for resource in indexed[page]:
+                    regrouped[self.relay.page(resource)].append(resource)
+            if self.transfer_order:
+                for page in regrouped:
+                    regrouped[page].sort(key=rank.get)
+            indexed = regrouped
+            pages = list(indexed)
+            if self.transfer_order:
+                # pages with the files of highest priority first
+                pages.sort(key=lambda page: rank[indexed[page][0]] if indexed[page] else len(rank))
+            for page in pages:
                 #self.logger.debug("page '%s'", page)
                 pushed = []
                 fd, archive = tempfile.mkstemp()
@@ -307,9 +329,11 @@ class IndexManager(Manager):
                                         self.max_page_size, size)
                                 break
                         if update:
-                            with tarfile.open(archive, mode='w:bz2') as tar:
-                                for f in os.listdir(tmpdir):
-                                    tar.add('/'.join((tmpdir, f)), arcname=f, recursive=True)
+                            with self.stats.timer('compression') as timer:
+                                with tarfile.open(archive, mode='w:bz2') as tar:
+                                    for f in os.listdir(tmpdir):
+                                        tar.add('/'.join((tmpdir, f)), arcname=f, recursive=True)
+                                timer.nbytes = os.path.getsize(archive)
                             final_file = self.encryption.encrypt(archive)
                             while True:
                                 try:
@@ -324,6 +348,7 @@ class IndexManager(Manager):
                                     break
                             self.encryption.finalize(final_file)
                         indexed[page] = indexed[page][n+1:]
+                        pending[page] = len([ r for r in indexed[page] if r not in page_index ])
                     any_page_update = bool(pushed)
                 except PostponeRequest:
                     any_postponed = True
@@ -334,6 +359,9 @@ class IndexManager(Manager):
                     raise
                 finally:
                     if pushed:
+                        for resource in pushed:
+                            self.stats.record('pushed',
+                                    nbytes=file_size(self.repository.absolute(resource)))
                         self.reportTransferred('upload', pushed)
                         #for resource in pushed:
                         #    self.logger.info("file '%s' successfully uploaded", resource)
@@ -356,14 +384,14 @@ class IndexManager(Manager):
                 unexplored_pages = []
                 for p in indexed:
                     _count = len(indexed[p])
-                    if _count < local_file_count[p]:
+                    if _count < local_file_count.get(p, _count + 1):
                         pending_file_count[p] = _count
                     else:
                         unexplored_pages.append(p)
                 if pending_file_count:
                     self.logger.debug('%s files of %s are still pending for upload in pages %s (respectively); staying in the upload phase',
                         '/'.join([str(pending_file_count[p]) for p in pending_file_count]),
-                        '/'.join([str(local_file_count[p]) for p in pending_file_count]),
+                        '/'.join([str(local_file_count.get(p, '?')) for p in pending_file_count]),
                         '/'.join(pending_file_count.keys()))
                 if unexplored_pages:
                     if unexplored_pages[1:]:
@@ -386,6 +414,15 @@ class IndexManager(Manager):
                 #for page in indexed:
                 #    self.relay.loaded(page)
                 self.remoteListing()
+        # *new in 0.7.14*: split or merge pages
+        try:
+            self.relay.rebalancePages()
+        except (ExpressInterrupt, QuotaExceeded):
+            raise
+        except PostponeRequest:
+            pass
+        except Exception as e:
+            self.logger.warning('failed to rebalance the index pages: %s', e)
         #
         if not_indexed:
             remote = self.relay.listTransferred('', end2end=False)
@@ -427,10 +464,17 @@ class IndexManager(Manager):
                         ok = False
                     finally:
                         self.encryption.finalize(temp_file)
+                    self.stats.record('pushed', nbytes=file_size(local_file) if ok else None,
+                            error=not ok)
                     if ok:
                         self.logger.debug("file '%s' successfully uploaded", remote_file)
+                        self._transferred(remote, remote_file)
                     elif ok is not None:
                         self.logger.warning("failed to upload '%s'", remote_file)
+        pending = sum(pending.values())
+        if not_indexed:
+            pending += self.pendingUploads(not_indexed, remote)
+        self.stats.set('pending uploads', pending)
         return new
 
     def localFiles(self, path=None):
@@ -24,13 +24,17 @@ import calendar
 import os
 import sys
 import traceback
-import re
 from escale.base import *
 from escale.base.config import storage_space_unit
 from escale.encryption.encryption import Plain
 from .history import TimeQuotaController
+from .watch import LocalWatcher, RemoteWatcher
+from .filter import Filter, compile_patterns
 from .cache import *
-import hashlib
+from .stats import Stats, instrument, file_size, local_file_size, profile_file_prefix
+from .priority import make_transfer_order
+from escale.relay.parts import PartStore
+from escale.base.checksum import HashFunction, default_algorithm
 
 
 class Manager(Reporter):
@@ -56,7 +60,8 @@ class Manager(Reporter):
             If `str`, in addition determines the timestamp format as supported by
             :func:`time.strftime`.
 
-        checksum (str): hash algorithm name; see also the :mod:`hashlib` library.
+        checksum (str): hash algorithm name; see also the :mod:`hashlib` library
+            and :mod:`escale.base.checksum`.
 
         checksum_cache (bool or str or dict): path to a checksum cache file (str) or cache (dict)
             of checksums for local files for relative filepaths as keys and
@@ -81,19 +86,76 @@ class Manager(Reporter):
 
         verbosity (int): 2 or higher makes Escale so verbose that it can make the entire OS freeze.
 
+        localwatch (bool or float): interrupt the waiting time between two
+            synchronization cycles when files are created, deleted or
+            renamed in the local repository; if `float`, polling interval in seconds.
+
+        remotewatch (bool or float): interrupt the waiting time when
+            :meth:`~escale.relay.AbstractRelay.probe` reports a change on
+            the relay host; if `float`, polling interval in seconds.
+
+        idlerefresh (float): maximum refresh interval for idle repositories,
+            in seconds.
+
+        placeholder_cache (escale.manager.cache.PlaceholderCache): persistent
+            placeholder cache, if any; becomes the
+            :attr:`~escale.relay.Relay.placeholder_cache` attribute of the relay.
+
         relay_args (dict): extra keyword arguments for
             :meth:`~escale.relay.AbstractRelay.pop`.
 
+        path_filter (escale.manager.filter.Filter): combined `filetype`, `include`,
+            `exclude`, `includedirectory` and `excludedirectory` filters.
+
+        stats (escale.manager.stats.Stats): counts, latencies and amounts of data
+            for the synchronization phases, the relay primitives, the checksums
+            and the encryption layer, and cache hits.
+
+        stats_interval (int): interval in seconds between two statistics log lines;
+            no statistics are logged if ``None``.
+
+        stats_file (str): path to the JSON file the statistics are written to
+            after each cycle, if any.
+
+        profile (str): *'cpu'*, *'memory'* or *'all'*; profile each cycle and
+            dump the profile into `profile_file` with extension *.prof* (:mod:`cProfile`)
+            or *.mem* (:mod:`tracemalloc`).
+
+        report_stats (bool): send the statistics to the user-interface controller
+            after each cycle, for the metrics endpoint of the launcher.
+
+        shaper (escale.relay.shaping.Shaper): bandwidth limits applied to the
+            transfers of the relay, if any.
+
+        transfer_order (escale.manager.priority.TransferOrder): priority policies
+            for uploads; the files are uploaded in scan order if ``None``.
+
+        part_store (str or escale.relay.parts.PartStore): directory for the
+            progress records of the transfers of large files; becomes the
+            :attr:`~escale.relay.Relay.part_store` attribute of the relay.
+
     *new in 0.7.1:* `checksum_cache`
     *new in 0.7.4:* `wait_on_error`
     *new in 0.7.6:* `verbosity`
+    *new in 0.7.14:* checksums generated by non-legacy algorithms are tagged
+    with the algorithm name
+    *new in 0.7.14:* `localwatch`, `remotewatch` and `idlerefresh`
+    *new in 0.7.14:* `placeholder_cache`
+    *new in 0.7.14:* `path_filter`; the patterns of each kind are matched at once
+    *new in 0.7.14:* `stats`, `stats_interval`, `stats_file`, `profile` and `profile_file`
+    *new in 0.7.14:* `report_stats`
+    *new in 0.7.14:* `shaper`
+    *new in 0.7.14:* `transfer_order`
+    *new in 0.7.14:* `part_store`
 
     """
     def __init__(self, relay, repository=None, address=None, directory=None, \
         encryption=Plain(None), timestamp=True, refresh=True, clientname=None, \
         filetype=[], include=None, exclude=None, tq_controller=None, count=None, \
         checksum=True, checksum_cache=None, includedirectory=None, excludedirectory=None, \
-        waitonerror=[], verbosity=1, **relay_args):
+        waitonerror=[], verbosity=1, placeholder_cache=None, stats_file=None, \
+        profile_file=None, report_stats=False, shaper=None, part_store=None,
+        **relay_args):
         Reporter.__init__(self, **relay_args)
         self.repository = repository
         if directory:
@@ -106,21 +168,15 @@ class Manager(Reporter):
         if checksum:
             if isinstance(checksum, (bool, int)):
                 # poor default algorithm for compatibility with Python<3.6 clients
-                checksum = 'sha512'
-            def hash_function(data):
-                h = hashlib.new(checksum)
-                h.update(asbytes(data))
-                return h.hexdigest()
+                checksum = default_algorithm
             try:
-                hashlib.new(checksum)
+                hash_function = HashFunction(checksum)
             except ValueError:
                 self.logger.warning("unsupported hash algorithm: '%s'", checksum)
                 self.logger.warning('checksum support deactivated')
                 hash_function = None
-            if checksum == 'sha256':
-                assert hash_function('test') == '9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08'
-            elif checksum == 'sha512':
-                assert hash_function('test') == 'ee26b0dd4af7e749aa1a8ee3c10ae9923f618980772e473f8819a5d4940e0db27ac185f8a0e1d5f84f88bc887fd67b143732c304cc5fa9ad8e6f57f50028a8ff'
+            else:
+                assert hash_function.selftest()
             self.hash_function = hash_function
         else:
             self.hash_function = None
@@ -143,104 +199,99 @@ class Manager(Reporter):
                     for f in filetype ]
         else:
             self.filetype = []
-        self.include = None
-        if include:
-            if not isinstance(include, (tuple, list)):
-                include = [ include ]
-            self.include = []
-            for exp in include:
-                if exp[0] == '/':
-                    if exp[-1] == '/':
-                        exp = exp[1:-1]
-                    else:
-                        exp = exp[1:]
-                else:
-                    exp = exp.replace('.', '\.').replace('*', '.*')
-                try:
-
-                    self.include.append(re.compile(exp))
-                except ExpressInterrupt:
-                    raise
-                except:
-                    self.logger.error("wrong filename pattern '%s'", exp)
-                    self.logger.debug(traceback.format_exc())
-        self.exclude = None
-        if exclude:
-            if not isinstance(exclude, (tuple, list)):
-                exclude = [ exclude ]
-            self.exclude = []
-            for exp in exclude:
-                if exp[0] == '/':
-                    if exp[-1] == '/':
-                        exp = exp[1:-1]
-                    else:
-                        exp = exp[1:]
-                else:
-                    exp = exp.replace('.', '\.').replace('*', '.*')
-                try:
-
-                    self.exclude.append(re.compile(exp))
-                except ExpressInterrupt:
-                    raise
-                except:
-                    self.logger.error("wrong filename pattern '%s'", exp)
-                    self.logger.debug(traceback.format_exc())
-        self.include_directory = None
-        if includedirectory:
-            if not isinstance(includedirectory, (tuple, list)):
-                includedirectory = [ includedirectory ]
-            self.include_directory = []
-            for exp in includedirectory:
-                if exp[0] == '/':
-                    if exp[-1] == '/':
-                        exp = exp[1:-1]
-                    else:
-                        exp = exp[1:]
-                else:
-                    exp = exp.replace('.', '\.').replace('*', '.*')
-                try:
-
-                    self.include_directory.append(re.compile(exp))
-                except ExpressInterrupt:
-                    raise
-                except:
-                    self.logger.error("wrong directory name pattern '%s'", exp)
-                    self.logger.debug(traceback.format_exc())
-        self.exclude_directory = None
-        if excludedirectory:
-            if not isinstance(excludedirectory, (tuple, list)):
-                excludedirectory = [ excludedirectory ]
-            self.exclude_directory = []
-            for exp in excludedirectory:
-                if exp[0] == '/':
-                    if exp[-1] == '/':
-                        exp = exp[1:-1]
-                    else:
-                        exp = exp[1:]
-                else:
-                    exp = exp.replace('.', '\.').replace('*', '.*')
-                try:
-
-                    self.exclude_directory.append(re.compile(exp))
-                except ExpressInterrupt:
-                    raise
-                except:
-                    self.logger.error("wrong directory name pattern '%s'", exp)
-                    self.logger.debug(traceback.format_exc())
+        self.include = compile_patterns(include, logger=self.logger)
+        self.exclude = compile_patterns(exclude, logger=self.logger)
+        self.include_directory = compile_patterns(includedirectory,
+                kind='directory name', logger=self.logger)
+        self.exclude_directory = compile_patterns(excludedirectory,
+                kind='directory name', logger=self.logger)
+        self.path_filter = Filter(self.filetype, self.include, self.exclude,
+                self.include_directory, self.exclude_directory)
         self.pop_args = {}
         arg_map = [('locktimeout', 'lock_timeout'),
-            ('maxpendingtransfers', 'max_pending_transfers')]
+            ('maxpendingtransfers', 'max_pending_transfers'),
+            ('changeprobe', 'change_probe'),
+            ('maxconnections', 'max_connections'),
+            ('manifestcompat', 'manifest_compat'),
+            ('metadataconcurrency', 'metadata_concurrency'),
+            ('downloadsegments', 'download_segments')]
         for cfg_arg, rel_arg in arg_map:
             if cfg_arg in relay_args:
                 relay_args[rel_arg] = relay_args.pop(cfg_arg)
         self.max_pending_transfers = relay_args.pop('max_pending_transfers', None)
+        local_watch = relay_args.pop('localwatch', None)
+        remote_watch = relay_args.pop('remotewatch', None)
+        idle_refresh = relay_args.pop('idlerefresh', None)
+        self.stats_interval = relay_args.pop('statsinterval', None)
+        self.profile = relay_args.pop('profile', None)
+        retry_on_error = relay_args.pop('retryonerror', [])
+        part_size = relay_args.pop('partsize', None)
+        transfer_order = relay_args.pop('transferorder', None)
+        directory_priority = relay_args.pop('directorypriority', None)
+        transfer_deadline = relay_args.pop('transferdeadline', None)
+        try:
+            self.transfer_order = make_transfer_order(transfer_order,
+                    directory_priority, transfer_deadline)
+        except ValueError as e:
+            self.logger.warning('%s; ignoring', e)
+            self.transfer_order = None
         self.relay = relay(clientname, address, directory, **relay_args)
+        self.placeholder_cache = None
+        if placeholder_cache and hasattr(self.relay, 'placeholder_cache'):
+            if isinstance(placeholder_cache, bool):
+                placeholder_cache = get_cache_file(section=self.repository.name,
+                        prefix=placeholder_cache_prefix)
+            if isinstance(placeholder_cache, basestring):
+                placeholder_cache = PlaceholderCache(placeholder_cache,
+                        address=self.relay.address, repository=self.relay.repository,
+                        log=self.logger.debug)
+            self.placeholder_cache = self.relay.placeholder_cache = placeholder_cache
+        self.part_store = None
+        base_relay = getattr(self.relay, 'base_relay', self.relay)
+        if part_store and hasattr(base_relay, 'part_store'):
+            if isinstance(part_store, basestring):
+                if part_size:
+                    part_size, unit = part_size
+                    part_size = int(part_size * storage_space_unit[unit or 'MB'] * 1048576)
+                part_store = PartStore(part_store, part_size)
+            self.part_store = base_relay.part_store = part_store
+        self.stats = Stats()
+        self.stats_file = stats_file
+        if self.profile:
+            if self.profile is True or self.profile not in ('cpu', 'memory', 'all'):
+                self.profile = 'all'
+            if not profile_file:
+                profile_file = get_cache_file(section=self.repository.name,
+                        prefix=profile_file_prefix)
+        self.profile_file = profile_file
+        self.report_stats = report_stats
+        self.shaper = shaper
+        if shaper:
+            shaper.shape(getattr(self.relay, 'base_relay', self.relay))
+            shaper.stats = self.stats
+        self._instrument()
         if tq_controller is None:
             self.tq_controller = TimeQuotaController(refresh, logger=self.logger)
         self.tq_controller.quota_read_callback = self.relay.storageSpace
+        if local_watch and self.repository is not None:
+            if local_watch is True:
+                watcher = LocalWatcher(self.repository.path)
+            else:
+                watcher = LocalWatcher(self.repository.path, local_watch)
+            self.tq_controller.watchers.append(watcher)
+        if remote_watch:
+            if remote_watch is True:
+                watcher = RemoteWatcher(self.relay, logger=self.logger)
+            else:
+                watcher = RemoteWatcher(self.relay, remote_watch, logger=self.logger)
+            self.tq_controller.watchers.append(watcher)
+        if idle_refresh:
+            self.tq_controller.idle_refresh = idle_refresh
         if count:
             self.pop_args['placeholder'] = count
         self.wait_on_error = [104,107,111,500]
+        # option 'retry on error'
+        waitonerror = list(waitonerror) + list(retry_on_error)
         if waitonerror:
             self.wait_on_error += [ int(e) for e in waitonerror ]
         #if isinstance(restartonerror, int):
@@ -251,6 +302,33 @@ class Manager(Reporter):
         self.verbosity = verbosity
 
 
+    def _instrument(self):
+        """
+        Record the calls to the synchronization phases, the relay primitives
+        and the encryption layer in :attr:`stats`.
+
+        *new in 0.7.14*
+        """
+        instrument(self, self.stats, ['remoteListing', 'sanityChecks', 'download',
+            'upload', 'localFiles', 'downloadFile', 'uploadFile', 'uploadFiles'])
+        relay = getattr(self.relay, 'base_relay', self.relay)
+        instrument(relay, self.stats, ['_get', '_push', '_pop', '_list', '_getMany',
+                'exists', 'unlink', 'unlink_many'], prefix='relay.',
+            nbytes=dict(_get=local_file_size(1), _pop=local_file_size(1),
+                _push=local_file_size(0)))
+        instrument(relay, self.stats, ['_cachedMetadata'], hits='placeholder cache')
+        # injected delays and faults
+        simulation = getattr(relay, 'simulation', None)
+        if simulation is not None:
+            simulation.stats = self.stats
+        # page lock waits
+        instrument(self.relay, self.stats, ['acquirePageLock'], prefix='relay.',
+            failures=True)
+        instrument(self.encryption, self.stats, ['encrypt', 'decrypt', 'prepare',
+                'finalize'], prefix='encryption.',
+            nbytes=dict(encrypt=local_file_size(0), decrypt=local_file_size(1)))
+
+
     # transitional alias properties
     @property
     def path(self):
@@ -289,6 +367,19 @@ class Manager(Reporter):
                 path_to_remote_repository
                 ).run()
 
+        """
+        for delay in self.cycles():
+            self.tq_controller.sleep(delay)
+
+    def cycles(self):
+        """
+        Generator version of :meth:`run`.
+
+        Runs the manager but yields the waiting times between two
+        synchronization cycles instead of sleeping, so that the caller can
+        schedule several managers.
+
+        *new in 0.7.14*
         """
         self.logger.debug("connecting to '%s'", self.relay.address)
         try:
@@ -305,26 +396,51 @@ class Manager(Reporter):
         _last_error_time = 0
         _same_error_count = -1
         _request_restart = None
+        _last_stats_time = time.time()
         while True:
             new = False
+            self.tq_controller.watch()
             try:
-                self.remoteListing()
-                if _check_sanity:
-                    self.sanityChecks()
-                    _check_sanity = False
-                if self.mode != 'upload':
-                    new |= self.download()
-                if self.mode != 'download':
-                    new |= self.upload()
+                t0 = time.time()
+                with self.stats.timer('cycle'):
+                    if self.profile:
+                        new = self._profiled(self.synchronize, _check_sanity)
+                    else:
+                        new = self.synchronize(_check_sanity)
+                self.relay.notifyChanges()
+                if isinstance(self.placeholder_cache, PlaceholderCache):
+                    self.placeholder_cache.flush()
+                self.stats.cycles += 1
+                self.stats.set('last cycle duration', time.time() - t0)
+                used_space, quota = self.tq_controller.usage()
+                if used_space is not None:
+                    self.stats.set('used space', used_space * 1048576)
+                if quota:
+                    self.stats.set('quota', quota * 1048576)
+                if self.report_stats:
+                    self.ui_controller.reportStats(self.repository.name,
+                            self.stats.snapshot())
+                if self.stats_interval and \
+                        self.stats_interval <= time.time() - _last_stats_time:
+                    self.logger.info('statistics: %s', self.stats.summary())
+                    _last_stats_time = time.time()
+                if self.stats_file:
+                    try:
+                        self.stats.dump(self.stats_file)
+                    except (IOError, OSError) as e:
+                        self.logger.debug('cannot write the statistics: %s', e)
+                _check_sanity = False
                 if _fresh_start:
                     if not new:
                         self.logger.info('repository is up to date')
                     _fresh_start = False
                 if new:
                     self.logger.debug('reset adaptive timer')
-                    self.tq_controller.clock.reset()
-                if not self.tq_controller.wait():
+                    self.tq_controller.reset()
+                delay = self.tq_controller.delay()
+                if delay is None:
                     break
+                yield delay
             except ExpressInterrupt:
                 raise
             except RestartRequest as e:
@@ -333,7 +449,9 @@ class Manager(Reporter):
             except PostponeRequest as e:
                 if e.args:
                     self.logger.debug(*e.args)
-                self.tq_controller.wait()
+                delay = self.tq_controller.delay()
+                if delay:
+                    yield delay
             except Exception as e:
                 t = time.time()
                 wait = False
@@ -372,7 +490,9 @@ class Manager(Reporter):
                 if wait:
                     self.logger.debug(traceback.format_exc())
                     self.logger.debug("%s", e)
-                    self.tq_controller.wait()
+                    delay = self.tq_controller.delay()
+                    if delay:
+                        yield delay
                 else:
                     self.logger.critical(traceback.format_exc())
         # close and clear everything
@@ -389,6 +509,75 @@ class Manager(Reporter):
             self.logger.info('exiting')
 
 
+    def _profiled(self, func, *args):
+        """
+        Call `func` with the profilers in :attr:`profile` on, and write the
+        profiles down in :attr:`profile_file` with extensions *.prof* and *.mem*.
+
+        The profiles of the last cycle replace those of the previous cycle.
+        *.prof* files can be read with :mod:`pstats`.
+
+        *new in 0.7.14*
+        """
+        profiler = tracing = None
+        if self.profile in ('cpu', 'all'):
+            import cProfile
+            profiler = cProfile.Profile()
+        if self.profile in ('memory', 'all'):
+            try:
+                import tracemalloc
+            except ImportError: # Python 2
+                pass
+            else:
+                tracing = not tracemalloc.is_tracing()
+                if tracing:
+                    tracemalloc.start()
+        try:
+            if profiler is None:
+                return func(*args)
+            else:
+                return profiler.runcall(func, *args)
+        finally:
+            try:
+                if profiler is not None:
+                    profiler.dump_stats(self.profile_file + '.prof')
+                if tracing is not None:
+                    snapshot = tracemalloc.take_snapshot()
+                    current, peak = tracemalloc.get_traced_memory()
+                    if tracing:
+                        tracemalloc.stop()
+                    with open(self.profile_file + '.mem', 'w') as f:
+                        f.write('current: {} B\npeak: {} B\n'.format(current, peak))
+                        for stat in snapshot.statistics('lineno')[:50]:
+                            f.write('{}\n'.format(stat))
+            except (IOError, OSError) as e:
+                self.logger.debug('cannot write the profiles: %s', e)
+
+    def synchronize(self, check_sanity=False):
+        """
+        Runs a single synchronization cycle: lists the remote repository,
+        downloads and uploads.
+
+        Arguments:
+
+            check_sanity (bool): perform sanity checks after listing.
+
+        Returns:
+
+            bool: ``True`` if any file has been transferred.
+
+        *new in 0.7.14*
+        """
+        new = False
+        self.remoteListing()
+        if check_sanity:
+            self.sanityChecks()
+        if self.mode != 'upload':
+            new |= self.download()
+        if self.mode != 'download':
+            new |= self.upload()
+        return new
+
     def filter(self, files):
         """
         Applies filters on a list of file paths.
@@ -401,17 +590,7 @@ class Manager(Reporter):
 
             list: list of selected file paths from ``files``.
         """
-        if self.filetype:
-            files = [ f for f in files if os.path.splitext(f)[1] in self.filetype ]
-        if self.include:
-            files = [ f for f in files if any([ exp.match(os.path.basename(f)) for exp in self.include ]) ]
-        if self.exclude:
-            files = [ f for f in files if not any([ exp.match(os.path.basename(f)) for exp in self.exclude ]) ]
-        if self.include_directory:
-            files = [ f for f in files if any([ exp.match(os.path.dirname(f)) for exp in self.include_directory ]) ]
-        if self.exclude_directory:
-            files = [ f for f in files if not any([ exp.match(os.path.dirname(f)) for exp in self.exclude_directory ]) ]
-        return files
+        return self.path_filter.paths(files)
 
     def _filter(self, f):
         """
@@ -425,14 +604,7 @@ class Manager(Reporter):
 
             bool: ``True`` if selected, ``False`` if rejected.
         """
-        ok = True
-        if self.filetype:
-            ok = os.path.splitext(f)[1] in self.filetype
-        if ok and self.include:
-            ok = any([ exp.match(f) for exp in self.include ])
-        if ok and self.exclude:
-            ok = not any([ exp.match(f) for exp in self.exclude ])
-        return ok
+        return self.path_filter.file(f)
 
     def _filter_directory(self, dirname):
         """
@@ -446,12 +618,7 @@ class Manager(Reporter):
 
             bool: ``True`` if selected, ``False`` if rejected.
         """
-        ok = True
-        if ok and self.include_directory:
-            ok = any([ exp.match(dirname) for exp in self.include_directory ])
-        if ok and self.exclude_directory:
-            ok = not any([ exp.match(dirname) for exp in self.exclude_directory ])
-        return ok
+        return self.path_filter.directory(dirname)
 
     def sanityChecks(self):
         """
@@ -470,134 +637,338 @@ class Manager(Reporter):
         Finds out which files are to be downloaded and download them.
         """
         remote = self.filter(self.relay.listReady())
+        self.relay.prefetchMetadata(remote, timestamp_format=self.timestamp)
         new = False
         for remote_file in remote:
-            resource = remote_file
-            local_file = self.repository.writable(resource, absolute=True)
-            if not local_file:
-                # update not allowed
-                continue
-            meta = self.relay.getMetadata(remote_file, timestamp_format=self.timestamp)
-            last_modified = None
-            if self.timestamp:
-                if meta and meta.timestamp:
-                    last_modified = meta.timestamp
-                else:
-                    # if `timestamp` is `True` or is a format string,
-                    # then metadata should be defined
-                    self.logger.warning("corrupt meta information for file '%s'", remote_file)
-            if os.path.isfile(local_file):
-                # calculate a checksum for the local file corresponding to `resource`
-                checksum = self.checksum(resource)
-                # check for modifications
-                if not meta:
-                    self.logger.info("missing meta information for file '%s'; deleting file", remote_file)
+            new |= self.downloadFile(remote_file)
+        return new
+
+    def downloadFile(self, remote_file):
+        """
+        Downloads a file if the local copy is missing or outdated.
+
+        Arguments:
+
+            remote_file (str): path of the regular file on the relay.
+
+        Returns:
+
+            bool: ``True`` if a transfer has been attempted.
+
+        *new in 0.7.14*
+        """
+        resource = remote_file
+        local_file = self.repository.writable(resource, absolute=True)
+        if not local_file:
+            # update not allowed
+            return False
+        meta = self.relay.getMetadata(remote_file, timestamp_format=self.timestamp)
+        last_modified = None
+        if self.timestamp:
+            if meta and meta.timestamp:
+                last_modified = meta.timestamp
+            else:
+                # if `timestamp` is `True` or is a format string,
+                # then metadata should be defined
+                self.logger.warning("corrupt meta information for file '%s'", remote_file)
+        if os.path.isfile(local_file):
+            # calculate a checksum for the local file corresponding to `resource`
+            checksum = self.checksum(resource)
+            # check for modifications
+            if not meta:
+                self.logger.info("missing meta information for file '%s'; deleting file", remote_file)
+                self.relay.delete(remote_file)
+                return False
+            elif not meta.fileModified(local_file, checksum=checksum, remote=True, debug=self.logger.debug):
+                if self.count == 1:
+                    # no one else will ever download the current copy of the regular file
+                    # on the relay; delete it
+                    # this fixes the consequences of a bug introduced somewhere in the 0.4
+                    # family
+                    self.logger.info("deleting duplicate or outdated file '%s'", remote_file)
                     self.relay.delete(remote_file)
-                    continue
-                elif not meta.fileModified(local_file, checksum=checksum, remote=True, debug=self.logger.debug):
-                    if self.count == 1:
-                        # no one else will ever download the current copy of the regular file
-                        # on the relay; delete it
-                        # this fixes the consequences of a bug introduced somewhere in the 0.4
-                        # family
-                        self.logger.info("deleting duplicate or outdated file '%s'", remote_file)
-                        self.relay.delete(remote_file)
-                    continue
-                msg = "updating local file '%s'"
+                return False
+            msg = "updating local file '%s'"
+        else:
+            msg = "downloading file '%s'"
+        with self.repository.confirmPull(resource):
+            new = True
+            temp_file = self.encryption.prepare(local_file)
+            self.logger.info(msg, resource)
+            try:
+                with self.tq_controller.pull(temp_file):
+                    ok = self.relay.pop(remote_file, temp_file, blocking=False, **self.pop_args)
+                if not ok:
+                    raise RuntimeError
+            except RuntimeError: # TODO: define specific exceptions
+                ok = False
+            if ok:
+                self.logger.debug("file '%s' successfully downloaded", resource)
+            elif ok is not None:
+                self.logger.error("failed to download '%s'", resource)
+                return new
+            self.encryption.decrypt(temp_file, local_file)
+            if last_modified:
+                # handle delay on file creation
+                first_time = True
+                while not os.path.exists(local_file):
+                    if first_time:
+                        self.logger.debug('local file not ready: %s', local_file)
+                        first_time = False
+                # set last modification time
+                os.utime(local_file, (time.time(), last_modified))
+            if meta and meta.checksum and self.hash_function and self.part_store is not None \
+                    and self.part_store.min_size < (file_size(local_file) or 0) \
+                    and self.hash_function.compatible(meta.checksum):
+                # large files are received in parts, possibly out of order
+                # and over several attempts; check the whole content
+                if self.checksum(resource) != meta.checksum:
+                    self.logger.error("corrupt download: '%s'; deleting the local copy", resource)
+                    os.unlink(local_file)
+                    self.stats.record('pulled', error=True)
+                    return new
+            self.stats.record('pulled', nbytes=file_size(local_file))
+        return new
+
+    def upload(self):
+        """
+        Finds out which files are to be uploaded and upload them.
+        """
+        new = False
+        local = self.localFiles()
+        remote = self.relay.listTransferred('', end2end=False)
+        if not (self.max_pending_transfers and \
+                self.max_pending_transfers <= len(self.relay.listReady())):
+            if getattr(self.relay, 'manifest', None):
+                new = self.uploadFiles(local, remote)
             else:
-                msg = "downloading file '%s'"
-            with self.repository.confirmPull(resource):
+                for resource in local:
+                    new |= self.uploadFile(resource, remote)
+        self.stats.set('pending uploads', self.pendingUploads(local, remote))
+        return new
+
+    def pendingUploads(self, local, remote):
+        """
+        Counts the local files that are missing on the relay, as listed by
+        ``escalectl list-pending``.
+
+        Arguments:
+
+            local (list): relative paths of the local files.
+
+            remote (list or set): see :meth:`uploadFile`.
+
+        Returns:
+
+            int: number of local files not found in `remote`.
+
+        *new in 0.7.14*
+        """
+        remote = set(remote)
+        return len([ resource for resource in local if resource not in remote ])
+
+    def _transferred(self, remote, remote_file):
+        # keep the listing of the relay up to date for :meth:`pendingUploads`
+        if remote_file not in remote:
+            if isinstance(remote, set):
+                remote.add(remote_file)
+            else:
+                remote.append(remote_file)
+
+    def outdated(self, resource, remote):
+        """
+        Tells whether the remote copy of a local file is missing or outdated.
+
+        Arguments:
+
+            resource (str): relative path of the local file.
+
+            remote (list or set): paths of the files available on the relay,
+                as returned by :meth:`~escale.relay.AbstractRelay.listTransferred`.
+
+        Returns:
+
+            (str, str) or None: path of the regular file on the relay and checksum
+            of the local file, if the local file is to be uploaded.
+
+        *new in 0.7.14*
+        """
+        remote_file = resource
+        local_file = self.repository.absolute(resource)
+        if PYTHON_VERSION == 2 and isinstance(remote_file, unicode) and \
+            remote and isinstance(remote[0], str):
+            remote_file = remote_file.encode('utf-8')
+        try:
+            checksum = self.checksum(resource)
+        except OSError as e: # file unlinked since last call to localFiles?
+            self.logger.warning('%s', e)
+            return None
+        modified = False # if no remote copy, this is ignored
+        exists = remote_file in remote
+        if (self.timestamp or self.hash_function) and exists:
+            # check file last modification time and checksum
+            meta = self.relay.getMetadata(remote_file, timestamp_format=self.timestamp)
+            if meta:
+                modified = meta.fileModified(local_file, checksum=checksum, remote=False, debug=self.logger.debug)
+            else:
+                # no meta information available
+                modified = True
+                # this may not be true, but this will update the meta
+                # information with a valid content.
+        if not exists or modified:
+            return (remote_file, checksum)
+        return None
+
+    def uploadFile(self, resource, remote):
+        """
+        Uploads a local file if the remote copy is missing or outdated.
+
+        Arguments:
+
+            resource (str): relative path of the local file.
+
+            remote (list or set): paths of the files available on the relay,
+                as returned by :meth:`~escale.relay.AbstractRelay.listTransferred`;
+                the uploaded file is added.
+
+        Returns:
+
+            bool: ``True`` if a transfer has been attempted.
+
+        *new in 0.7.14*
+        """
+        new = False
+        local_file = self.repository.absolute(resource)
+        target = self.outdated(resource, remote)
+        if target:
+            remote_file, checksum = target
+            with self.repository.confirmPush(resource):
                 new = True
-                temp_file = self.encryption.prepare(local_file)
-                self.logger.info(msg, resource)
+                last_modified = os.path.getmtime(local_file)
+                temp_file = self.encryption.encrypt(local_file)
+                self.logger.info("uploading file '%s'", resource)
                 try:
-                    with self.tq_controller.pull(temp_file):
-                        ok = self.relay.pop(remote_file, temp_file, blocking=False, **self.pop_args)
-                    if not ok:
-                        raise RuntimeError
-                except RuntimeError: # TODO: define specific exceptions
+                    with self.tq_controller.push(local_file):
+                        ok = self.relay.push(temp_file, remote_file, blocking=False,
+                            last_modified=last_modified, checksum=checksum)
+                except QuotaExceeded as e:
+                    self.logger.info("%s; no more files can be sent", e)
                     ok = False
+                finally:
+                    self.encryption.finalize(temp_file)
+                self.stats.record('pushed', nbytes=file_size(local_file) if ok else None,
+                        error=not ok)
                 if ok:
-                    self.logger.debug("file '%s' successfully downloaded", resource)
+                    self.logger.debug("file '%s' successfully uploaded", resource)
+                    self._transferred(remote, remote_file)
                 elif ok is not None:
-                    self.logger.error("failed to download '%s'", resource)
-                    continue
-                self.encryption.decrypt(temp_file, local_file)
-                if last_modified:
-                    # handle delay on file creation
-                    first_time = True
-                    while not os.path.exists(local_file):
-                        if first_time:
-                            self.logger.debug('local file not ready: %s', local_file)
-                            first_time = False
-                    # set last modification time
-                    os.utime(local_file, (time.time(), last_modified))
+                    self.logger.warning("failed to upload '%s'", resource)
         return new
 
-    def upload(self):
+    def uploadFiles(self, resources, remote):
         """
-        Finds out which files are to be uploaded and upload them.
+        Uploads the local files whose remote copy is missing or outdated, in batches
+        of at most :attr:`~escale.relay.Relay.manifest` files (manifest mode).
+
+        Arguments:
+
+            resources (list): relative paths of the local files.
+
+            remote (list or set): see :meth:`uploadFile`.
+
+        Returns:
+
+            bool: ``True`` if a transfer has been attempted.
+
+        *new in 0.7.14*
         """
         new = False
-        if self.max_pending_transfers:
-            if self.max_pending_transfers <= self.relay.listReady():
-                return new
-        local = self.localFiles()
-        remote = self.relay.listTransferred('', end2end=False)
-        for resource in local:
-            remote_file = resource
-            local_file = self.repository.absolute(resource)
-            if PYTHON_VERSION == 2 and isinstance(remote_file, unicode) and \
-                remote and isinstance(remote[0], str):
-                remote_file = remote_file.encode('utf-8')
-            try:
-                checksum = self.checksum(resource)
-            except OSError as e: # file unlinked since last call to localFiles?
-                self.logger.warning('%s', e)
+        batch = []
+        for resource in resources:
+            target = self.outdated(resource, remote)
+            if not target:
                 continue
-            modified = False # if no remote copy, this is ignored
-            exists = remote_file in remote
-            if (self.timestamp or self.hash_function) and exists:
-                # check file last modification time and checksum
-                meta = self.relay.getMetadata(remote_file, timestamp_format=self.timestamp)
-                if meta:
-                    modified = meta.fileModified(local_file, checksum=checksum, remote=False, debug=self.logger.debug)
-                else:
-                    # no meta information available
-                    modified = True
-                    # this may not be true, but this will update the meta
-                    # information with a valid content.
-            if not exists or modified:
-                with self.repository.confirmPush(resource):
-                    new = True
-                    last_modified = os.path.getmtime(local_file)
-                    temp_file = self.encryption.encrypt(local_file)
-                    self.logger.info("uploading file '%s'", resource)
-                    try:
-                        with self.tq_controller.push(local_file):
-                            ok = self.relay.push(temp_file, remote_file, blocking=False,
-                                last_modified=last_modified, checksum=checksum)
-                    except QuotaExceeded as e:
-                        self.logger.info("%s; no more files can be sent", e)
-                        ok = False
-                    finally:
-                        self.encryption.finalize(temp_file)
-                    if ok:
-                        self.logger.debug("file '%s' successfully uploaded", resource)
-                    elif ok is not None:
-                        self.logger.warning("failed to upload '%s'", resource)
+            batch.append((resource,) + target)
+            if len(batch) == self.relay.manifest:
+                new = True
+                if not self.uploadBatch(batch, remote):
+                    return new
+                batch = []
+        if batch:
+            new = True
+            self.uploadBatch(batch, remote)
         return new
 
+    def uploadBatch(self, batch, remote=None):
+        """
+        Uploads a batch of local files with a single call to
+        :meth:`~escale.relay.AbstractRelay.pushMany`.
+
+        Arguments:
+
+            batch (list): (`resource`, `remote_file`, `checksum`) tuples,
+                as made from :meth:`outdated`.
+
+            remote (list or set): see :meth:`uploadFile`.
+
+        Returns:
+
+            bool: ``False`` if the quota is exceeded.
+
+        *new in 0.7.14*
+        """
+        proceed = True
+        resources, files, temp_files = [], [], []
+        try:
+            for resource, remote_file, checksum in batch:
+                local_file = self.repository.absolute(resource)
+                try:
+                    self.tq_controller.push(local_file)
+                except QuotaExceeded as e:
+                    self.logger.info("%s; no more files can be sent", e)
+                    proceed = False
+                    break
+                last_modified = os.path.getmtime(local_file)
+                temp_file = self.encryption.encrypt(local_file)
+                temp_files.append(temp_file)
+                self.logger.info("uploading file '%s'", resource)
+                resources.append(resource)
+                files.append((temp_file, remote_file, last_modified, checksum))
+            sent = self.relay.pushMany(files, blocking=False) if files else []
+        finally:
+            for temp_file in temp_files:
+                self.encryption.finalize(temp_file)
+        for (resource, remote_file, _), ok in zip(batch, sent):
+            # permissions are updated as on completion of the individual transfers
+            with self.repository.confirmPush(resource):
+                pass
+            self.stats.record('pushed', error=not ok,
+                    nbytes=file_size(self.repository.absolute(resource)) if ok else None)
+            if ok:
+                self.logger.debug("file '%s' successfully uploaded", resource)
+                if remote is not None:
+                    self._transferred(remote, remote_file)
+            else:
+                self.logger.warning("failed to upload '%s'", resource)
+        for _ in batch[len(resources):]:
+            # not sent because of the quota
+            self.stats.record('pushed', error=True)
+        return proceed
+
     def localFiles(self, path=None):
         """
         Transitional method.
 
         Use ``self.repository.readableFiles`` instead.
+
+        *changed in 0.7.14:* the files are sorted following :attr:`transfer_order`
         """
         ls0 = self.repository.listFiles(path, \
             dirname=self._filter_directory, basename=self._filter)
         ls1 = self.repository.readable(ls0, unsafe=True)
         self.logger.debug('number of local files: (total) %s  (readable) %s', len(ls0), len(ls1))
+        if self.transfer_order:
+            ls1 = self.transfer_order.sort(ls1, self.repository.absolute)
         return ls1
 
     def checksum(self, resource, return_mtime=False):
@@ -616,33 +987,30 @@ class Manager(Reporter):
                     checksum, modified = None, True
                     if 1 < self.verbosity:
                         self.logger.debug('local file modified: {}'.format(resource))
+                elif not self.hash_function.compatible(checksum):
+                    # the hash algorithm has changed; calculate the checksum again
+                    checksum = None
                 elif mtime < previous_mtime:
                     # the last modification time has been fixed in relay.info.Metadata.fileModified;
                     # update `mtime` instead of `checksum` in the cache
                     self.checksum_cache[resource] = (mtime, checksum)
         elif return_mtime:
             mtime = int(os.path.getmtime(local_file))
+        if self.checksum_cache is not None and self.hash_function:
+            self.stats.hit('checksum cache', bool(checksum))
         if not checksum and self.hash_function:
             if not modified and 1 < self.verbosity:
                 self.logger.debug('new local file: {}'.format(resource))
             try:
-                with open(local_file, 'rb') as f:
-                    content = f.read()
-                    #import struct
-                    #cs = sum(struct.unpack('<'+'B'*len(content), content))
-                    checksum = self.hash_function(content)
-                    #print((resource, cs, checksum))
+                with self.stats.timer('checksum') as timer:
+                    checksum = self.hash_function.file(local_file)
+                    timer.nbytes = os.path.getsize(local_file)
             except ExpressInterrupt:
                 raise
             except:
                 self.logger.error('%s', traceback.format_exc())
             else:
                 if self.checksum_cache is not None:
-                    #self.logger.debug('\n'.join((
-                    #    "caching checksum for file:",
-                    #    "'{}'",
-                    #    "last modified: {}",
-                    #    "checksum: {}")).format(local_file, mtime, checksum))
                     self.checksum_cache[resource] = (mtime, checksum)
         if return_mtime:
             return (checksum, mtime)
@@ -291,6 +291,16 @@ def inter_relay_copy(src_relay, dest_relay, safe=True, overwrite=False, files=[]
             finally:
                 if src_safe:
                     src_relay.releasePageLock(page)
+        # *new in 0.7.14*: adaptive paging
+        page_map = src_relay.pageMapFile()
+        if page_map and src_relay.base_relay.exists(page_map):
+            fd, tmp = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                src_relay.base_relay._get(page_map, tmp)
+                dest_relay.base_relay._push(tmp, page_map)
+            finally:
+                os.unlink(tmp)
         return []
     # standard (no index) relays
     new_placeholders = not (src_relay._placeholder_prefix == dest_relay._placeholder_prefix \
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Order in which the local files are uploaded.
+
+By default, the files are uploaded in the order the local repository is
+scanned. The ``transfer order`` option combines any of the following policies,
+the first ones prevailing:
+
+* ``smallest first``: files with smaller sizes first,
+* ``recent first``: most recently modified files first,
+* ``directory``: files in the directories with higher ``directory priority``
+  first,
+* ``deadline``: files with the earliest deadline first; the deadline of a file
+  is its last modification time plus the maximum delay set by the
+  ``transfer deadline`` option for its directory.
+
+For example:
+
+.. code-block:: ini
+
+    [shared]
+    transfer order = directory, deadline, smallest first
+    directory priority = drafts: 10, archives: -1
+    transfer deadline = 3600, drafts: 60
+
+With an index relay, the pages are uploaded in the order of their first file.
+
+*new in 0.7.14*
+"""
+
+
+from escale.base.essential import *
+import os
+
+
+policy_names = {
+        'scan': None,
+        'none': None,
+        'smallest first': 'smallest',
+        'smallest': 'smallest',
+        'size': 'smallest',
+        'recent first': 'recent',
+        'most recent first': 'recent',
+        'recent': 'recent',
+        'mtime': 'recent',
+        'directory': 'directory',
+        'directory priority': 'directory',
+        'deadline': 'deadline',
+        'earliest deadline first': 'deadline',
+        }
+
+
+def parse_directory_values(items, convert=float):
+    """
+    Parse ``directory: value`` items.
+
+    Arguments:
+
+        items (str or list): items; an item without directory sets the default
+            value.
+
+        convert (callable): value parser.
+
+    Returns:
+
+        dict: values with the directories as keys; the default value has
+        key ``''``.
+    """
+    if not items:
+        return {}
+    if isinstance(items, basestring):
+        items = items.split(',')
+    values = {}
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        directory, sep, value = item.rpartition(':')
+        directory = directory.strip().strip('/')
+        values[directory] = convert(value.strip())
+    return values
+
+
+class TransferOrder(object):
+    """
+    Priority policies for uploads.
+
+    Attributes:
+
+        policies (list of str): *'smallest'*, *'recent'*, *'directory'* and/or
+            *'deadline'*, the first ones prevailing.
+
+        directory_priority (dict): priorities with directories as keys
+            (see :func:`parse_directory_values`); higher priorities first;
+            the default priority is 0.
+
+        deadlines (dict): maximum delays in seconds between the modification
+            and the upload of the files, with directories as keys; files
+            with no deadline come after the others.
+
+    """
+    __slots__ = ['policies', 'directory_priority', 'deadlines']
+
+    def __init__(self, policies, directory_priority={}, deadlines={}):
+        self.policies = []
+        if isinstance(policies, basestring):
+            policies = policies.split(',')
+        for policy in policies:
+            name = policy.strip().lower()
+            try:
+                policy = policy_names[name]
+            except KeyError:
+                raise ValueError("unsupported transfer order: '{}'".format(name))
+            if policy and policy not in self.policies:
+                self.policies.append(policy)
+        self.directory_priority = dict(directory_priority or {})
+        self.deadlines = dict(deadlines or {})
+
+    def __bool__(self):
+        return bool(self.policies)
+
+    __nonzero__ = __bool__ # Python 2
+
+    def _lookup(self, values, resource):
+        """
+        Value for the deepest directory that contains `resource`.
+        """
+        dirname = os.path.dirname(resource)
+        while True:
+            try:
+                return values[dirname]
+            except KeyError:
+                if not dirname:
+                    return None
+                dirname = os.path.dirname(dirname)
+
+    def key(self, resource, local_file):
+        """
+        Sort key of a file.
+
+        Arguments:
+
+            resource (str): relative path of the file.
+
+            local_file (str): absolute path of the file.
+
+        Returns:
+
+            tuple: key; smaller keys first.
+        """
+        try:
+            st = os.stat(local_file)
+        except OSError:
+            # unlinked since listed; last
+            return (float('inf'),) * len(self.policies)
+        key = []
+        for policy in self.policies:
+            if policy == 'smallest':
+                key.append(st.st_size)
+            elif policy == 'recent':
+                key.append(-st.st_mtime)
+            elif policy == 'directory':
+                key.append(-(self._lookup(self.directory_priority, resource) or 0))
+            elif policy == 'deadline':
+                if self.deadlines:
+                    delay = self._lookup(self.deadlines, resource)
+                    if delay is None:
+                        key.append(float('inf'))
+                    else:
+                        key.append(st.st_mtime + delay)
+                else:
+                    # same delay for all the files; oldest first
+                    key.append(st.st_mtime)
+        return tuple(key)
+
+    def sort(self, resources, absolute):
+        """
+        Sort files, the files with equal keys remaining in the original order.
+
+        Arguments:
+
+            resources (list): relative paths of the files.
+
+            absolute (callable): takes a relative path and returns the
+                corresponding absolute path,
+                e.g. :meth:`~escale.manager.access.AccessController.absolute`.
+
+        Returns:
+
+            list: relative paths.
+        """
+        if not self.policies:
+            return list(resources)
+        return sorted(resources, key=lambda resource: self.key(resource, absolute(resource)))
+
+
+def make_transfer_order(policies, directory_priority=None, deadlines=None):
+    """
+    Make a :class:`TransferOrder` from configuration options.
+
+    Arguments:
+
+        policies (str or list): ``transfer order`` option.
+
+        directory_priority (str or list): ``directory priority`` option.
+
+        deadlines (str or list): ``transfer deadline`` option.
+
+    Returns:
+
+        TransferOrder: policies, or ``None`` if the files are to be uploaded
+        in scan order.
+    """
+    if not policies:
+        return None
+    order = TransferOrder(policies,
+            parse_directory_values(directory_priority, float),
+            parse_directory_values(deadlines, float))
+    return order if order else None
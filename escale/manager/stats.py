@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Instrumentation of the synchronization cycles.
+
+A :class:`Stats` object collects counts, latencies, amounts of data and cache
+hits for named operations.
+:func:`instrument` wraps the methods of an object (e.g. the relay primitives)
+so that every call is recorded.
+
+*new in 0.7.14*
+"""
+
+
+import os
+import time
+import json
+import functools
+import threading
+from escale.base.exceptions import ExpressInterrupt
+
+
+stats_file_prefix = 'st'
+profile_file_prefix = 'pf'
+
+
+class Stats(object):
+    """
+    Counters and timers.
+
+    Attributes:
+
+        operations (dict): for each operation name, a dict with keys
+            *'count'*, *'errors'*, *'time'* (total, in seconds), *'max time'*
+            and *'bytes'*.
+
+        caches (dict): for each cache name, a dict with keys *'hits'* and *'misses'*.
+
+        gauges (dict): last values of named quantities, e.g. *'pending uploads'*.
+
+        cycles (int): number of synchronization cycles.
+
+        since (float): time of the last reset.
+
+    """
+    __slots__ = ['operations', 'caches', 'gauges', 'cycles', 'since', '_lock']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+            self.caches = {}
+            self.gauges = {}
+            self.cycles = 0
+            self.since = time.time()
+
+    def record(self, operation, duration=None, nbytes=None, error=False):
+        """
+        Record a call to an operation.
+        """
+        with self._lock:
+            try:
+                counters = self.operations[operation]
+            except KeyError:
+                counters = self.operations[operation] = \
+                    {'count': 0, 'errors': 0, 'time': 0., 'max time': 0., 'bytes': 0}
+            counters['count'] += 1
+            if error:
+                counters['errors'] += 1
+            if duration is not None:
+                counters['time'] += duration
+                if counters['max time'] < duration:
+                    counters['max time'] = duration
+            if nbytes:
+                counters['bytes'] += nbytes
+
+    def count(self, operation, errors=False):
+        """
+        Number of calls to an operation, or number of failed calls if `errors`
+        is ``True``.
+        """
+        with self._lock:
+            try:
+                counters = self.operations[operation]
+            except KeyError:
+                return 0
+            return counters['errors'] if errors else counters['count']
+
+    def set(self, gauge, value):
+        """
+        Set the value of a gauge.
+        """
+        with self._lock:
+            self.gauges[gauge] = value
+
+    def timer(self, operation, nbytes=None):
+        """
+        Context manager that records the time spent in the `with` block.
+
+        The `nbytes` attribute of the returned object can be set in the block.
+        """
+        return Timer(self, operation, nbytes)
+
+    def hit(self, cache, hit=True):
+        """
+        Record a cache hit (or miss if `hit` is ``False``).
+        """
+        with self._lock:
+            try:
+                counters = self.caches[cache]
+            except KeyError:
+                counters = self.caches[cache] = {'hits': 0, 'misses': 0}
+            if hit:
+                counters['hits'] += 1
+            else:
+                counters['misses'] += 1
+
+    def snapshot(self):
+        """
+        Copy of the counters, in a JSON-compatible format.
+        """
+        with self._lock:
+            operations = { name: dict(counters)
+                    for name, counters in self.operations.items() }
+            caches = {}
+            for name, counters in self.caches.items():
+                counters = dict(counters)
+                total = counters['hits'] + counters['misses']
+                counters['hit ratio'] = float(counters['hits']) / total if total else None
+                caches[name] = counters
+            return {'since': self.since, 'time': time.time(), 'cycles': self.cycles,
+                    'operations': operations, 'caches': caches, 'gauges': dict(self.gauges)}
+
+    def summary(self):
+        """
+        One-line summary of the counters, by decreasing total time.
+        """
+        return format_summary(self.snapshot())
+
+    def dump(self, path):
+        """
+        Write the counters down in a JSON file.
+        """
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f, indent=1, sort_keys=True)
+        if os.path.exists(path):
+            # os.rename does not overwrite files on Windows
+            os.unlink(path)
+        os.rename(tmp, path)
+
+
+class Timer(object):
+    __slots__ = ['stats', 'operation', 'nbytes', '_t0']
+
+    def __init__(self, stats, operation, nbytes=None):
+        self.stats = stats
+        self.operation = operation
+        self.nbytes = nbytes
+        self._t0 = None
+
+    def __enter__(self):
+        self._t0 = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.record(self.operation, time.time() - self._t0, self.nbytes,
+                error=exc_type is not None)
+
+
+def format_summary(snapshot):
+    """
+    Format a :meth:`Stats.snapshot` as a single line.
+    """
+    items = []
+    operations = snapshot.get('operations', {})
+    for name in sorted(operations, key=lambda name: operations[name]['time'], reverse=True):
+        counters = operations[name]
+        item = '{}: {}x {:.2f}s'.format(name, counters['count'], counters['time'])
+        if counters['bytes']:
+            item += ' {:.1f}MB'.format(counters['bytes'] / 1048576.)
+        if counters['errors']:
+            item += ' {} errors'.format(counters['errors'])
+        items.append(item)
+    for name, counters in sorted(snapshot.get('caches', {}).items()):
+        if counters.get('hit ratio') is not None:
+            items.append('{} hit ratio: {:.0%}'.format(name, counters['hit ratio']))
+    for name, value in sorted(snapshot.get('gauges', {}).items()):
+        if value is not None:
+            items.append('{}: {:g}'.format(name, value))
+    return '{} cycles; {}'.format(snapshot.get('cycles', 0), ', '.join(items))
+
+
+def load_stats(path):
+    """
+    Read a JSON file written by :meth:`Stats.dump`.
+    """
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def file_size(path):
+    """
+    Size of a local file, or ``None`` if the file does not exist.
+    """
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+def local_file_size(position):
+    """
+    Make a function that gives the size of the local file passed as
+    positional argument `position`, for :func:`instrument`.
+    """
+    def size(args, kwargs):
+        return os.path.getsize(args[position])
+    return size
+
+
+def instrument(obj, stats, methods, prefix='', nbytes={}, hits=None, failures=False):
+    """
+    Wrap methods of an object so that the calls are recorded.
+
+    Arguments:
+
+        obj (any): object; the wrappers are instance attributes, and objects
+            without a `__dict__` are left unchanged.
+
+        stats (Stats): counters.
+
+        methods (list of str): method names; missing methods are skipped.
+
+        prefix (str): prefix for the operation names.
+
+        nbytes (dict): functions that take the positional and keyword arguments
+            of a call and return the amount of data transferred, with method
+            names as keys.
+
+        hits (str): cache name; if defined, a non-``None`` return value is
+            recorded as a hit, and the call is not timed.
+
+        failures (bool): record the calls that return ``False`` as errors,
+            e.g. for locks that cannot be acquired.
+
+    Returns:
+
+        bool: ``True`` if the object can be instrumented.
+    """
+    if not hasattr(obj, '__dict__'):
+        return False
+    for method in methods:
+        func = getattr(obj, method, None)
+        if func is None or getattr(func, '__instrumented__', False):
+            continue
+        if hits:
+            wrapper = _count_hits(func, stats, hits)
+        else:
+            wrapper = _time_calls(func, stats, prefix + method, nbytes.get(method),
+                    failures)
+        wrapper.__instrumented__ = True
+        setattr(obj, method, wrapper)
+    return True
+
+
+def _time_calls(func, stats, operation, nbytes, failures=False):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        t0 = time.time()
+        error = True
+        try:
+            result = func(*args, **kwargs)
+            error = failures and result is False
+            return result
+        finally:
+            n = None
+            if nbytes is not None and not error:
+                try:
+                    n = nbytes(args, kwargs)
+                except ExpressInterrupt:
+                    raise
+                except Exception:
+                    pass
+            stats.record(operation, time.time() - t0, n, error)
+    return wrapper
+
+
+def _count_hits(func, stats, cache):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        stats.hit(cache, result is not None)
+        return result
+    return wrapper
+
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+"""
+Change watchers that interrupt the waiting time between two synchronization
+cycles.
+
+A watcher is polled by :meth:`~escale.manager.history.TimeQuotaController.sleep`
+and tells whether something changed since the last synchronization cycle.
+Push notifications from other sources can be delivered by calling
+:meth:`~escale.manager.history.TimeQuotaController.notify` from any thread.
+"""
+
+import os
+import time
+import traceback
+
+from escale.base.essential import *
+
+
+class Watcher(object):
+    """
+    Base class for change watchers.
+
+    Attributes:
+
+        interval (int or float): minimum time between two checks, in seconds.
+
+    Subclasses implement :meth:`state`.
+    """
+    __slots__ = ['interval', '_state', '_last_check']
+
+    def __init__(self, interval=10):
+        self.interval = interval
+        self._state = None
+        self._last_check = 0
+
+    def state(self):
+        """
+        Return a comparable token that changes whenever a change occurs,
+        or ``None`` if the state cannot be determined.
+        """
+        raise NotImplementedError('abstract method')
+
+    def reset(self):
+        """
+        Take the current state as a reference.
+
+        Called at the beginning of every synchronization cycle.
+        """
+        self._state = self.state()
+        self._last_check = time.time()
+
+    def changed(self):
+        """
+        Tell whether the state differs from the reference state.
+
+        The state is not read again before `interval` seconds have elapsed.
+        """
+        t = time.time()
+        if t - self._last_check < self.interval:
+            return False
+        self._last_check = t
+        state = self.state()
+        return not (state is None or self._state is None or state == self._state)
+
+
+class LocalWatcher(Watcher):
+    """
+    Detect files created, deleted or renamed in a local repository.
+
+    The watcher compares the last modification times of the directories.
+    Files modified in place are not detected, but most applications save
+    files by renaming temporary files.
+
+    Attributes:
+
+        path (str): path to the local repository.
+
+    """
+    __slots__ = ['path']
+
+    def __init__(self, path, interval=5):
+        Watcher.__init__(self, interval)
+        self.path = path
+
+    def state(self):
+        mtimes = []
+        try:
+            mtimes.append(os.stat(self.path).st_mtime)
+        except OSError:
+            return None
+        for dirname, dirs, _ in os.walk(self.path):
+            for d in dirs:
+                try:
+                    mtimes.append(os.stat(os.path.join(dirname, d)).st_mtime)
+                except OSError:
+                    pass
+        return (len(mtimes), max(mtimes))
+
+
+class RemoteWatcher(Watcher):
+    """
+    Detect changes on the relay host with :meth:`~escale.relay.AbstractRelay.probe`.
+
+    Attributes:
+
+        relay (escale.relay.AbstractRelay): relay.
+
+        logger (Logger): logger.
+
+    """
+    __slots__ = ['relay', 'logger']
+
+    def __init__(self, relay, interval=10, logger=None):
+        Watcher.__init__(self, interval)
+        self.relay = relay
+        self.logger = logger
+
+    def state(self):
+        try:
+            return self.relay.probe()
+        except ExpressInterrupt:
+            raise
+        except Exception:
+            # the next synchronization cycle will handle the error
+            if self.logger is not None:
+                self.logger.debug(traceback.format_exc())
+            return None
+
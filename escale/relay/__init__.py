@@ -18,7 +18,7 @@
 from .info import *
 from .relay import AbstractRelay, Relay
 from escale.base.exceptions import MissingSetupFeature
-from .index import IndexRelay, TopDirectoriesIndex
+from .index import IndexRelay, TopDirectoriesIndex, AdaptiveIndex
 
 __all__ = ['LockInfo', 'parse_lock_file', 'AbstractRelay', 'Relay']
 
@@ -49,6 +49,14 @@ else:
 	__all__.append('LocalMount')
 	__protocols__.append(LocalMount)
 
+try:
+	from .memory import MemoryRelay # should never fail
+except ImportError as e:
+	print(e)
+else:
+	__all__.append('MemoryRelay')
+	__protocols__.append(MemoryRelay)
+
 try:
 	from .ftp import FTP # should never fail
 except ImportError as e:
@@ -102,7 +110,14 @@ else:
 		pass
 
 
-def by_protocol(protocol, index=False, **ignored):
+def by_protocol(protocol, index=False, simulation=None, **ignored):
+	"""
+	Find the relay backend for a protocol.
+
+	*changed in 0.7.14:* `simulation` argument; keyword arguments to
+	:class:`~escale.relay.simulation.Simulation`; `index` admits *'adaptive'*
+	(see :class:`~escale.relay.index.AdaptiveIndex`)
+	"""
 	ps = []
 	for p in __protocols__[::-1]:
 		if isinstance(p.__protocol__, list):
@@ -111,6 +126,9 @@ def by_protocol(protocol, index=False, **ignored):
 		elif protocol == p.__protocol__:
 			ps.append(p)
 	if ps:
+		if simulation:
+			from .simulation import simulated
+			ps[0] = simulated(ps[0], **simulation)
 		if index:
 			_kwargs = {'base': ps[0]}
 			if isinstance(index, bool):
@@ -121,6 +139,12 @@ def by_protocol(protocol, index=False, **ignored):
 				except IndexError:
 					pass
 				index_relay = TopDirectoriesIndex
+			elif index.startswith('adaptive'):
+				try:
+					_kwargs['max_page_entries'] = int(index.split(':')[1])
+				except IndexError:
+					pass
+				index_relay = AdaptiveIndex
 			else:
 				raise ValueError('wrong `index` value: {}'.format(index))
 			for p in ps:
@@ -15,20 +15,87 @@ from escale.base import *
 from escale.base.ssl import *
 from escale.cli.auth import *
 from .relay import Relay
+from .usage import UsageTracker
+from .parts import resume_upload, resume_download
 import ftplib
 import ssl
 import os
-import itertools
+import time
+import errno
+import functools
+import threading
 import traceback
 
+try:
+	from queue import Queue
+except ImportError: # Python 2
+	from Queue import Queue
+
+
+
+class _CommandCache(object):
+	"""
+	Skip the ``CWD`` and ``TYPE`` commands that would not change the state
+	of the control connection.
+
+	Every skipped command saves a round trip to the server, which dominates
+	the transfer time of small files such as locks and placeholders.
+	"""
+	_wd = None # absolute path of the working directory, if known
+	_type = None # last ``TYPE`` command
+
+	def sendcmd(self, cmd):
+		return self._cachedcmd(ftplib.FTP.sendcmd, cmd)
+
+	def voidcmd(self, cmd):
+		return self._cachedcmd(ftplib.FTP.voidcmd, cmd)
+
+	def _cachedcmd(self, send, cmd):
+		if not cmd.startswith('TYPE '):
+			return send(self, cmd)
+		if cmd == self._type:
+			return '200 ' + cmd
+		self._type = None
+		resp = send(self, cmd)
+		self._type = cmd
+		return resp
+
+	def cwd(self, dirname):
+		if dirname and dirname == self._wd:
+			return '250 ' + dirname
+		self._wd = None
+		resp = ftplib.FTP.cwd(self, dirname)
+		if dirname.startswith('/'):
+			self._wd = dirname
+		return resp
+
+
+
+class _FTP(_CommandCache, ftplib.FTP):
+	pass
 
 
 if PYTHON_VERSION == 3:
-	class _FTP_TLS(ftplib.FTP_TLS):
+	class _FTP_TLS(_CommandCache, ftplib.FTP_TLS):
 		"""Explicit FTPS, with shared TLS session.
 
 		This code is borrowed from http://stackoverflow.com/questions/14659154/ftpes-session-reuse-required#26452738
+
+		The TLS session of another control connection can also be resumed,
+		setting the `session` attribute before login.
 		"""
+		session = None
+
+		def auth(self):
+			if self.session is None:
+				return ftplib.FTP_TLS.auth(self)
+			resp = self.voidcmd('AUTH TLS')
+			self.sock = self.context.wrap_socket(self.sock,
+				server_hostname=self.host,
+				session=self.session)
+			self.file = self.sock.makefile(mode='r', encoding=self.encoding)
+			return resp
+
 		def ntransfercmd(self, cmd, rest=None):
 			conn, size = ftplib.FTP.ntransfercmd(self, cmd, rest)
 			if self._prot_p:
@@ -37,7 +104,130 @@ if PYTHON_VERSION == 3:
 					session=self.sock.session) # this is the fix
 			return conn, size
 elif PYTHON_VERSION == 2:
-	_FTP_TLS = ftplib.FTP_TLS
+	class _FTP_TLS(_CommandCache, ftplib.FTP_TLS):
+		pass
+
+
+
+def _connection_lost(e):
+	"""
+	Tell whether an exception means that the server closed the connection.
+	"""
+	if isinstance(e, ftplib.error_temp):
+		# [vsftpd] 421 No transfer timeout
+		return e.args[0][:3] == '421'
+	elif isinstance(e, EOFError):
+		return True
+	elif isinstance(e, (IOError, OSError)):
+		return e.errno in (errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED)
+	else:
+		return False
+
+
+
+class _ConnectionPool(object):
+	"""
+	Authenticated control connections, at most `size` at a time.
+
+	Attributes:
+
+		connect (callable): opens a new connection.
+
+		size (int): maximum number of connections; lowered as soon as the
+			server refuses a connection.
+
+		logger (Logger): logger.
+
+	"""
+	__slots__ = ['connect', 'size', 'logger', '_idle', '_count', '_lock']
+
+	def __init__(self, connect, size, logger=None):
+		self.connect = connect
+		self.size = size
+		self.logger = logger
+		self._idle = []
+		self._count = 0
+		self._lock = threading.Condition()
+
+	def get(self, wd=None):
+		"""
+		Take an idle connection, or open a new one, or wait for a connection
+		to be released.
+
+		Connections with `wd` as working directory are preferred.
+		"""
+		with self._lock:
+			while not self._idle and self.size <= self._count:
+				self._lock.wait()
+			if self._idle:
+				if wd:
+					for i, ftp in enumerate(self._idle):
+						if ftp._wd == wd:
+							return self._idle.pop(i)
+				return self._idle.pop()
+			self._count += 1
+		try:
+			return self.connect()
+		except Exception as e:
+			with self._lock:
+				self._count -= 1
+				self._lock.notify()
+				if not self._count:
+					raise
+				# the server may limit the number of connections per user
+				self.size = self._count
+			if self.logger is not None:
+				self.logger.debug("cannot open more than %s connections: %s", self.size, e)
+			return self.get(wd)
+
+	def add(self, ftp):
+		"""
+		Take an already opened connection.
+
+		Returns ``False`` if the pool is full.
+		"""
+		with self._lock:
+			if self.size <= self._count:
+				return False
+			self._count += 1
+			self._idle.append(ftp)
+			self._lock.notify()
+		return True
+
+	def put(self, ftp):
+		"""
+		Release a connection.
+		"""
+		with self._lock:
+			self._idle.append(ftp)
+			self._lock.notify()
+
+	def discard(self, ftp):
+		"""
+		Release and close a broken connection.
+		"""
+		with self._lock:
+			self._count -= 1
+			self._lock.notify()
+		try:
+			ftp.close()
+		except Exception:
+			pass
+
+	def clear(self):
+		"""
+		Remove and return the idle connections.
+		"""
+		with self._lock:
+			idle, self._idle = self._idle, []
+			self._count -= len(idle)
+			self._lock.notify_all()
+		return idle
+
+
+# connection pools shared between clients in the same process, per server and credentials
+_shared_pools = {}
+_shared_pools_lock = threading.Lock()
 
 
 
@@ -70,16 +260,39 @@ class FTP(Relay):
 
 		verify_ssl (bool): if ``True`` check server's certificate; if ``None``
 			check certificate if any; if ``False`` do not check certificate.
+
+		max_connections (int): maximum number of simultaneous control connections;
+			deep repositories are crawled with several connections in parallel.
+
+		share_connections (bool): share the pool of control connections with
+			the other clients in the same process that connect to the same
+			server with the same credentials.
+
+	The control connections are pooled, so that the relay can serve several
+	requests at a time. Redundant ``CWD`` and ``TYPE`` commands are skipped
+	and the TLS session of the first connection is resumed by the other ones.
+
+	*new in 0.7.14:* `max_connections` and `share_connections`; MLSD is used
+	whenever the server advertises MLST, so that listings include modification
+	times; the relay is thread-safe; the address may end with ``:port``
 	
 	"""
 
 	__protocol__ = ['ftp', 'ftps']
 
+	__thread_safe__ = True
+
+	__native_unlink__ = True
+
 	def __init__(self, client, address, repository, username=None, password=None,
 			protocol=None, encoding='utf-8', account=None, keyfile=None, certfile=None,
 			context=None, certificate=None, verify_ssl=None, ssl_version=None,
-			**super_args):
+			max_connections=4, share_connections=False, **super_args):
 		Relay.__init__(self, client, address, asstr(repository), **super_args)
+		self.max_connections = max(1, max_connections or 1)
+		self.share_connections = share_connections
+		self._pool = None
+		self.usage = UsageTracker()
 		self.username = username
 		self.password = password
 		self.account = account # `acct` argument for FTP and FTP_TLS
@@ -199,7 +412,7 @@ class FTP(Relay):
 	def open(self):
 		self.ftp = None
 		if self.protocol is None or self.protocol == 'ftps':
-			self.ftp = _FTP_TLS(self.address,
+			self.ftp = self._newFTP(_FTP_TLS,
 					certfile=self.certfile, keyfile=self.keyfile, context=self.context)
 			if self.login():
 				self.ftp.prot_p()
@@ -209,7 +422,7 @@ class FTP(Relay):
 					raise RuntimeError(notls_msg)
 				self.ftp = None # try with SSL disabled
 		if self.ftp is None:
-			self.ftp = ftplib.FTP(self.address)
+			self.ftp = self._newFTP(_FTP)
 			if not self.login():
 				if self.protocol == 'ftp':
 					#self.logger.info("'protocol' should be 'ftps' instead of 'ftp'")
@@ -219,52 +432,122 @@ class FTP(Relay):
 				else:
 					# ftps was tried before, therefore neither ftp nor ftps work
 					raise RuntimeError('connection failed both with SSL enabled and SSL disabled')
-		if 'UTF8' not in self.ftp.sendcmd('FEAT'):
+		try:
+			features = [ line.strip().upper() for line in self.ftp.sendcmd('FEAT').splitlines()[1:-1] ]
+		except ftplib.error_perm:
+			features = []
+		if 'UTF8' not in features:
 			self.logger.debug('FTP server does not support unicode')
 		self.ftp.encoding = self._encoding
 		self._root = self.ftp.pwd()
 		if self._root:
 			self.repository = os.path.join(self._root, self.repository)
-		self._mlsd_support = False
+		self._mlsd_support = any( feature.startswith('MLST') for feature in features )
+		self._filename_in_list = 8
+		self._mlst_support = None # undefined
 		self._size_support = None # undefined
 		self._size_needs_binary = None
 		self._estimated_used = None
+		# the other connections resume the TLS session of the first one
+		if isinstance(self.ftp, _FTP_TLS):
+			self._tls_context = self.ftp.context
+			self._tls_session = getattr(self.ftp.sock, 'session', None)
+		else:
+			self._tls_context = self._tls_session = None
+		if self.share_connections:
+			key = (self.address, self.protocol, self.username, self.password,
+				self.account, self.certificate)
+			with _shared_pools_lock:
+				try:
+					self._pool = _shared_pools[key]
+				except KeyError:
+					self._pool = _shared_pools[key] = \
+						_ConnectionPool(self._connect, self.max_connections, self.logger)
+		else:
+			self._pool = _ConnectionPool(self._connect, self.max_connections, self.logger)
+		if not self._pool.add(self.ftp):
+			self._quit(self.ftp)
+
+	def _newFTP(self, cls, **kwargs):
+		"""
+		Connect to the server, on the port given in the address if any.
+
+		*new in 0.7.14*
+		"""
+		host, sep, port = self.address.rpartition(':')
+		if not (sep and port.isdigit() and ':' not in host):
+			host, port = self.address, 0
+		ftp = cls(**kwargs)
+		ftp.connect(host, int(port))
+		return ftp
+
+	def _connect(self):
+		"""
+		Open a new control connection with the settings and credentials
+		validated by :meth:`open`.
+
+		*new in 0.7.14*
+		"""
+		if self._tls_context is None:
+			ftp = self._newFTP(_FTP)
+			ftp.login(self.username, self.password, self.account)
+		else:
+			ftp = self._newFTP(_FTP_TLS, context=self._tls_context)
+			ftp.session = self._tls_session
+			ftp.login(self.username, self.password, self.account)
+			ftp.prot_p()
+		ftp.encoding = self._encoding
+		return ftp
 
 	def _request(self, callback, *args, **kwargs):
 		"""
-		Wrap method calls on object of type ftplib.FTP. Reconnect to server if connection has timed out.
+		Run a request with a connection from the pool. Reconnect to server if connection has timed out.
 
-		There is no need to wrap successive calls unless some significant amount of time can be spent
-		between these calls. Wrap only the first call.
+		`callback` is either the name of a :class:`ftplib.FTP` method or a function that takes
+		a connection as first argument. Successive commands that depend on the state of the
+		connection (e.g. ``CWD`` then ``LIST``) must be wrapped in a single function.
+
+		The `wd` keyword argument is not passed to `callback`; if defined, connections with
+		`wd` as working directory are preferred.
+
+		*changed in 0.7.14:* connections are taken from a pool
 		"""
-		try:
-			response = callback(*args, **kwargs)
-		except ftplib.error_temp as e:
-			# handle only "421 No transfer timeout"
-			err_code = e.args[0][:3]
-			if err_code != '421':
+		wd = kwargs.pop('wd', None)
+		for attempt in (1, 2):
+			ftp = self._pool.get(wd)
+			if isinstance(callback, str):
+				request = getattr(ftp, callback)
+			else:
+				request = functools.partial(callback, ftp)
+			try:
+				response = request(*args, **kwargs)
+			except (ftplib.error_perm, ftplib.error_reply):
+				# the connection is still usable
+				self._pool.put(ftp)
+				raise
+			except Exception as e:
+				if isinstance(e, ftplib.error_temp) and not _connection_lost(e):
+					self._pool.put(ftp)
+					raise
+				self._pool.discard(ftp)
+				if 1 < attempt or not _connection_lost(e):
+					raise
+				# connection unilaterally closed by server
+				self.logger.debug("reconnecting to '%s'", self.address)
+			except:
+				self._pool.discard(ftp)
 				raise
-			# connection unilaterally closed by server
-			self.ftp.close()
-			self.logger.debug("reconnecting to '%s'", self.address)
-			if isinstance(self.ftp, _FTP_TLS):
-				self.ftp = _FTP_TLS(self.address,
-					certfile=self.certfile, keyfile=self.keyfile, context=self.context)
-				self.ftp.login(self.username, self.password, self.account)
-				self.ftp.prot_p()
 			else:
-				self.ftp = ftplib.FTP(self.address)
-				self.ftp.login(self.username, self.password, self.account)
-			self.ftp.encoding = self._encoding
-			callback = getattr(self.ftp, callback.__name__)
-			response = callback(*args, **kwargs)
-		return response
+				self._pool.put(ftp)
+				return response
 
 
 	def size(self, remote_file, fail=False):
 		remote_file = join(self.repository, remote_file)
-		if self._size_needs_binary:
-			self._request(self.ftp.voidcmd, 'TYPE I') # set binary mode
+		def _size(ftp):
+			if self._size_needs_binary:
+				ftp.voidcmd('TYPE I') # set binary mode
+			return ftp.size(remote_file)
 		if self._size_support is None:
 			def no_support_msg(sure=False):
 				if sure:
@@ -275,7 +558,7 @@ class FTP(Relay):
 			size = None
 			while True: # should not iterate more than twice
 				try:
-					size = self._request(self.ftp.size, remote_file)
+					size = self._request(_size)
 				except ftplib.error_perm as e:
 					err_code = e.args[0][:3]
 					if err_code == '550':
@@ -284,7 +567,6 @@ class FTP(Relay):
 						if 'ASCII' in e.args[0].split(): # proftpd
 							if not self._size_needs_binary:
 								self._size_needs_binary = True
-								self.ftp.voidcmd('TYPE I')
 								continue # try again
 						elif fail:
 							self.logger.critical("internal error: file '%s' does not exist",
@@ -302,7 +584,7 @@ class FTP(Relay):
 			self._size_support = size is not None
 		else:
 			try:
-				size = self._request(self.ftp.size, remote_file)
+				size = self._request(_size)
 			except ftplib.error_perm as e:
 				#err_code = e.args[0][:3]
 				#if err_code == '550':
@@ -315,89 +597,110 @@ class FTP(Relay):
 
 
 	def storageSpace(self):
-		used = None
-		if self.repository is not None and self._size_support is not False: # None is ok
+		# sizes are given by both MLSD and LIST
+		used, quota = Relay.storageSpace(self)
+		if used is None and self.repository is not None and self._size_support is not False: # None is ok
+			# fall back on one SIZE command per file
 			files = self._list(recursive=True)
 			if files:
-				if self._size_needs_binary:
-					self.ftp.voidcmd('TYPE I') # set binary mode
-				f = 0
 				if self._size_support is None:
-					used = self.size(files[f], fail=True)
-					if self._size_support:
-						f += 1
+					self.size(files[0], fail=True)
 				if self._size_support:
-					if used is None:
-						used = 0
-					for file in files[f:]:
-						s = self.ftp.size(join(self.repository, file))
-						if s is None:
-							raise RuntimeError("'SIZE {}' returned None".format(file))
-						used += s
-					used = float(used) / 1048576 # in MB
-			else:
-				used = 0
-		return (used, None)
+					def sizes(ftp):
+						if self._size_needs_binary:
+							ftp.voidcmd('TYPE I') # set binary mode
+						ls = []
+						for file in files:
+							s = ftp.size(join(self.repository, file))
+							if s is None:
+								raise RuntimeError("'SIZE {}' returned None".format(file))
+							ls.append((file, s))
+						return ls
+					self.usage.recount(self._request(sizes))
+					used = self.usage.used()
+		return (used, quota)
 
 
-	def _list(self, remote_dir='', recursive=True, stats=[]):
-		remote_dir = asstr(remote_dir)
+	def _listdir(self, ftp, remote_dir, stats=[]):
+		"""
+		List the content of a single directory.
+
+		Arguments:
+
+			ftp (ftplib.FTP): control connection.
+
+			remote_dir (str): directory relative to the repository root.
+
+			stats (list or bool): any of ``'size'`` and ``'mtime'``;
+				see also :meth:`~escale.relay.Relay._list`.
+
+		Returns:
+
+			(list, list): files (entries formatted as requested by `stats`) and
+			sub-directories, relative to the repository root.
+
+		*new in 0.7.14*
+		"""
 		if remote_dir:
-			def _join(f): return os.path.join(remote_dir, f)
+			def _join(f): return '/'.join((remote_dir, f))
 			fullpath = os.path.join(self.repository, remote_dir)
 		else:
 			def _join(f): return f
 			fullpath = self.repository
-		files, dirs = [], []
+		entries, dirs = [], []
 		if self._mlsd_support:
 			try:
-				if PYTHON_VERSION == 3:
-					ls = self._request(self.ftp.mlsd, fullpath)
-					for f, info in ls:
-						print(info) # has it ever been tested?
-						if info['type'] == 'dir':
-							dirs.append(f)
-						elif info['type'] == 'file':
-							file = _join(f)
-							if 'mtime' in stats:
-								mtime = time.strptime(info['modify'], '%Y%m%d%H%M%S')
-								file = (file, mtime)
-							files.append(file)
-				elif PYTHON_VERSION == 2:
-					ls = []
-					self._request(self.ftp.retrlines, 'MLSD ' + fullpath, ls.append)
-					for rep in ls:
-						info, f = rep.split(None, 1)
-						if 'ype=file' in info:
-							file = _join(f)
-							if 'mtime' in stats:
-								if info.startswith('modify=') and info[21]==';':
-									mtime = time.strptime(info[7:21], '%Y%m%d%H%M%S')
-									file = (file, mtime)
-							files.append(file)
-						elif 'ype=dir' in info:
-							dirs.append(f)
+				ls = []
+				ftp.retrlines('MLSD ' + fullpath, ls.append)
 			except ftplib.error_perm as e:
 				err_code = e.args[0][:3]
-				if err_code == '500': # [vsftpd] 500 Unknown command.
+				if err_code in ('500', '502'): # [vsftpd] 500 Unknown command.
+					self.logger.debug("%s", e)
 					self._mlsd_support = False
-					# initialize LIST related variables
-					self._filename_in_list = 8
+				elif err_code == '550': # missing directory
+					return [], []
 				else:
 					raise
+			else:
+				for line in ls:
+					try:
+						facts, filename = line.split(' ', 1)
+					except ValueError:
+						continue
+					info = {}
+					for fact in facts.split(';'):
+						if fact:
+							name, _, value = fact.partition('=')
+							info[name.lower()] = value
+					_type = info.get('type', '').lower()
+					if _type == 'dir':
+						dirs.append(_join(filename))
+					elif _type == 'file':
+						try:
+							size = int(info['size'])
+						except (KeyError, ValueError):
+							size = None
+						try:
+							# UTC, optional fractional part
+							mtime = time.strptime(info['modify'][:14], '%Y%m%d%H%M%S')
+						except (KeyError, ValueError):
+							mtime = None
+						entries.append((_join(filename), size, mtime))
+					# skip 'cdir' and 'pdir'
 		if not self._mlsd_support:
-			self._filename_in_list = 8
+			# the directory may have been deleted since the last visit
+			ftp._wd = None
 			try:
-				self._request(self.ftp.cwd, fullpath)
+				ftp.cwd(fullpath)
 			except ftplib.error_perm as e:
 				err_code = e.args[0][:3]
 				if err_code == '550': # [vsftpd] 550 Failed to change directory.
-					return []
+					return [], []
 				else:
 					raise
 			ls = []
 			try:
-				self.ftp.retrlines('LIST -a', ls.append) # --full-time
+				ftp.retrlines('LIST -a', ls.append) # --full-time
 			except ftplib.error_perm as e:
 				err_code = e.args[0][:3]
 				if err_code == '522': # [vsftpd] 522 SSL connection failed: session reuse required
@@ -408,72 +711,184 @@ class FTP(Relay):
 					# the _FTP_TLS fix is supposed to solve this vsftpd issue
 				raise
 			for line in ls:
-				parts = line.split(None, self._filename_in_list + 1)
+				parts = line.split(None, self._filename_in_list)
 				try:
 					filename = parts[self._filename_in_list]
 				except IndexError:
 					self.logger.debug("'LIST' returned '%s'", line)
-					pass
-				else:
-					if line[0] == 'd':
-						dirs.append(filename)
-					elif line[0] == '-':
-						file = _join(filename)
-						if stats: # ['mtime']
-							mtime = None
-							#try:
-							#	# with minute precision, timestamping is not reliable
-							#	mtime = time.strptime(' '.join(line.split()[5:8]), '%b %d %H:%M')
-							#except:
-							#	pass
-							file = (file, mtime)
-						files.append(file)
+					continue
+				if line[0] == 'd':
+					if filename not in ('.', '..'):
+						dirs.append(_join(filename))
+				elif line[0] == '-':
+					try:
+						size = int(parts[4])
+					except ValueError:
+						size = None
+					# with minute precision, timestamping is not reliable
+					entries.append((_join(filename), size, None))
+		if stats:
+			if isinstance(stats, bool):
+				stats = ('size', 'mtime')
+			columns = { 'size': 1, 'mtime': 2 }
+			files = [ (entry[0],) + tuple( entry[columns[s]] for s in stats )
+					for entry in entries ]
+		else:
+			files = [ entry[0] for entry in entries ]
+		return files, dirs
+
+
+	def _list(self, remote_dir='', recursive=True, stats=[]):
+		remote_dir = asstr(remote_dir)
+		files, dirs = self._request(self._listdir, remote_dir, stats)
 		if recursive and dirs:
-			if dirs[0] == '.':
-				dirs = dirs[2:]
-			# recurrent call on directories
-			files = list(itertools.chain(files,
-				*[ self._list(os.path.join(remote_dir, d), recursive=True, stats=stats)
-					for d in dirs ]))
+			if 1 < self.max_connections:
+				files += self._crawl(dirs, stats)
+			else:
+				for d in dirs:
+					files += self._list(d, recursive=True, stats=stats)
 		return files
 
 
+	def _crawl(self, dirs, stats):
+		"""
+		List directories recursively with several control connections in parallel.
+
+		*new in 0.7.14*
+		"""
+		todo, done = Queue(), Queue()
+		def work():
+			while True:
+				remote_dir = todo.get()
+				if remote_dir is None:
+					break
+				try:
+					result = self._request(self._listdir, remote_dir, stats)
+				except BaseException as e:
+					done.put((None, e))
+				else:
+					done.put((result, None))
+		workers = [ threading.Thread(target=work) for _ in range(self.max_connections) ]
+		for worker in workers:
+			worker.daemon = True
+			worker.start()
+		files, error = [], None
+		pending = len(dirs)
+		for d in dirs:
+			todo.put(d)
+		try:
+			while pending:
+				result, e = done.get()
+				pending -= 1
+				if e is not None:
+					error = e
+				elif error is None:
+					_files, _dirs = result
+					files += _files
+					for d in _dirs:
+						todo.put(d)
+						pending += 1
+		finally:
+			for worker in workers:
+				todo.put(None)
+		for worker in workers:
+			worker.join()
+		if error is not None:
+			raise error
+		return files
+
+
+	def probe(self):
+		# the modification time of a directory reflects the creation and deletion
+		# of its entries but not in its sub-directories; the generation file
+		# covers the entire repository
+		state = []
+		for target in (self.repository, join(self.repository, self._generation_file)):
+			try:
+				if self._mlst_support is not False:
+					try:
+						state.append(self._request('sendcmd', 'MLST ' + target))
+						self._mlst_support = True
+						continue
+					except ftplib.error_perm as e:
+						if e.args[0][:3] not in ('500', '502'):
+							raise
+						self._mlst_support = False
+				if target == self.repository:
+					state.append(None)
+				else:
+					state.append(self._request('sendcmd', 'MDTM ' + target))
+			except ftplib.error_perm:
+				# 550 missing file
+				state.append(None)
+		if not any(state):
+			return None
+		return tuple(state)
+
+
 	def exists(self, remote_file, dirname=None):
+		if dirname:
+			remote_file = join(dirname, remote_file)
 		if self._size_support:
-			if dirname:
-				remote_file = join(dirname, remote_file)
 			size = self.size(remote_file)
 			# Py3 does not compare `int` and `None`
 			return size is not None and 0 <= size
 		else:
-			return Relay.exists(self, remote_file, dirname=dirname)
+			# listed files are relative to the repository root
+			return remote_file in self._list(os.path.dirname(remote_file), recursive=False)
 
 
 	def _push(self, local_file, remote_dest, makedirs=True):
 		dirname, basename = os.path.split(remote_dest)
 		fullpath = os.path.join(self.repository, dirname)
-		try:
-			self._request(self.ftp.cwd, fullpath)
-		except ftplib.error_perm as e:
-			err_code = e.args[0][:3]
-			if err_code == '550':
-				# [pure-ftpd] 550 Can't change directory to ...: No such file or directory
-				if self._root:
-					self.ftp.cwd(self._root)
-					dirname = os.path.relpath(fullpath, self._root)
+		transfer = None
+		if self.part_store is not None:
+			transfer = self.part_store.upload(self, remote_dest, local_file)
+		def push(ftp):
+			cached = ftp._wd == fullpath
+			try:
+				ftp.cwd(fullpath)
+			except ftplib.error_perm as e:
+				err_code = e.args[0][:3]
+				if err_code == '550':
+					# [pure-ftpd] 550 Can't change directory to ...: No such file or directory
+					if self._root:
+						ftp.cwd(self._root)
+						path = os.path.relpath(fullpath, self._root)
+					else:
+						ftp.cwd('/')
+						path = fullpath
+					parts = os.path.normpath(path).split('/')
+					for part in parts:
+						if part:
+							try:
+								ftp.cwd(part)
+							except ftplib.error_perm:
+								try:
+									ftp.mkd(part)
+								except ftplib.error_perm:
+									# created in the meantime by a concurrent push;
+									# the following `cwd` fails otherwise
+									pass
+								ftp.cwd(part)
+					ftp._wd = fullpath
 				else:
-					self.ftp.cwd('/')
-				parts = os.path.normpath(dirname).split('/')
-				for part in parts:
-					if part:
-						try:
-							self.ftp.cwd(part)
-						except ftplib.error_perm:
-							self.ftp.mkd(part)
-							self.ftp.cwd(part)
-			else:
-				raise
-		self.ftp.storbinary('STOR ' + basename, open(local_file, 'rb'))
+					raise
+			try:
+				if transfer is None:
+					with open(local_file, 'rb') as f:
+						ftp.storbinary('STOR ' + basename, f)
+				else:
+					# on reconnection, resume from the parts stored on the server
+					self._pushParts(ftp, transfer, local_file, basename)
+			except ftplib.error_perm:
+				if not cached:
+					raise
+				# the directory may have been deleted since the last visit
+				ftp._wd = None
+				push(ftp)
+		self._request(push, wd=fullpath)
+		self.usage.update(remote_dest, os.path.getsize(local_file))
 
 
 	def _get(self, remote_file, local_file, makedirs=True):
@@ -481,51 +896,176 @@ class FTP(Relay):
 			local_dir = os.path.dirname(local_file)
 			if not os.path.isdir(local_dir):
 				os.makedirs(local_dir)
-		self._request(self.ftp.retrbinary, 'RETR ' + join(self.repository, remote_file),
-				open(local_file, 'wb').write)
+		transfer = None
+		if self.part_store is not None and self._mayBeLarge(remote_file):
+			transfer = self._request(self._downloadProgress, remote_file)
+		remote_path = join(self.repository, remote_file)
+		if transfer is None:
+			def get(ftp):
+				with open(local_file, 'wb') as f:
+					ftp.retrbinary('RETR ' + remote_path, f.write)
+			self._request(get)
+		else:
+			def fetch(writer, offset):
+				if offset:
+					self.logger.debug("resuming download of '%s' from byte %s", remote_file, offset)
+				def get(ftp):
+					# on reconnection, resume from the data received so far
+					start = writer.tell()
+					ftp.retrbinary('RETR ' + remote_path, writer.write, rest=start or None)
+				self._request(get)
+			resume_download(transfer, fetch, local_file)
+
+
+	def _pushParts(self, ftp, transfer, local_file, basename):
+		"""
+		Upload a large file from the last part stored on the server, with the
+		``REST`` command.
+
+		*new in 0.7.14*
+		"""
+		remote_size = None
+		if transfer.offset:
+			try:
+				ftp.voidcmd('TYPE I')
+				remote_size = ftp.size(basename)
+			except ftplib.error_perm:
+				pass
+		def send(reader, offset):
+			if offset:
+				self.logger.debug("resuming upload of '%s' from byte %s", basename, offset)
+				try:
+					ftp.storbinary('STOR ' + basename, reader, rest=offset)
+				except ftplib.error_perm as e:
+					# REST not supported
+					if e.args[0][:3] not in ('500', '501', '502', '504'):
+						raise
+					reader.seek(0)
+				else:
+					return
+			ftp.storbinary('STOR ' + basename, reader)
+		resume_upload(transfer, send, local_file, remote_size)
+
+
+	def _mayBeLarge(self, remote_file):
+		"""
+		Tells whether a file may be large enough to be downloaded in parts,
+		without querying the server; locks, placeholders, messages and
+		manifests are small, and so are the files of known size below
+		the threshold.
+
+		*new in 0.7.14*
+		"""
+		filename = os.path.basename(remote_file)
+		if self._isLock(filename) or self._isPlaceholder(filename) \
+				or self._isMessage(filename) or self.isManifest(remote_file):
+			return False
+		size = self.usage.size(remote_file)
+		return size is None or self.part_store.min_size < size
+
+
+	def _downloadProgress(self, ftp, remote_file):
+		"""
+		Progress of the download of a large file, or ``None`` if the file is
+		to be downloaded at once.
+
+		*new in 0.7.14*
+		"""
+		remote_path = join(self.repository, remote_file)
+		try:
+			ftp.voidcmd('TYPE I')
+			size = ftp.size(remote_path)
+		except ftplib.error_perm:
+			return None
+		if size is None or size <= self.part_store.min_size:
+			return None
+		try:
+			mdtm = ftp.sendcmd('MDTM ' + remote_path)
+		except ftplib.error_perm:
+			mdtm = None
+		return self.part_store.download(self, remote_file, size, [mdtm])
 
 
 	def unlink(self, remote_file):
-		self._request(self.ftp.delete, join(self.repository, remote_file))
+		self._request('delete', join(self.repository, remote_file))
+		self.usage.remove(remote_file)
+
+
+	def unlink_many(self, remote_files):
+		# all the files are deleted with a single connection;
+		# on reconnecting, the files that are already deleted are skipped
+		done, errors = set(), []
+		def delete(ftp):
+			for remote_file in remote_files:
+				if remote_file in done:
+					continue
+				try:
+					ftp.delete(join(self.repository, remote_file))
+				except ftplib.error_perm as e:
+					errors.append(e)
+				done.add(remote_file)
+		try:
+			self._request(delete)
+		finally:
+			for remote_file in done:
+				self.usage.remove(remote_file)
+		if errors:
+			raise errors[0]
 
 
 	def purge(self, remote_dir=''):
-		relay_dir = os.path.join(self.repository, asstr(remote_dir))
-		ls = self._request(self.ftp.nslt, '-a', relay_dir)
-		for _entry in ls:
-			entry = os.path.join(relay_dir, _entry)
+		def purge(ftp, relay_dir):
 			try:
-				self.ftp.delete(entry)
-			except ftplib.all_errors:
-				# TODO: find out which errors exactly
-				self.purge(entry)
-		self.ftp.rmd(relay_dir)
+				ls = ftp.nlst('-a', relay_dir)
+			except ftplib.error_perm:
+				# some servers do not accept options
+				ls = ftp.nlst(relay_dir)
+			for _entry in ls:
+				if os.path.basename(_entry) in ('.', '..'):
+					continue
+				entry = os.path.join(relay_dir, _entry)
+				try:
+					ftp.delete(entry)
+				except ftplib.all_errors:
+					# TODO: find out which errors exactly
+					purge(ftp, entry)
+			ftp._wd = None
+			ftp.rmd(relay_dir)
+		self._request(purge, os.path.join(self.repository, asstr(remote_dir)))
+		self.usage.reset()
 
 
 	def close(self):
+		if self._pool is None or self.share_connections:
+			# other clients may use the shared connections
+			return
+		for ftp in self._pool.clear():
+			self._quit(ftp)
+
+
+	def _quit(self, ftp):
 		try:
-			self.ftp.quit()
+			ftp.quit()
 		except ExpressInterrupt:
 			# an interrupt may happen anytime
-			self.ftp.close()
+			ftp.close()
 			raise
 		except IOError as e:
-			import errno
 			if e.errno == errno.EPIPE:
 				# [vsftpd] [Errno 32] Broken pipe
 				pass
 			else:
 				# TODO: identify which errors are raised
 				self.logger.debug(traceback.format_exc())
-			self.ftp.close()
+			ftp.close()
 		except ftplib.error_perm as e:
 			err_code = e.args[0][:3]
 			if err_code not in ['421']:
 				# TODO: identify which other errors are raised
 				self.logger.debug(traceback.format_exc())
-			self.ftp.close()
+			ftp.close()
 		except:
 			# TODO: identify which errors are raised
 			self.logger.debug(traceback.format_exc())
-			self.ftp.close()
+			ftp.close()
 
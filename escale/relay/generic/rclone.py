@@ -24,6 +24,7 @@ from ..relay import Relay
 from escale.base.subprocess import *
 import os
 import time
+import tempfile
 
 
 
@@ -65,6 +66,8 @@ class RClone(Relay):
     """
 
     __protocol__ = ['rclone'] + _supported_protocols
+    __thread_safe__ = True
+    __native_unlink__ = True
 
     _is_multi_path = True
 
@@ -132,28 +135,30 @@ class RClone(Relay):
                 self.logger.error("unexpected rclone error for command %s on relay dir '%s': %s", cmd, relay_dir, err)
                 raise
         if stats:
-            files = []
-            sizes = []
-            mtimes = []
-            for line in ls.splitlines():
-                line = asstr(line)
-                record = line.split(None, 3)
-                size = record[0]
-                path = record[3]
-                mtime = record[1] + ' ' + record[2].split('.')[0]
-                mtime = time.strptime(mtime, '%Y-%m-%d %H:%M:%S')
-                files.append(path)
-                sizes.append(size)
-                mtimes.append(mtime)
-            files = [ files ]
-            for s in stats:
-                if s == 'size':
-                    files.append(sizes)
-                elif s == 'mtime':
-                    files.append(mtimes)
-            return zip(*files)
+            def entries():
+                for line in ls.splitlines():
+                    line = asstr(line)
+                    record = line.split(None, 3)
+                    entry = [ record[3] ]
+                    for s in stats:
+                        if s == 'size':
+                            entry.append(record[0])
+                        elif s == 'mtime':
+                            mtime = record[1] + ' ' + record[2].split('.')[0]
+                            entry.append(time.strptime(mtime, '%Y-%m-%d %H:%M:%S'))
+                    yield tuple(entry)
+            return entries()
         else:
-            return [ line.split(None, 1)[2] for line in ls.splitlines() ]
+            return ( line.split(None, 1)[2] for line in ls.splitlines() )
+
+    def probe(self):
+        # the generation file only
+        relay_file = '{}:{}'.format(self.remote,
+                os.path.join(self.repository, self._generation_file))
+        output = with_subprocess(self.rclone_bin, 'lsl', relay_file, output=True)
+        if isinstance(output, tuple) or not output:
+            return None
+        return asstr(output).strip()
 
     def exists(self, remote_file, dirname=None):
         remote_file = asstr(remote_file)
@@ -235,8 +240,46 @@ class RClone(Relay):
             #_, error = output
             pass
 
+    def unlink_many(self, remote_files):
+        # a single call to rclone with the list of files
+        fd, file_list = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for remote_file in remote_files:
+                    f.write(asstr(remote_file) + '\n')
+            output = with_subprocess(self.rclone_bin, 'delete',
+                    '{}:{}'.format(self.remote, self.repository),
+                    '--files-from', file_list, output=True)
+        finally:
+            os.unlink(file_list)
+        if isinstance(output, tuple):
+            #_, error = output
+            pass
+
+    def _getMany(self, remote_files, local_dir):
+        # a single call to rclone with the list of files
+        fd, file_list = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for remote_file in remote_files:
+                    f.write(asstr(remote_file) + '\n')
+            output = with_subprocess(self.rclone_bin, 'copy',
+                    '{}:{}'.format(self.remote, self.repository), local_dir,
+                    '--files-from', file_list, output=True)
+        finally:
+            os.unlink(file_list)
+        if isinstance(output, tuple):
+            _, error = output
+            self.logger.debug("rclone error on command 'copy': %s", asstr(error))
+        local_files = {}
+        for remote_file in remote_files:
+            local_file = os.path.join(local_dir, asstr(remote_file))
+            if os.path.isfile(local_file):
+                local_files[remote_file] = local_file
+        return local_files
+
     def purge(self, remote_dir=''):
-        relay_file = '{}:{}'.format(self.remote, os.path.join(self.repository, asstr(remote_file)))
+        relay_file = '{}:{}'.format(self.remote, os.path.join(self.repository, asstr(remote_dir)))
         output = with_subprocess(self.rclone_bin, 'purge', relay_file, output=True)
         if isinstance(output, tuple):
             #_, error = output
@@ -64,6 +64,7 @@ class DriveGoogle(Relay):
 	"""
 
 	__protocol__ = ['google', 'googledrive']
+	__native_unlink__ = True
 
 	_is_multi_path = True
 
@@ -153,29 +154,22 @@ class DriveGoogle(Relay):
 				*args, **kwargs)
 		repository = '/'+self.repository
 		if stats:
-			files = []
-			sizes = []
-			mtimes = []
-			for line in ls.splitlines():
-				record = line.split(None, 4)
-				size = record[2]
-				record = record[-1].split(None, 4)
-				path = record[-1]
-				path = os.path.relpath(path, repository)
-				mtime = ' '.join(record[:3])
-				mtime = time.strptime(mtime, '%Y-%m-%d %H:%M:%S +0000')
-				files.append(path)
-				sizes.append(size)
-				mtimes.append(mtime)
-			files = [ files ]
-			for s in stats:
-				if s == 'size':
-					files.append(sizes)
-				elif s == 'mtime':
-					files.append(mtimes)
-			return zip(*files)
+			def entries():
+				for line in ls.splitlines():
+					record = line.split(None, 4)
+					size = record[2]
+					record = record[-1].split(None, 4)
+					entry = [ os.path.relpath(record[-1], repository) ]
+					for s in stats:
+						if s == 'size':
+							entry.append(size)
+						elif s == 'mtime':
+							mtime = ' '.join(record[:3])
+							entry.append(time.strptime(mtime, '%Y-%m-%d %H:%M:%S +0000'))
+					yield tuple(entry)
+			return entries()
 		else:
-			return [ os.path.relpath(path, repository) for path in ls.splitlines() ]
+			return ( os.path.relpath(path, repository) for path in ls.splitlines() )
 
 	def exists(self, remote_file, dirname=None):
 		remote_file = asstr(remote_file)
@@ -260,6 +254,12 @@ class DriveGoogle(Relay):
 		#else:
 		#	self.logger.info("missing file '%s'", relay_file)
 
+	def unlink_many(self, remote_files):
+		relay_files = [ os.path.join(self.repository, asstr(f)) for f in remote_files ]
+		if relay_files:
+			with_subprocess(self.drive_bin, 'delete', '-hidden', '-quiet', *relay_files,
+					cwd=self.mount_point, error=IOError)
+
 	def purge(self, remote_dir=''):
 		self.unlink(remote_dir)
 
@@ -23,8 +23,8 @@
 from escale.base import *
 from .relay import *
 from .info import *
+from .listing import Listing
 import time
-import calendar
 import itertools
 import traceback
 import tarfile
@@ -32,6 +32,8 @@ import tempfile
 import shutil
 import bz2
 import os
+import json
+import hashlib
 from collections import defaultdict, MutableMapping
 
 
@@ -439,7 +441,7 @@ class IndexRelay(AbstractIndexRelay):
                     self.transaction_timestamp = int(round(time.time()))
                 timestamp = self.transaction_timestamp
             elif mode is None or mode == 'r':
-                raw_ls = self.listing_cache # should be up-to-date
+                raw_ls = self._hiddenEntries() # should be up-to-date
                 prefixes = (
                     '{}{}.'.format(self._update_index_prefix, page),
                     '{}{}.'.format(self._update_data_prefix, page),
@@ -467,8 +469,7 @@ class IndexRelay(AbstractIndexRelay):
                         self.logger.error(msg)
                         # delete them all!
                         self.logger.debug(', '.join(ls))
-                        for l in ls:
-                            self.unlink(l)
+                        self.unlink_many(ls)
                         raise PostponeRequest
                     timestamp = ts[0]
             else:
@@ -476,13 +477,22 @@ class IndexRelay(AbstractIndexRelay):
                 self.logger.critical(msg)
                 raise NotImplementedError(msg)
         else:
-            reffile = self.persistentIndex(page)
-            for filename, mtime in self.listing_cache:
-                if filename == reffile:
-                    timestamp = int(round(calendar.timegm(mtime)))
-                    break
+            mtime = self.listing_cache.mtime(self.persistentIndex(page))
+            if mtime is not None:
+                timestamp = int(round(mtime))
         return timestamp
 
+    def _hiddenEntries(self):
+        """
+        Entries of the listing cache for the hidden files other than placeholders, locks
+        and messages; these include the index and update files.
+        """
+        ls = self.listing_cache
+        if isinstance(ls, Listing):
+            return ls.others.items()
+        else:
+            return ls
+
     @property
     def listing_cache(self):
         return self.base_relay.listing_cache
@@ -496,35 +506,31 @@ class IndexRelay(AbstractIndexRelay):
         *new in 0.7.13*: `remoteListing` returns the list of recently modified
         entries (more recent then in cache) if any, else the entire listing.
         """
-        if self.listing_cache is None:
-            previous_listing = None
-        else:
-            previous_listing = { f: t for f, t in self.listing_cache }
+        previous_listing = self.listing_cache
         #
         self.base_relay.remoteListing()
         # *new in 0.7.13*: put modified indices first
         recent = []
-        if previous_listing:
-            old = []
+        if previous_listing and previous_listing is not self.listing_cache:
             for entry in self.listing_cache:
                 f, t = entry
-                try:
-                    t_prev = previous_listing[f]
-                except KeyError:
-                    pass
-                else:
-                    if t is not None:
-                        if t_prev == t:
-                            old.append(entry)
-                            continue
-                        assert t_prev < t
+                t_prev = previous_listing.mtime(f)
+                if t is not None and t_prev is not None:
+                    if t_prev == t:
+                        continue
+                    assert t_prev < t
                 recent.append(entry)
-            self.listing_cache = recent + old
         if recent:
             return recent
         else:
             return self.listing_cache
 
+    def probe(self):
+        return self.base_relay.probe()
+
+    def notifyChanges(self):
+        self.base_relay.notifyChanges()
+
     def refreshListing(self, remote_dir='', force=False):
         now = time.time()
         if force or not (self.listing_time and now - self.listing_time < self.listing_cooldown):
@@ -568,19 +574,10 @@ class IndexRelay(AbstractIndexRelay):
             if self.base_relay.exists(persistent_index):
                 assert self.index_mtime[page] is not None
                 if not mtime:
-                    mtime = [ mtime for name, mtime in self.listing_cache \
-                            if name == persistent_index ]
-                    if mtime:
-                        mtime = mtime[0]
+                    mtime = self.listing_cache.mtime(persistent_index)
                 if mtime:
-                    t1 = mtime
-                    t2 = self.index_mtime[page]
-                    if isinstance(t1, time.struct_time):
-                        t1 = calendar.timegm(t1)
-                    if isinstance(t2, time.struct_time):
-                        t2 = calendar.timegm(t2)
-                    t1, t2 = int(t1), int(t2)
-                    return t1 == t2
+                    # listing modification times are in seconds since the epoch
+                    return int(mtime) == int(self.index_mtime[page])
                 else:
                     # base relay does not provide modification times;
                     # False would make the client load the index at every getIndexChanges call;
@@ -659,10 +656,24 @@ class IndexRelay(AbstractIndexRelay):
             raise
         except Exception as e:
             self.logger.debug("cannot delete file '%s': %s", remote_file, e)
+        if self.listing_cache is not None:
+            self.listing_cache.discard(remote_file)
+
+    def unlink_many(self, remote_files):
+        remote_files = list(remote_files)
+        if not all(remote_files):
+            raise ValueError
+        if not remote_files:
+            return
         try:
-            self.listing_cache = [ (l,s) for l,s in self.listing_cache if l != remote_file ]
-        except TypeError:
-            pass
+            self.base_relay.unlink_many(remote_files)
+        except ExpressInterrupt:
+            raise
+        except Exception as e:
+            self.logger.debug("cannot delete files '%s': %s", "', '".join(remote_files), e)
+        if self.listing_cache is not None:
+            for remote_file in remote_files:
+                self.listing_cache.discard(remote_file)
 
     def setUpdateData(self, page, datafile):
         self.base_relay._push(datafile, self.updateData(page, mode='w'))
@@ -708,13 +719,31 @@ class IndexRelay(AbstractIndexRelay):
     def allPages(self):
         return [ self.page('a') ]
 
+    def rebalancePages(self):
+        """
+        Adapt the paging to the size and activity of the pages.
+
+        Paging is fixed by default; see :class:`AdaptiveIndex`.
+
+        *new in 0.7.14*
+        """
+        return False
+
+    def pageMapFile(self):
+        """
+        Path of the page map on the relay, if any.
+
+        *new in 0.7.14*
+        """
+        return None
+
     def listPages(self, remote_dir='', recent_only=False):
         if recent_only:
             # remote_dir is actually not supported
             listing = self.remoteListing()
         else:
             self.refreshListing(remote_dir)
-            listing = self.listing_cache
+            listing = self._hiddenEntries()
         files = []
         for filename, _ in listing:
             if self._persistent_index_prefix:
@@ -786,14 +815,14 @@ class IndexRelay(AbstractIndexRelay):
     def repairUpdates(self):
         self.refreshListing()
         for page in self.allPages():
-            if self.base_relay.lock(page) in [ l for l,_ in self.listing_cache ]:
+            if self.base_relay.lock(page) in self.listing_cache:
                 lock = self.base_relay.getLockInfo(page)
                 if not lock or not lock.owner or lock.owner == self.client:
                     if not lock or not lock.mode or lock.mode == 'w':
-                        for f,_ in self.listing_cache:
-                            if self.updateRelated(page, f):
-                                self.logger.debug("releasing remnant update file '%s'", f)
-                                self.unlink(f)
+                        remnants = [ f for f,_ in self._hiddenEntries() if self.updateRelated(page, f) ]
+                        for f in remnants:
+                            self.logger.debug("releasing remnant update file '%s'", f)
+                        self.unlink_many(remnants)
                     self.logger.debug("releasing remnant lock for page '%s'", page)
                     self.releasePageLock(page)
 
@@ -829,7 +858,7 @@ class IndexRelay(AbstractIndexRelay):
                 write_index(tmp, self.index[page], groupby=self.metadata_group_by, compress=True)
                 self.logger.debug("updating index for page '%s'", page)
                 self.base_relay._push(tmp, remote_index)
-                self.index_mtime[page] = [ mtime for name, mtime in self.listing_cache if name == remote_index ][0]
+                self.index_mtime[page] = self.listing_cache.mtime(remote_index)
             elif self.allow_page_deletion:
                 for remote_file in reported_missing:
                     self.logger.info("file '%s' reported missing", remote_file)
@@ -848,9 +877,8 @@ class IndexRelay(AbstractIndexRelay):
     def getIndexChanges(self, page, sync=True, check_mtime=False):
         index = {}
         location = self.persistentIndex(page)
-        index_mtime = [ mtime for name, mtime in self.listing_cache if name == location ]
-        if index_mtime:
-            index_mtime = index_mtime[0]
+        if location in self.listing_cache:
+            index_mtime = self.listing_cache.mtime(location)
             timestamp = self.updateTimestamp(page, mode='r') # read last update timestamp on the relay
             if self.loaded(page, index_mtime, check_mtime):
                 if not timestamp:
@@ -919,7 +947,7 @@ class IndexRelay(AbstractIndexRelay):
             self.logger.warning("empty update index for page '%s'", page)
             return
         index_location = self.persistentIndex(page)
-        exists = index_location in [ f for f,_ in self.listing_cache ]
+        exists = index_location in self.listing_cache
         tmp = self.base_relay.newTemporaryFile()
         index_update = index
         upload_index = sync or not exists
@@ -927,7 +955,7 @@ class IndexRelay(AbstractIndexRelay):
             if exists:
                 if page not in self.index or not self.index[page]:
                     self.remoteListing() # double check
-                    exists = index_location in [ f for f,_ in self.listing_cache ]
+                    exists = index_location in self.listing_cache
                     if exists:
                         raise RuntimeError("page '%s' exists but is empty", page)
                     else:
@@ -952,7 +980,7 @@ class IndexRelay(AbstractIndexRelay):
         #
         self.remoteListing()
         if upload_index:
-            self.index_mtime[page] = [ mtime for name, mtime in self.listing_cache if name == index_location ][0]
+            self.index_mtime[page] = self.listing_cache.mtime(index_location)
 
     def setUpdateData(self, page, data):
         self.base_relay._push(data, self.updateData(page, mode='w'))
@@ -966,11 +994,8 @@ class IndexRelay(AbstractIndexRelay):
         pullers.append(self.client)
         location = self.updateIndex(page, mode='r')
         if terminate and terminate(pullers):
-            if location:
-                self.unlink(location)
-            location = self.updateData(page, mode='r')
-            if location:
-                self.unlink(location)
+            data_location = self.updateData(page, mode='r')
+            self.unlink_many([ l for l in (location, data_location) if l ])
             return
         #
         #if not location:
@@ -1026,10 +1051,351 @@ class TopDirectoriesIndex(IndexRelay):
     def allPages(self):
         self.refreshListing()
         locks_and_indices = self.listPages()
-        for entry, _ in self.listing_cache:
-            if self.base_relay._isLock(entry):
-                page = self.base_relay._fromLock(entry)
-                if page not in [ l for l, _ in self.listing_cache ]:
-                    locks_and_indices.append(page)
+        for page in self.listing_cache.locks:
+            if '/' not in page and page not in self.listing_cache:
+                locks_and_indices.append(page)
         return set(IndexRelay.allPages(self) + locks_and_indices)
 
+
+
+
+class AdaptiveIndex(IndexRelay):
+    """
+    Index with pages that are split and merged as the repository evolves.
+
+    Resources are assigned to pages by hashing their path. The pages form
+    a binary tree: page *'0'* holds all the resources, and each page *p* may
+    be split into pages *p + '0'* and *p + '1'* depending on the successive
+    bits of the hash. The current pages (the leaves of the tree) are listed
+    in a page map stored on the relay, so that all the clients agree on the
+    paging. Each version of the page map is uploaded as a new file
+    (*.escale.pages.<generation>*), so that the clients do not rely on
+    modification times to detect changes.
+
+    A page is split when its index has more than `max_page_entries` entries,
+    or when it is hot, i.e. it has been updated or found locked by another
+    client at least `hot_page_updates` times within the last `churn_window`
+    seconds. Two sibling pages are merged when they have fewer than
+    `min_page_entries` entries in total and neither is hot.
+
+    Pages are split or merged one at a time, at the end of the upload phase,
+    only if all the locks involved can be acquired without waiting and
+    no update is pending. The other pages of the relay that are not in the
+    page map (e.g. the pages of a :class:`TopDirectoriesIndex`) are merged
+    the same way into the pages of the map.
+
+    A relay managed by :class:`IndexRelay` (single page *'0'*) is a valid
+    adaptive index with no page map.
+
+    *new in 0.7.14*
+    """
+
+    # leaves of the tree under this depth are not split further
+    max_page_depth = 16
+    hot_page_updates = 30
+    churn_window = 3600
+
+    def __init__(self, *args, **kwargs):
+        self.max_page_entries = kwargs.pop('max_page_entries', None) or 10000
+        self.min_page_entries = kwargs.pop('min_page_entries', None) or \
+                max(1, self.max_page_entries // 16)
+        IndexRelay.__init__(self, *args, **kwargs)
+        # page map files are suffixed with a generation number
+        self._page_map_prefix = '.escale.pages.'
+        self._page_map_lock = 'escale.pages'
+        self.page_map = set(['0'])
+        self.page_map_generation = None
+        # times of the updates and lock failures, per page
+        self.page_activity = defaultdict(list)
+
+    def _hashBits(self, resource):
+        digest = hashlib.sha1(asbytes(resource)).hexdigest()
+        return bin(int(digest[:8], 16))[2:].zfill(32)
+
+    def page(self, resource):
+        return self._pageIn(self.page_map, resource)
+
+    def _pageIn(self, page_map, resource):
+        page = '0'
+        if page not in page_map:
+            bits = self._hashBits(resource)
+            while page not in page_map:
+                if self.max_page_depth < len(page):
+                    # inconsistent page map
+                    return '0'
+                page += bits[len(page) - 1]
+        return page
+
+    def allPages(self):
+        self.refreshListing()
+        pages = set(self.page_map) | set(self.listPages())
+        for page in self.listing_cache.locks:
+            # including the locks of the pages being split or merged
+            if page == self._page_map_lock or (page.startswith('0') and \
+                    not page.strip('01') and page not in self.listing_cache):
+                pages.add(page)
+        return pages
+
+    def pageMapFile(self, generation=None):
+        if generation is None:
+            generation = self.page_map_generation
+            if generation is None:
+                return None
+        return '{}{}'.format(self._page_map_prefix, generation)
+
+    def _pageMapGenerations(self):
+        generations = []
+        for filename, _ in self._hiddenEntries():
+            if filename.startswith(self._page_map_prefix):
+                try:
+                    generations.append(int(filename[len(self._page_map_prefix):]))
+                except ValueError:
+                    pass
+        return generations
+
+    def remoteListing(self):
+        ls = IndexRelay.remoteListing(self)
+        self.refreshPageMap()
+        return ls
+
+    def refreshPageMap(self):
+        """
+        Download the page map if a new generation is available.
+        """
+        generations = self._pageMapGenerations()
+        if not generations:
+            if self.page_map_generation is not None:
+                self.logger.warning('page map removed')
+                self.page_map, self.page_map_generation = set(['0']), None
+            return
+        generation = max(generations)
+        if generation == self.page_map_generation:
+            return
+        tmp = self.base_relay.newTemporaryFile()
+        try:
+            self.base_relay._get(self.pageMapFile(generation), tmp)
+            with open(tmp, 'r') as f:
+                pages = json.load(f)['pages']
+        except ExpressInterrupt:
+            raise
+        except Exception as e:
+            self.logger.warning('cannot read the page map: %s', e)
+            return
+        finally:
+            self.base_relay.delTemporaryFile(tmp)
+        if pages:
+            self.logger.debug('page map: %s pages', len(pages))
+            self.page_map = set(pages)
+        self.page_map_generation = generation
+
+    def setPageMap(self, pages):
+        """
+        Upload a new generation of the page map and delete the former ones.
+        """
+        former = self._pageMapGenerations()
+        generation = max(former + [self.page_map_generation or 0]) + 1
+        tmp = self.base_relay.newTemporaryFile()
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'pages': sorted(pages)}, f)
+            self._force('update page map', self._page_map_lock,
+                    self.base_relay._push, tmp, self.pageMapFile(generation))
+        finally:
+            self.base_relay.delTemporaryFile(tmp)
+        self.page_map, self.page_map_generation = set(pages), generation
+        if former:
+            self.unlink_many([ self.pageMapFile(g) for g in former ])
+        IndexRelay.remoteListing(self)
+
+    def _retired(self, page):
+        """
+        Tells whether a page has been split or merged into other pages.
+        """
+        return page not in self.page_map and \
+                self.persistentIndex(page) not in self.listing_cache
+
+    def clearIndex(self, page=None):
+        if page is not None and self._retired(page):
+            self.index.pop(page, None)
+            self.index_mtime.pop(page, None)
+            return
+        IndexRelay.clearIndex(self, page)
+
+    def loaded(self, page, mtime=None, check_mtime=True):
+        if page in self.index and self._retired(page):
+            self.logger.debug("page '%s' has been split or merged", page)
+            del self.index[page]
+            del self.index_mtime[page]
+            return False
+        return IndexRelay.loaded(self, page, mtime, check_mtime)
+
+    def acquirePageLock(self, page, mode):
+        try:
+            IndexRelay.acquirePageLock(self, page, mode)
+        except PostponeRequest:
+            self._recordActivity(page)
+            raise
+        if mode == 'w':
+            # the page may have been split or merged in the meantime;
+            # pages are split or merged under their locks, and their indices
+            # are deleted once the new page map is uploaded
+            self.refreshPageMap()
+            index = self.persistentIndex(page)
+            if page not in self.page_map or not self.base_relay.exists(index):
+                # e.g. empty page; double check with a full listing
+                self.remoteListing()
+                if page not in self.page_map and index not in self.listing_cache:
+                    self.releasePageLock(page)
+                    raise PostponeRequest("page '%s' has been split or merged", page)
+        return True
+
+    def getIndexChanges(self, page, sync=True, check_mtime=False):
+        last_update = self.last_update.get(page)
+        index = IndexRelay.getIndexChanges(self, page, sync, check_mtime)
+        if self.last_update.get(page, last_update) != last_update:
+            self._recordActivity(page)
+        return index
+
+    def setUpdateIndex(self, page, index, sync=True):
+        IndexRelay.setUpdateIndex(self, page, index, sync)
+        self._recordActivity(page)
+
+    def _recordActivity(self, page):
+        self.page_activity[page].append(time.time())
+
+    def hot(self, page):
+        """
+        Tells whether a page has been updated or found locked too often.
+        """
+        activity = self.page_activity.get(page)
+        if not activity:
+            return False
+        start = time.time() - self.churn_window
+        activity[:] = [ t for t in activity if start <= t ]
+        return self.hot_page_updates <= len(activity)
+
+    def pageSize(self, page):
+        """
+        Number of entries in a page, or ``None`` if the page is not loaded.
+        """
+        if self.persistentIndex(page) not in self.listing_cache:
+            return 0
+        if page in self.index:
+            return len(self.index[page])
+        return None
+
+    def rebalancePages(self):
+        """
+        Split or merge a page, or merge a page that is not in the page map
+        into the pages of the map.
+
+        Returns:
+
+            bool: ``True`` if the paging changed.
+        """
+        self.refreshListing(force=True)
+        def pending(page):
+            return self.updateTimestamp(page, mode='r') is not None
+        for page in self.listPages():
+            if page not in self.page_map and not pending(page):
+                self.logger.info("migrating page '%s'", page)
+                return self._repage([page], [], self.page_map)
+        sizes = { page: self.pageSize(page) for page in self.page_map }
+        candidates = []
+        for page, size in sizes.items():
+            if size is None or self.max_page_depth < len(page) or pending(page):
+                continue
+            if self.max_page_entries < size:
+                candidates.append((-size, page, 'too large'))
+            elif 2 * self.min_page_entries <= size and self.hot(page):
+                candidates.append((-size, page, 'hot'))
+        if candidates:
+            _, page, reason = min(candidates)
+            self.logger.info("splitting page '%s' (%s)", page, reason)
+            return self._repage([page], [page + '0', page + '1'],
+                    self.page_map - set([page]) | set([page + '0', page + '1']))
+        for page in sorted(self.page_map):
+            if not page.endswith('0') or len(page) == 1:
+                continue
+            parent, sibling = page[:-1], page[:-1] + '1'
+            if sibling not in self.page_map or self.hot(page) or self.hot(sibling) \
+                    or pending(page) or pending(sibling):
+                continue
+            size, sibling_size = sizes[page], sizes[sibling]
+            if size is None or sibling_size is None:
+                continue
+            if size + sibling_size < self.min_page_entries:
+                self.logger.info("merging pages '%s' and '%s'", page, sibling)
+                return self._repage([page, sibling], [parent],
+                        self.page_map - set([page, sibling]) | set([parent]))
+        return False
+
+    def _repage(self, old_pages, new_pages, page_map):
+        """
+        Move the entries of pages `old_pages` into pages `new_pages` (or the
+        pages of `page_map` if empty), and replace the page map.
+        """
+        locked = []
+        def lock(page):
+            if self.tryAcquirePageLock(page, 'w'):
+                locked.append(page)
+                return True
+            self.logger.debug("page '%s' is locked; postponing", page)
+            return False
+        try:
+            if not lock(self._page_map_lock):
+                return False
+            self.remoteListing()
+            if set(old_pages) - (self.page_map | set(self.listPages())):
+                # paging changed in the meantime
+                return False
+            for page in list(old_pages) + list(new_pages):
+                if not lock(page):
+                    return False
+                if self.hasUpdate(page):
+                    self.logger.debug("pending update for page '%s'; postponing", page)
+                    return False
+            content = {}
+            for page in old_pages:
+                if self.persistentIndex(page) in self.listing_cache:
+                    content.update(self.getPageIndex(page))
+            target = defaultdict(dict)
+            if not new_pages:
+                # merge into existing pages; entries already in these pages prevail
+                for resource, mdata in content.items():
+                    target[self._pageIn(page_map, resource)][resource] = mdata
+                for page in list(target):
+                    if not lock(page):
+                        return False
+                    if self.hasUpdate(page):
+                        self.logger.debug("pending update for page '%s'; postponing", page)
+                        return False
+                    current = self.getPageIndex(page) if self.hasIndex(page) else {}
+                    target[page].update(current)
+            else:
+                for resource, mdata in content.items():
+                    target[self._pageIn(page_map, resource)][resource] = mdata
+            for page, index in target.items():
+                if index:
+                    self.setPageIndex(page, index)
+            self.setPageMap(page_map)
+            for page, index in target.items():
+                if index:
+                    self.index[page] = index
+                    self.index_mtime[page] = self.listing_cache.mtime(self.persistentIndex(page))
+            obsolete = [ self.persistentIndex(page) for page in old_pages
+                    if page not in target and self.persistentIndex(page) in self.listing_cache ]
+            self.unlink_many(obsolete)
+            for page in old_pages:
+                if page not in target:
+                    self.index.pop(page, None)
+                    self.index_mtime.pop(page, None)
+            return True
+        finally:
+            for page in locked[::-1]:
+                try:
+                    self.releasePageLock(page)
+                except ExpressInterrupt:
+                    raise
+                except Exception as e:
+                    self.logger.debug("failed to release lock for page '%s': %s", page, e)
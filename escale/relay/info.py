@@ -20,6 +20,7 @@
 
 
 from escale.base.essential import asstr, basestring
+from escale.base.checksum import checksum_algorithm, hash_file, is_available
 import os.path
 # former format
 import time
@@ -182,7 +183,8 @@ class Metadata(object):
             checksum (str-like): checksum of file content (local).
 
             hash_function (callable): hash function that can be applied to the
-                content of the `local_file` file if `checksum` is not defined.
+                content of the `local_file` file if `checksum` is not defined
+                and the algorithm of the remote checksum cannot be determined.
 
             remote (bool): if `True`, `fileModified` tells whether or not
                 the remote copy of the file is a modified version of the 
@@ -196,16 +198,33 @@ class Metadata(object):
 
             bool: `True` if file has been modified.
 
+        If `checksum` and the remote checksum have been generated by different
+        hash algorithms, the local file is hashed again with the algorithm of
+        the remote checksum, if available.
+        Otherwise the checksums are ignored and the decision is based on the
+        modification times only.
+
+        *new in 0.7.14:* hash algorithm negotiation
+
         """
         if last_modified and self.timestamp and last_modified == self.timestamp:
             return False
         file_available = local_file and os.path.isfile(local_file)
         identical = None
         if self.checksum:
-            if not checksum and file_available and hash_function is not None:
-                with open(local_file, 'rb') as f:
-                    content = f.read()
-                    checksum = hash_function(content)
+            algorithm = checksum_algorithm(self.checksum)
+            if checksum and checksum_algorithm(checksum) != algorithm:
+                # the checksums cannot be compared
+                checksum = None
+                if file_available and algorithm and is_available(algorithm):
+                    checksum = hash_file(local_file, algorithm)
+            elif not checksum and file_available:
+                if algorithm and is_available(algorithm):
+                    checksum = hash_file(local_file, algorithm)
+                elif hash_function is not None:
+                    with open(local_file, 'rb') as f:
+                        content = f.read()
+                        checksum = hash_function(content)
             if checksum:
                 identical = checksum == self.checksum
                 #if debug and not identical:
@@ -308,7 +327,7 @@ def parse_metadata(lines, target=None, timestamp_format=None, log=None):
                         raise invalid(line)
                 else:
                     try:
-                        key, value = line.split(':', 2)
+                        key, value = line.split(':', 1)
                     except ValueError:
                         raise invalid(line)
                     value = value.lstrip()
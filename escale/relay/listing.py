@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import itertools
+import os.path
+import time
+import calendar
+try:
+    from sys import intern
+except ImportError: # Python 2
+    pass
+
+
+def _join(filedir, filename):
+    return '/'.join((filedir, filename)) if filedir else filename
+
+
+def epoch(mtime):
+    """
+    Convert a modification time as reported by the backends into seconds since
+    the epoch.
+
+    Arguments:
+
+        mtime (time.struct_time or int or float or None): modification time;
+            :class:`time.struct_time` objects are in UTC.
+
+    Returns:
+
+        int or float or None: ``int`` for :class:`time.struct_time` objects;
+        numbers are returned unchanged so that the backends with sub-second
+        resolution keep it.
+
+    *new in 0.7.14*
+    """
+    if isinstance(mtime, time.struct_time):
+        return calendar.timegm(mtime)
+    return mtime
+
+
+def _intern(path):
+    try:
+        return intern(path)
+    except TypeError: # unicode in Python 2
+        return path
+
+
+class Listing(object):
+    """
+    Listing of a relay repository.
+
+    The (path, modification time) entries from :meth:`~escale.relay.relay.Relay._list`
+    are consumed one at a time and classified in a single pass.
+    Placeholders and locks are stored under the path of the corresponding regular
+    file, so that the `list*` methods of :class:`~escale.relay.relay.Relay` do not
+    have to parse filenames again.
+
+    Iterating over a listing yields the (path, modification time) pairs, like the
+    lists of entries it replaces.
+
+    Paths are interned, so that a regular file, its placeholder and lock entries
+    and the corresponding keys of the placeholder cache share a single string.
+    Modification times are converted into seconds since the epoch with :func:`epoch`.
+
+    Attributes:
+
+        relay (escale.relay.relay.Relay): relay that defines the special filenames.
+
+        regular (dict): modification times of the regular files, with their paths as keys.
+
+        placeholders (dict): modification times of the placeholders, with the
+            paths of the corresponding regular files as keys.
+
+        locks (dict): modification times of the locks, with the paths of the
+            corresponding regular files (or pages) as keys.
+
+        messages (dict): modification times of the message files, with their paths
+            as keys.
+
+        others (dict): modification times of the other hidden files, with their
+            paths as keys; these are the index and update files, the manifests
+            and the generation file.
+
+    *new in 0.7.14*
+    """
+
+    __slots__ = ['relay', 'regular', 'placeholders', 'locks', 'messages', 'others']
+
+    def __init__(self, relay, entries=()):
+        self.relay = relay
+        self.regular = {}
+        self.placeholders = {}
+        self.locks = {}
+        self.messages = {}
+        self.others = {}
+        for path, mtime in entries:
+            self.add(path, mtime)
+
+    def _classify(self, path):
+        relay = self.relay
+        filedir, filename = os.path.split(path)
+        if relay._isLock(filename):
+            return self.locks, _join(filedir, relay._fromLock(filename))
+        elif relay._isPlaceholder(filename):
+            return self.placeholders, _join(filedir, relay._fromPlaceholder(filename))
+        elif relay._isMessage(filename):
+            return self.messages, path
+        elif filename.startswith('.'):
+            return self.others, path
+        else:
+            return self.regular, path
+
+    def add(self, path, mtime=None):
+        entries, key = self._classify(path)
+        entries[_intern(key)] = epoch(mtime)
+
+    def discard(self, path):
+        entries, key = self._classify(path)
+        entries.pop(key, None)
+
+    def mtime(self, path, default=None):
+        """
+        Modification time of a file, or `default` if the file is not listed.
+        """
+        entries, key = self._classify(path)
+        return entries.get(key, default)
+
+    def __contains__(self, path):
+        entries, key = self._classify(path)
+        return key in entries
+
+    def __len__(self):
+        return len(self.regular) + len(self.placeholders) + len(self.locks) \
+            + len(self.messages) + len(self.others)
+
+    def __iter__(self):
+        relay = self.relay
+        def placeholders():
+            for regular_file, mtime in self.placeholders.items():
+                filedir, filename = os.path.split(regular_file)
+                yield _join(filedir, relay._placeholder(filename)), mtime
+        def locks():
+            for regular_file, mtime in self.locks.items():
+                filedir, filename = os.path.split(regular_file)
+                yield _join(filedir, relay._lock(filename)), mtime
+        return itertools.chain(self.regular.items(), placeholders(), locks(),
+                self.messages.items(), self.others.items())
+
@@ -13,17 +13,98 @@
 
 from escale.base.essential import *
 from .relay import Relay
+from .usage import UsageTracker
 import os
 import time
+import errno
+import shutil
+import binascii
 import itertools
 
+try:
+	import fcntl
+except ImportError: # Windows
+	fcntl = None
+
+
+# `ioctl` request for copy-on-write clones (reflinks) on Linux; see linux/fs.h
+FICLONE = 0x40049409
+
+# atomic on POSIX systems
+_replace = getattr(os, 'replace', os.rename) # Python 2 has no `os.replace`
+
+
+def fastcopy(src, dest):
+	"""
+	Copy a file with the fastest available method: copy-on-write clone (reflink),
+	in-kernel copy (:func:`os.copy_file_range` or :func:`os.sendfile`),
+	or regular copy.
+
+	*new in 0.7.14*
+	"""
+	with open(src, 'rb') as i:
+		with open(dest, 'wb') as o:
+			def rewind():
+				i.seek(0)
+				o.seek(0)
+				o.truncate()
+			if fcntl is not None:
+				try:
+					fcntl.ioctl(o.fileno(), FICLONE, i.fileno())
+				except (IOError, OSError):
+					# not supported by the file system(s) or different file systems
+					pass
+				else:
+					return
+			chunk = 1 << 30
+			if hasattr(os, 'copy_file_range'): # Python 3.8+, Linux
+				try:
+					while os.copy_file_range(i.fileno(), o.fileno(), chunk):
+						pass
+				except OSError:
+					rewind()
+				else:
+					return
+			if hasattr(os, 'sendfile'):
+				try:
+					offset = 0
+					while True:
+						sent = os.sendfile(o.fileno(), i.fileno(), offset, chunk)
+						if not sent:
+							break
+						offset += sent
+				except OSError:
+					# e.g. macOS requires a socket as output
+					rewind()
+				else:
+					return
+			shutil.copyfileobj(i, o, 1048576)
+
+
+def _makedirs(path):
+	# the directory may be created concurrently (`__thread_safe__`)
+	try:
+		os.makedirs(path)
+	except OSError as e:
+		if e.errno != errno.EEXIST or not os.path.isdir(path):
+			raise
+
 
 class LocalMount(Relay):
 	"""
 	Add support for local file system (mounts).
+
+	Files are copied with :func:`fastcopy`. Uploads are atomic: files are copied
+	into a hidden temporary file that is renamed afterwards.
+	Downloaded files that are deleted from the relay repository are moved
+	instead of copied where possible.
+
+	*new in 0.7.14:* fast path
 	"""
 
 	__protocol__ = ['file']
+	__thread_safe__ = True
+	__native_unlink__ = True
 
 	def __init__(self, client, address, mount_point, **super_args):
 		if address and os.path.isabs(address):
@@ -32,17 +113,23 @@ class LocalMount(Relay):
 			mount_point = join(address, mount_point)
 			address = 'localhost'
 		Relay.__init__(self, client, address, mount_point, **super_args)
+		self.usage = UsageTracker()
 
 	def open(self):
 		pass
 
-	def storageSpace(self):
-		used = 0
-		files = self._list(recursive=True, stats=['size'])
-		if files:
-			files, sizes = zip(*files)
-			used = float(sum(sizes)) / 1048576 # in MB
-		return (used, None)
+	def probe(self):
+		# creating or deleting a placeholder or lock updates the parent directory
+		mtimes = []
+		for dirname, _, _ in os.walk(self.repository):
+			try:
+				mtimes.append(os.stat(dirname).st_mtime)
+			except OSError:
+				pass
+		if mtimes:
+			return (len(mtimes), max(mtimes))
+		else:
+			return None
 
 	def _list(self, relay_dir='', recursive=True, stats=[]):
 		_listdir = not stats
@@ -58,7 +145,6 @@ class LocalMount(Relay):
 					for f in ls:
 						if f.is_file():
 							# os.DirEntry caches the result of stat()
-							print(f.name)
 							files.append((
 								os.path.relpath(asstr(f.path), self.repository),
 								f.stat().st_size,
@@ -101,20 +187,54 @@ class LocalMount(Relay):
 		dirname, basename = os.path.split(relay_dest)
 		dest = os.path.join(self.repository, dirname)
 		if makedirs and not os.path.isdir(dest):
-			os.makedirs(dest)
+			_makedirs(dest)
+		# hidden files are ignored by the other clients
+		tmp = os.path.join(dest, '.{}.{}.part'.format(basename,
+			asstr(binascii.hexlify(os.urandom(4)))))
 		dest = os.path.join(dest, basename)
-		copyfile(local_file, dest)
+		try:
+			fastcopy(local_file, tmp)
+			_replace(tmp, dest)
+		except:
+			if os.path.exists(tmp):
+				os.unlink(tmp)
+			raise
+		self.usage.update(relay_dest, os.path.getsize(dest))
 
 	def _get(self, relay_file, local_file, makedirs=True):
 		src = os.path.join(self.repository, relay_file)
 		if makedirs:
 			dirname = os.path.dirname(local_file)
 			if not os.path.isdir(dirname):
-				os.makedirs(dirname)
-		copyfile(src, local_file)
+				_makedirs(dirname)
+		fastcopy(src, local_file)
+
+	def _pop(self, relay_file, local_file, makedirs=True, _unlink=True):
+		if not _unlink:
+			return self._get(relay_file, local_file, makedirs)
+		src = os.path.join(self.repository, relay_file)
+		if makedirs:
+			dirname = os.path.dirname(local_file)
+			if not os.path.isdir(dirname):
+				_makedirs(dirname)
+		# a moved file keeps its owner
+		moved = False
+		if not hasattr(os, 'getuid') or os.stat(src).st_uid == os.getuid():
+			try:
+				_replace(src, local_file)
+			except OSError as e:
+				if e.errno != errno.EXDEV: # different file systems
+					raise
+			else:
+				moved = True
+		if not moved:
+			fastcopy(src, local_file)
+			os.unlink(src)
+		self.usage.remove(relay_file)
 
 	def unlink(self, relay_file):
 		os.unlink(os.path.join(self.repository, relay_file))
+		self.usage.remove(relay_file)
 
 #	def listTransfered(self, remote_dir, end2end=True, recursive=True):
 #		# Manager.run has completed Manager.download and is initiating Manager.upload
@@ -124,6 +244,6 @@ class LocalMount(Relay):
 #		return Relay.listTransfered(self, remote_dir, end2end=end2end, recursive=recursive)
 
 	def purge(self, relay_dir=''):
-		import shutil
 		shutil.rmtree(os.path.join(self.repository, relay_dir))
+		self.usage.reset()
 
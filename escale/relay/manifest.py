@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+from escale.base.essential import asstr
+from .info import Metadata
+import os.path
+
+
+class Manifest(object):
+    """
+    Meta information for a batch of files pushed at once.
+
+    A complete manifest plays the role of the placeholders for all the files
+    in the batch.
+    A pending manifest plays the role of their locks while the files are
+    being uploaded.
+
+    Manifest files are immutable; a pending manifest is replaced by a
+    complete manifest under another name.
+
+    Attributes:
+
+        version (str): format version.
+
+        owner (str): name of the pushing client.
+
+        state (str): either *'pending'* or *'complete'*.
+
+        entries (dict): :class:`~escale.relay.info.Metadata` objects with
+            relative paths of regular files as keys.
+
+    *new in 0.7.14*
+    """
+
+    __slots__ = ['version', 'owner', 'state', 'entries']
+
+    def __init__(self, version='1.0', owner=None, state='pending', entries=None):
+        self.version = asstr(version)
+        self.owner = None
+        if owner:
+            self.owner = asstr(owner)
+        if state not in ('pending', 'complete'):
+            raise ValueError("wrong manifest state: '{}'".format(state))
+        self.state = state
+        if entries is None:
+            entries = {}
+        self.entries = entries
+
+    @property
+    def pending(self):
+        return self.state == 'pending'
+
+    def add(self, target, timestamp=None, checksum=None):
+        if not valid_target(target):
+            raise ValueError("cannot describe '{}' in a manifest".format(target))
+        self.entries[target] = Metadata(pusher=self.owner, target=target,
+                timestamp=timestamp, checksum=checksum)
+
+    def __repr__(self):
+        info = ['%'.join(('manifest', self.version))]
+        if self.owner:
+            info.append(': '.join(('owner', self.owner)))
+        info.append(': '.join(('state', self.state)))
+        info.append('---files---')
+        for target in sorted(self.entries):
+            meta = self.entries[target]
+            info.append('\t'.join((target,
+                str(meta.timestamp) if meta.timestamp else '',
+                asstr(meta.checksum) if meta.checksum else '')))
+        return '\n'.join(info)
+
+
+def valid_target(target):
+    """
+    Tell whether a path can be listed in a manifest file.
+    """
+    return not any([ c in target for c in '\t\r\n' ])
+
+
+def parse_manifest(lines):
+    if isinstance(lines, Manifest):
+        return lines
+    if not isinstance(lines, (tuple, list)):
+        if os.path.isfile(lines):
+            with open(lines, 'r') as f:
+                lines = f.readlines()
+        else:
+            lines = lines.splitlines()
+    if not lines:
+        raise ValueError('empty manifest')
+    header, version = lines[0].rstrip().rsplit('%', 1)
+    if header != 'manifest':
+        raise ValueError("not a manifest: '{}'".format(header))
+    attrs = {}
+    files = []
+    list_files = False
+    for line in lines[1:]:
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        if list_files:
+            files.append(line.split('\t'))
+        elif line.startswith('---'):
+            list_files = True
+        else:
+            key, value = line.split(':', 1)
+            attrs[key] = value.strip()
+    manifest = Manifest(version=version, owner=attrs.get('owner'),
+            state=attrs.get('state', 'pending'))
+    for entry in files:
+        target, timestamp, checksum = (entry + ['', ''])[:3]
+        manifest.entries[target] = Metadata(version='1.0', pusher=manifest.owner,
+                target=target, timestamp=int(timestamp) if timestamp else None,
+                checksum=checksum if checksum else None)
+    return manifest
+
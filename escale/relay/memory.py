@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+In-process relay host, for benchmarks.
+
+*new in 0.7.14*
+"""
+
+
+from .relay import Relay
+from .usage import UsageTracker
+import os
+import time
+import threading
+
+
+# relay repositories, with addresses as keys; shared by the clients in the process
+_hosts = {}
+_hosts_lock = threading.RLock()
+
+
+class MemoryRelay(Relay):
+    """
+    Relay that keeps the files in memory.
+
+    The clients in a same process that have the same address share the same
+    relay repositories.
+
+    Every request can be slowed down by a fixed latency and a bandwidth limit,
+    so that remote relay hosts can be mimicked without a network.
+
+    Attributes:
+
+        latency (float): time in seconds added to every request.
+
+        bandwidth (float): transfer rate in bytes per second; unlimited if ``None``.
+
+    """
+
+    __protocol__ = ['memory']
+    __thread_safe__ = True
+    __native_unlink__ = True
+
+    def __init__(self, client, address, repository, latency=0, bandwidth=None,
+            **super_args):
+        Relay.__init__(self, client, address, repository, **super_args)
+        self.latency = float(latency or 0)
+        self.bandwidth = float(bandwidth) if bandwidth else None
+        self.usage = UsageTracker()
+
+    @property
+    def _files(self):
+        with _hosts_lock:
+            return _hosts.setdefault((self.address, self.repository), {})
+
+    def _wait(self, nbytes=0):
+        delay = self.latency
+        if self.bandwidth and nbytes:
+            delay += float(nbytes) / self.bandwidth
+        if 0 < delay:
+            time.sleep(delay)
+
+    def probe(self):
+        self._wait()
+        files = self._files
+        with _hosts_lock:
+            if files:
+                return (len(files), max([ mtime for _, mtime in files.values() ]))
+        return None
+
+    def _list(self, remote_dir='', recursive=True, stats=[]):
+        self._wait()
+        prefix = remote_dir + '/' if remote_dir else ''
+        with _hosts_lock:
+            entries = list(self._files.items())
+        ls = []
+        for path, (data, mtime) in entries:
+            if not path.startswith(prefix):
+                continue
+            if not recursive and '/' in path[len(prefix):]:
+                continue
+            if stats:
+                attrs = dict(name=path, size=len(data), mtime=mtime)
+                if isinstance(stats, bool):
+                    ls.append((path, len(data), mtime))
+                else:
+                    ls.append(tuple([ attrs[s] for s in ['name'] + list(stats) ]))
+            else:
+                ls.append(path)
+        return ls
+
+    def exists(self, remote_file, dirname=None):
+        if dirname:
+            remote_file = '/'.join((dirname, remote_file))
+        self._wait()
+        with _hosts_lock:
+            return remote_file in self._files
+
+    def size(self, remote_file):
+        self._wait()
+        with _hosts_lock:
+            try:
+                data, _ = self._files[remote_file]
+            except KeyError:
+                return None
+        return len(data)
+
+    def _push(self, local_file, remote_dest):
+        with open(local_file, 'rb') as f:
+            data = f.read()
+        self._wait(len(data))
+        files = self._files
+        with _hosts_lock:
+            files[remote_dest] = (data, time.time())
+        self.usage.update(remote_dest, len(data))
+
+    def _get(self, remote_file, local_file, makedirs=True):
+        with _hosts_lock:
+            try:
+                data, _ = self._files[remote_file]
+            except KeyError:
+                raise IOError("no such file: '{}'".format(remote_file))
+        self._wait(len(data))
+        if makedirs:
+            dirname = os.path.dirname(local_file)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        with open(local_file, 'wb') as f:
+            f.write(data)
+
+    def _pop(self, remote_file, local_file, makedirs=True, _unlink=True):
+        self._get(remote_file, local_file, makedirs)
+        if _unlink:
+            self.unlink(remote_file)
+
+    def unlink(self, remote_file):
+        self._wait()
+        files = self._files
+        with _hosts_lock:
+            try:
+                del files[remote_file]
+            except KeyError:
+                raise IOError("no such file: '{}'".format(remote_file))
+        self.usage.remove(remote_file)
+
+    def purge(self, remote_dir=''):
+        prefix = remote_dir + '/' if remote_dir else ''
+        files = self._files
+        with _hosts_lock:
+            for path in list(files):
+                if path.startswith(prefix):
+                    del files[path]
+        self.usage.reset()
+
+
+def clear_hosts(address=None):
+    """
+    Forget the relay repositories of a given address, or all of them.
+    """
+    with _hosts_lock:
+        for key in list(_hosts):
+            if address is None or key[0] == address:
+                del _hosts[key]
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Resumable transfers of large files.
+
+Large files are transferred in parts of fixed size. The checksum of each part
+is recorded in a local file as soon as the part has been transferred, so that
+an interrupted transfer resumes from the last good part instead of from zero,
+either on reconnection or at the next synchronization cycle.
+
+Partially downloaded files are kept in the same directory as the records
+(by default in the cache directory of the client) and are moved to their
+destination once complete. On resuming a download, the parts already received
+are checked against the recorded checksums. On resuming an upload, the parts
+of the local file are checked the same way and the size of the partial remote
+copy tells which parts actually reached the relay host.
+
+Encrypted files are re-encrypted at each attempt and their uploads restart
+from zero.
+
+*new in 0.7.14*
+"""
+
+
+from escale.base.essential import *
+import os
+import json
+import shutil
+import hashlib
+
+
+part_store_prefix = 'pt'
+
+default_part_size = 8388608 # 8 MiB
+
+# files with fewer parts are transferred at once
+default_min_parts = 4
+
+
+class PartStore(object):
+    """
+    Directory of the progress records and partially downloaded files.
+
+    Attributes:
+
+        directory (str): path to the directory; created on demand.
+
+        part_size (int): size of the parts in bytes.
+
+        min_size (int): files of this size or smaller are transferred at once.
+
+    """
+    __slots__ = ['directory', 'part_size', 'min_size']
+
+    def __init__(self, directory, part_size=None, min_size=None):
+        self.directory = directory
+        self.part_size = int(part_size or default_part_size)
+        if min_size is None:
+            min_size = default_min_parts * self.part_size
+        self.min_size = min_size
+
+    def _transfer(self, direction, relay, remote_file, size, identity):
+        if size is None or size <= self.min_size:
+            return None
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        key = '\n'.join((direction, asstr(relay.address or ''),
+            asstr(relay.repository or ''), asstr(remote_file)))
+        key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return PartialTransfer(os.path.join(self.directory, key), size,
+                self.part_size, identity)
+
+    def upload(self, relay, remote_file, local_file):
+        """
+        Progress of the upload of a local file.
+
+        Returns:
+
+            PartialTransfer: progress, or ``None`` if the file is too small
+            to be uploaded in parts.
+        """
+        st = os.stat(local_file)
+        return self._transfer('push', relay, remote_file, st.st_size,
+                [st.st_size, st.st_mtime])
+
+    def download(self, relay, remote_file, size, identity=None):
+        """
+        Progress of the download of a remote file.
+
+        Arguments:
+
+            relay (escale.relay.AbstractRelay): relay.
+
+            remote_file (str): path of the remote file.
+
+            size (int): size of the remote file.
+
+            identity (list): JSON-serializable attributes of the remote file
+                (e.g. ETag, modification time), so that a partial download
+                is not resumed if the remote file changed in the meantime.
+
+        Returns:
+
+            PartialTransfer: progress, or ``None`` if the file is too small
+            to be downloaded in parts.
+        """
+        return self._transfer('get', relay, remote_file, size,
+                [size] + list(identity or []))
+
+
+class PartialTransfer(object):
+    """
+    Progress of the transfer of a large file.
+
+    Attributes:
+
+        record_file (str): path to the progress record.
+
+        data_file (str): path to the partially downloaded file.
+
+        size (int): total size in bytes.
+
+        part_size (int): size of the parts in bytes.
+
+        identity (list): attributes of the transferred file; the record is
+            discarded if they differ.
+
+        checksums (list of str): MD5 checksums of the transferred parts.
+
+    """
+    __slots__ = ['record_file', 'data_file', 'size', 'part_size', 'identity',
+            'checksums', '_hash', '_position', '_done']
+
+    def __init__(self, path, size, part_size, identity):
+        self.record_file = path + '.json'
+        self.data_file = path + '.part'
+        self.size = size
+        self.part_size = part_size
+        self.identity = identity
+        self.checksums = []
+        try:
+            with open(self.record_file, 'r') as f:
+                record = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+        else:
+            if record.get('size') == size and record.get('part size') == part_size \
+                    and record.get('identity') == identity:
+                self.checksums = list(record.get('checksums', []))
+        self._hash = None
+        self._position = self.offset
+        self._done = {}
+
+    @property
+    def offset(self):
+        """
+        Number of bytes in the transferred parts.
+        """
+        return min(self.size, len(self.checksums) * self.part_size)
+
+    def verify(self, local_file):
+        """
+        Check the parts of a file against the recorded checksums and forget
+        the parts that differ and the following ones.
+
+        Returns:
+
+            int: offset of the first part to be transferred.
+        """
+        good = 0
+        if self.checksums:
+            try:
+                with open(local_file, 'rb') as f:
+                    for checksum in self.checksums:
+                        data = f.read(self.part_size)
+                        if not data or hashlib.md5(data).hexdigest() != checksum:
+                            break
+                        good += 1
+            except (IOError, OSError):
+                pass
+        return self.truncate(good * self.part_size)
+
+    def truncate(self, offset):
+        """
+        Forget the parts beyond `offset`, rounded down to a part boundary.
+
+        Returns:
+
+            int: new offset.
+        """
+        n = min(len(self.checksums), offset // self.part_size)
+        if n < len(self.checksums):
+            self.checksums = self.checksums[:n]
+            self.save()
+        self._hash = None
+        self._position = self.offset
+        self._done = {}
+        return self._position
+
+    def restart(self):
+        """
+        Forget all the parts.
+        """
+        self.truncate(0)
+
+    def feed(self, data):
+        """
+        Account for data transferred after the recorded parts.
+        """
+        while data:
+            if self._hash is None:
+                self._hash = hashlib.md5()
+            boundary = min(self.size,
+                    (self._position // self.part_size + 1) * self.part_size)
+            chunk, data = data[:boundary - self._position], data[boundary - self._position:]
+            self._hash.update(chunk)
+            self._position += len(chunk)
+            if self._position == boundary:
+                self.checksums.append(self._hash.hexdigest())
+                self._hash = None
+                self.save()
+                if self._position == self.size:
+                    break
+
+    def complete_part(self, index, checksum):
+        """
+        Record a part transferred out of order (e.g. with concurrent requests).
+
+        The parts are recorded only once all the preceding parts are.
+        """
+        self._done[index] = checksum
+        n = len(self.checksums)
+        if n in self._done:
+            while n in self._done:
+                self.checksums.append(self._done.pop(n))
+                n += 1
+            self.save()
+        self._position = self.offset
+
+    @property
+    def parts(self):
+        """
+        Total number of parts.
+        """
+        return (self.size + self.part_size - 1) // self.part_size
+
+    @property
+    def complete(self):
+        return self.offset == self.size
+
+    def save(self):
+        record = {'size': self.size, 'part size': self.part_size,
+                'identity': self.identity, 'checksums': self.checksums}
+        with open(self.record_file, 'w') as f:
+            json.dump(record, f)
+
+    def discard(self):
+        """
+        Delete the progress record and partially downloaded file.
+        """
+        for path in (self.record_file, self.data_file):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+class PartReader(object):
+    """
+    File opened for upload, that feeds a :class:`PartialTransfer`.
+    """
+    __slots__ = ['file', 'transfer']
+
+    def __init__(self, f, transfer):
+        self.file = f
+        self.transfer = transfer
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.transfer.feed(data)
+        return data
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, offset):
+        """
+        Move back to `offset`, rounded down to a part boundary.
+
+        Returns:
+
+            int: actual offset.
+        """
+        offset = self.transfer.truncate(offset)
+        self.file.seek(offset)
+        return offset
+
+
+class PartWriter(object):
+    """
+    File opened for download, that feeds a :class:`PartialTransfer`.
+
+    The data are flushed before each part is recorded.
+    """
+    __slots__ = ['file', 'transfer']
+
+    def __init__(self, f, transfer):
+        self.file = f
+        self.transfer = transfer
+
+    def write(self, data):
+        self.file.write(data)
+        transfer = self.transfer
+        position = self.file.tell()
+        if transfer.offset + transfer.part_size <= position or transfer.size <= position:
+            # a part is about to be recorded
+            self.file.flush()
+        transfer.feed(data)
+
+    def tell(self):
+        return self.file.tell()
+
+    def restart(self):
+        """
+        Discard the data received so far, e.g. if the server ignored the
+        requested range.
+        """
+        self.file.seek(0)
+        self.file.truncate()
+        self.transfer.restart()
+
+
+def resume_upload(transfer, send, local_file, remote_size=None):
+    """
+    Upload a file from the last part that reached the relay host.
+
+    Arguments:
+
+        transfer (PartialTransfer): progress of the upload.
+
+        send (callable): takes a :class:`PartReader` positioned at an offset
+            and the offset, and uploads the rest of the file.
+
+        local_file (str): path to the local file.
+
+        remote_size (int): size of the partial remote copy, if any;
+            the upload restarts from zero if ``None``.
+
+    Returns:
+
+        int: offset the upload resumed from.
+    """
+    offset = transfer.verify(local_file)
+    if offset:
+        if remote_size:
+            offset = transfer.truncate(min(offset, remote_size))
+        else:
+            offset = transfer.truncate(0)
+    with open(local_file, 'rb') as f:
+        f.seek(offset)
+        send(PartReader(f, transfer), offset)
+    transfer.discard()
+    return offset
+
+
+def resume_download(transfer, fetch, local_file):
+    """
+    Download a file from the last good part received, into the data file
+    of the transfer, and move the file to its destination once complete.
+
+    Arguments:
+
+        transfer (PartialTransfer): progress of the download.
+
+        fetch (callable): takes a :class:`PartWriter` positioned at an offset
+            and the offset, and writes the rest of the remote file, either
+            sequentially or in place with :meth:`PartialTransfer.complete_part`
+            for each part.
+
+        local_file (str): destination.
+
+    Returns:
+
+        int: offset the download resumed from.
+    """
+    partial = transfer.data_file
+    if os.path.isfile(partial):
+        offset = transfer.verify(partial)
+    else:
+        offset = transfer.truncate(0)
+    with open(partial, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        f.truncate()
+        if offset < transfer.size:
+            fetch(PartWriter(f, transfer), offset)
+        f.seek(0, 2)
+        received = f.tell()
+    if received != transfer.size or not transfer.complete:
+        # keep the parts received so far
+        raise IOError('incomplete download: {} bytes out of {}'.format(received,
+            transfer.size))
+    shutil.move(partial, local_file)
+    transfer.discard()
+    return offset
@@ -18,12 +18,15 @@
 import os
 import sys
 import time
-import calendar
 import tempfile
 import logging
+import shutil
+import threading
 
 from escale.base.essential import *
 from .info import *
+from .listing import Listing, epoch
+from .manifest import Manifest, parse_manifest, valid_target
 from escale.log import log_root
 from escale.base.exceptions import *
 
@@ -54,9 +57,16 @@ class AbstractRelay(Reporter):
 
         repository (str): path of the repository on the remote host.
 
+    The `__thread_safe__` class attribute tells whether the methods can be
+    called from several threads simultaneously.
+
+    *new in 0.7.14:* `__thread_safe__`, :meth:`probe` and :meth:`notifyChanges`
+
     """
     __slots__ = ['client', 'address', 'repository']
 
+    __thread_safe__ = False
+
     def __init__(self, client, address, repository, logger=None, ui_controller=None):
         Reporter.__init__(self, logger=logger, ui_controller=ui_controller)
         self.client = client
@@ -94,6 +104,30 @@ class AbstractRelay(Reporter):
         """
         raise NotImplementedError
 
+    def probe(self):
+        """
+        Cheaply tell whether the relay repository may have changed.
+
+        Returns:
+
+            any: comparable token that changes whenever files are added to or
+            removed from the relay repository, or ``None`` if probing is not
+            supported.
+
+        *new in 0.7.14*
+        """
+        return None
+
+    def notifyChanges(self):
+        """
+        Tell the other clients that the relay repository has been modified.
+
+        Called at the end of every synchronization cycle.
+
+        *new in 0.7.14*
+        """
+        pass
+
     def listReady(self, remote_dir='', recursive=True):
         """
         List the files on the remote host that are ready for download.
@@ -202,6 +236,23 @@ class AbstractRelay(Reporter):
         """
         raise NotImplementedError('abstract method')
 
+    def prefetchMetadata(self, remote_files, timestamp_format=None):
+        """
+        Download the meta information for several files at once, so that the subsequent
+        calls to :meth:`getMetadata` for these files are cheap.
+
+        The default implementation does nothing.
+
+        Arguments:
+
+            remote_files (list of str): paths to regular files.
+
+            timestamp_format (str): see :meth:`getMetadata`.
+
+        *new in 0.7.14*
+        """
+        pass
+
     def push(self, local_file, remote_dest, last_modified=None, checksum=None, blocking=True):
         """
         Upload a file to the remote host.
@@ -227,6 +278,29 @@ class AbstractRelay(Reporter):
         """
         raise NotImplementedError('abstract method')
 
+    def pushMany(self, files, blocking=True):
+        """
+        Upload several files to the remote host.
+
+        The default implementation calls :meth:`push` for each file.
+
+        Arguments:
+
+            files (list): (`local_file`, `remote_dest`, `last_modified`, `checksum`)
+                tuples; see also :meth:`push`.
+
+            blocking (bool): see :meth:`push`.
+
+        Returns:
+
+            list of bool: for each file, True if successful, False if failed.
+
+        *new in 0.7.14*
+        """
+        return [ self.push(local_file, remote_dest, last_modified=last_modified,
+                    checksum=checksum, blocking=blocking)
+                for local_file, remote_dest, last_modified, checksum in files ]
+
     def pop(self, remote_file, local_dest, placeholder=True, blocking=True, **kwargs):
         """
         Download a file from the remote host and unlinks remote copy if relevant.
@@ -331,6 +405,14 @@ class Relay(AbstractRelay):
     They can be referred to as special files, while transferred files
     are referred to as regular files.
 
+    In manifest mode, files are pushed in batches with :meth:`pushMany`.
+    A single pending manifest locks all the files in a batch and a single
+    complete manifest replaces their placeholders (see also
+    :class:`~escale.relay.manifest.Manifest`).
+    Manifests are read whether manifest mode is enabled or not.
+    The first puller of a file makes a regular placeholder from the
+    corresponding manifest entry.
+
     Any derivative class should implement:
 
     * :meth:`_list`
@@ -342,6 +424,9 @@ class Relay(AbstractRelay):
         * both :meth:`_get` and :meth:`_pop`
 
     * :meth:`delete`, necessary for tests
+    * :meth:`unlink`; the default implementation downloads the file before deleting it;
+      backends that delete files natively set the `__native_unlink__` class attribute
+      to ``True`` and may also override :meth:`unlink_many`
 
     Attributes:
 
@@ -365,21 +450,80 @@ class Relay(AbstractRelay):
 
         _message_suffix (str): suffix for message files.
 
-        placeholder_cache (dict): dictionnary of cached placeholders.
+        placeholder_cache (dict): dictionnary of cached placeholders, as
+            (placeholder modification time in seconds since the epoch,
+            :class:`~escale.relay.info.Metadata`)
+            pairs with regular files as keys; entries for deleted placeholders
+            are removed on full listings; see also
+            :class:`~escale.manager.cache.PlaceholderCache`.
+
+        listing_cache (escale.relay.listing.Listing): last listing of the entire
+            relay repository, set by :meth:`remoteListing`; modification times
+            are in seconds since the epoch, whatever the backend.
+
+        change_probe (bool or int): if not ``False``, :meth:`remoteListing` does
+            not crawl the relay repository again unless :meth:`probe` reports
+            a change, the relay repository has been modified by the client,
+            or the listing is older than `change_probe` seconds.
+
+        usage (escale.relay.usage.UsageTracker): space used in the relay
+            repository, if the backend keeps track of it; backends that set
+            this attribute should return sizes in :meth:`_list` and update it
+            on upload and deletion.
+
+        _generation_file (str): file overwritten by :meth:`notifyChanges`
+            whenever the client modified the relay repository.
+
+        manifest (int): maximum number of files per batch in manifest mode;
+            if ``0``, manifest mode is disabled.
+
+        manifest_compat (bool): in manifest mode, write the locks and placeholders
+            for the individual files as well, so that older clients can still
+            pull the files (default); older clients that find a local copy of
+            a file with no placeholder delete the file from the relay.
+
+        metadata_concurrency (int): maximum number of placeholders downloaded
+            simultaneously by :meth:`prefetchMetadata`, if the backend is thread-safe.
+
+        _manifest_prefix (str): prefix for manifest files; manifest files are
+            located at the root of the relay repository.
+
+        _manifests (dict): manifest file modification times and
+            :class:`~escale.relay.manifest.Manifest` objects, with manifest
+            filenames as keys.
+
+        part_store (escale.relay.parts.PartStore): progress records of the
+            transfers of large files, for the backends that can resume
+            interrupted transfers; transfers are not resumable if ``None``.
 
     *new in 0.5.1:* placeholder_cache
 
     *as of 0.7.6:* default lock_timeout is 3 days
 
+    *new in 0.7.14:* change_probe, _generation_file, usage, `__native_unlink__`,
+    manifest, manifest_compat, _manifest_prefix, _manifests, metadata_concurrency,
+    part_store
+
+    *changed in 0.7.14:* listing_cache is a :class:`~escale.relay.listing.Listing`
+    instead of a list
+
     """
     __slots__ = [ '_temporary_files',
         '_placeholder_prefix', '_placeholder_suffix',
         '_lock_prefix', '_lock_suffix', 'lock_timeout',
         '_message_hash', '_message_prefix', '_message_suffix',
-        'placeholder_cache', 'listing_cache']
+        'placeholder_cache', 'listing_cache',
+        'change_probe', '_generation_file', '_modifications',
+        '_listing_state', '_notified_modifications', 'usage',
+        'manifest', 'manifest_compat', '_manifest_prefix', '_manifests',
+        '_manifest_index', 'metadata_concurrency', 'part_store']
+
+    __native_unlink__ = False
+    _unlink_fallback_warned = False
 
     def __init__(self, client, address, repository, logger=None, ui_controller=None,
-            lock_timeout=True, timestamped_messages=False, **ignored):
+            lock_timeout=True, timestamped_messages=False, change_probe=False,
+            manifest=False, manifest_compat=True, metadata_concurrency=8, **ignored):
         AbstractRelay.__init__(self, client, address, repository,
                 logger=logger, ui_controller=ui_controller)
         if self.logger is None:
@@ -387,6 +531,12 @@ class Relay(AbstractRelay):
                 self.logger = logging.getLogger(log_root).getChild(client)
             else:
                 self.logger = logging.getLogger(log_root).getChild(address)
+        # report the fallback implementation of `unlink` once per backend class
+        cls = type(self)
+        if not (cls.__native_unlink__ or cls.__dict__.get('_unlink_fallback_warned')):
+            cls._unlink_fallback_warned = True
+            self.logger.warning("%s relays do not implement native deletion; files are downloaded before they are deleted",
+                    cls.__name__)
         self._temporary_files = []
         self._placeholder_prefix = '.'
         self._placeholder_suffix = '.placeholder'
@@ -406,6 +556,23 @@ class Relay(AbstractRelay):
             self._message_hash = None
         self.placeholder_cache = {}
         self.listing_cache = None
+        if isinstance(change_probe, bool) and change_probe:
+            change_probe = 900 # 15 minutes
+        self.change_probe = change_probe
+        self._generation_file = '.escale.generation'
+        self._modifications = 0
+        self._notified_modifications = 0
+        self._listing_state = None
+        self.usage = None
+        if isinstance(manifest, bool):
+            manifest = 100 if manifest else 0
+        self.manifest = manifest
+        self.manifest_compat = manifest_compat
+        self._manifest_prefix = '.escale.manifest.'
+        self._manifests = {}
+        self._manifest_index = None
+        self.metadata_concurrency = metadata_concurrency
+        self.part_store = None
 
 
     def newTemporaryFile(self):
@@ -569,6 +736,123 @@ class Relay(AbstractRelay):
         return with_path(path, self._fromSpecial)
 
 
+    def isManifest(self, path):
+        return '/' not in path and path.startswith(self._manifest_prefix)
+
+    def _refreshManifests(self, ls):
+        """
+        Read the new manifests in a listing of the root of the relay repository.
+
+        Manifest files are immutable and are downloaded only once.
+        """
+        manifests = {}
+        for file, mtime in ls:
+            if not self.isManifest(file):
+                continue
+            mtime = epoch(mtime)
+            try:
+                _, manifest = self._manifests[file]
+            except KeyError:
+                local_file = self.newTemporaryFile()
+                try:
+                    self._get(file, local_file)
+                    manifest = parse_manifest(local_file)
+                except ExpressInterrupt:
+                    raise
+                except Exception as e:
+                    # deleted in the meantime?
+                    self.logger.debug("cannot read manifest '%s': %s", file, e)
+                    continue
+                finally:
+                    self.delTemporaryFile(local_file)
+            manifests[file] = (mtime, manifest)
+        self._manifests = manifests
+        self._manifest_index = None
+
+    def _manifestIndex(self):
+        """
+        Returns:
+
+            (dict, dict): last complete manifest entry as a (manifest modification time,
+            :class:`~escale.relay.info.Metadata`, manifest filename) tuple and owner of
+            the pending manifest, with regular files as keys.
+        """
+        index = self._manifest_index
+        if index is None:
+            entries, pending = {}, {}
+            # manifests that have just been pushed have no known modification time yet
+            def order(item):
+                name, (mtime, _) = item
+                return (mtime is None, mtime or 0, name)
+            for name, (mtime, manifest) in sorted(self._manifests.items(), key=order):
+                if manifest.pending:
+                    for target in manifest.entries:
+                        pending[target] = manifest.owner
+                else:
+                    for target, meta in manifest.entries.items():
+                        entries[target] = (mtime, meta, name)
+            index = self._manifest_index = (entries, pending)
+        return index
+
+    def _manifestMetadata(self, remote_file):
+        """
+        Meta information for a regular file, if found in a manifest that is more
+        recent than the placeholder for the file.
+        """
+        if not self._manifests:
+            return None
+        entries, _ = self._manifestIndex()
+        try:
+            mtime, meta, _ = entries[remote_file]
+        except KeyError:
+            return None
+        if mtime is not None:
+            ts, _ = self.placeholder_cache.get(remote_file, (None, None))
+            if ts and mtime <= ts:
+                return None
+        return meta
+
+    def _batchOwner(self, remote_file):
+        """
+        Owner of the pending manifest that locks a regular file, if any.
+        """
+        if not self._manifests:
+            return None
+        _, pending = self._manifestIndex()
+        return pending.get(remote_file)
+
+    def pruneManifests(self):
+        """
+        Delete the complete manifests of the client whose entries are all superseded
+        by more recent manifests or placeholders.
+
+        *new in 0.7.14*
+        """
+        if not self._manifests:
+            return
+        entries, _ = self._manifestIndex()
+        obsolete = []
+        for name, (mtime, manifest) in self._manifests.items():
+            if manifest.pending or manifest.owner != self.client or mtime is None:
+                continue
+            if all([ entries[target][2] != name
+                        or self._manifestMetadata(target) is None
+                    for target in manifest.entries ]):
+                obsolete.append(name)
+        if obsolete:
+            self.logger.debug("deleting obsolete manifests: '%s'", "', '".join(obsolete))
+            self._modifications += 1
+            try:
+                self.unlink_many(obsolete)
+            except ExpressInterrupt:
+                raise
+            except Exception as e:
+                self.logger.debug("%s", e)
+            for name in obsolete:
+                del self._manifests[name]
+            self._manifest_index = None
+
+
     def open(self):
         pass
 
@@ -576,8 +860,12 @@ class Relay(AbstractRelay):
         pass
 
     def storageSpace(self):
-        # TODO: default implementation with `size`
-        return (None, None)
+        if self.usage is None:
+            # TODO: default implementation with `size`
+            return (None, None)
+        if self.usage.expired():
+            self.usage.recount(self._list('', recursive=True, stats=('size',)))
+        return (self.usage.used(), None)
 
     def _list(self, remote_dir='', recursive=True, stats=[]):
         """
@@ -590,7 +878,8 @@ class Relay(AbstractRelay):
 
             recursive (bool): if ``True``, list files in subdirectories as well.
 
-            stats (list): can be `[ 'mtime' ]`.
+            stats (list): can be `[ 'mtime' ]`; relays with a `usage` tracker
+                also admit ``'size'``, in any order.
 
         Returns:
 
@@ -600,7 +889,78 @@ class Relay(AbstractRelay):
         raise NotImplementedError('abstract method')
 
     def remoteListing(self):
-        self.listing_cache = list(self._list('', recursive=True, stats=('mtime',)))
+        state = None
+        if self.change_probe:
+            state = self.probe()
+            if state is not None and self.listing_cache is not None \
+                    and self._listing_state is not None:
+                previous_state, modifications, listing_time = self._listing_state
+                if state == previous_state and modifications == self._modifications \
+                        and time.time() - listing_time < self.change_probe:
+                    # nothing changed; keep the cached listing
+                    return
+        listing_time = time.time()
+        if self.usage is None:
+            self.listing_cache = Listing(self,
+                    self._list('', recursive=True, stats=('mtime',)))
+        else:
+            # the file sizes come for free
+            sizes = []
+            def entries():
+                for file, mtime, size in self._list('', recursive=True, stats=('mtime', 'size')):
+                    sizes.append((file, size))
+                    yield file, mtime
+            self.listing_cache = Listing(self, entries())
+            self.usage.recount(sizes)
+        if state is None:
+            self._listing_state = None
+        else:
+            self._listing_state = (state, self._modifications, listing_time)
+        if self.placeholder_cache:
+            # forget about deleted placeholders
+            placeholders = self.listing_cache.placeholders
+            for regular_file in [ f for f in self.placeholder_cache if f not in placeholders ]:
+                del self.placeholder_cache[regular_file]
+        self._refreshManifests(self.listing_cache.others.items())
+
+    def _listing(self, remote_dir='', recursive=True):
+        """
+        :class:`~escale.relay.listing.Listing` of `remote_dir`, or the last listing of
+        the entire repository if `remote_dir` is not defined and :meth:`remoteListing`
+        has been called.
+        """
+        if remote_dir or (self.listing_cache is None):
+            return Listing(self, self._list(remote_dir, recursive=recursive, stats=('mtime',)))
+        ls = self.listing_cache
+        if not isinstance(ls, Listing):
+            ls = self.listing_cache = Listing(self, ls)
+        return ls
+
+    def _cachePlaceholders(self, ls):
+        """
+        Record the modification times of the listed placeholders in the placeholder cache.
+
+        The cached meta information is invalidated for the modified placeholders.
+        """
+        for regular_file, mtime in ls.placeholders.items():
+            if not mtime:
+                continue
+            try:
+                previous_mtime, meta = self.placeholder_cache[regular_file]
+                if previous_mtime < mtime:
+                    meta = None
+            except KeyError:
+                meta = None
+            self.placeholder_cache[regular_file] = (mtime, meta)
+
+    def notifyChanges(self):
+        """
+        Overwrite the generation file if the relay repository has been modified
+        and `change_probe` is enabled.
+        """
+        if self.change_probe and self._modifications != self._notified_modifications:
+            self.touch(self._generation_file, '{} {}'.format(self.client, time.time()))
+        self._notified_modifications = self._modifications
 
     def listReady(self, remote_dir='', recursive=True):
         """
@@ -608,35 +968,14 @@ class Relay(AbstractRelay):
 
         It caches last modification times of placeholders for future `getMetadata` calls.
         """
-        if remote_dir or (self.listing_cache is None):
-            ls = self._list(remote_dir, recursive=recursive, stats=('mtime',))
-        else:
-            ls = self.listing_cache
-        if not ls:
-            return []
-        lock_files = []
-        regular_files = []
-        for file, mtime in ls:
-            filedir, filename = os.path.split(file)
-            if self._isLock(filename):
-                lock_files.append(file)
-            elif self._isPlaceholder(filename):
-                if mtime:
-                    filename = self._fromPlaceholder(filename)
-                    regular_file = '/'.join((filedir, filename)) if filedir else filename
-                    try:
-                        previous_mtime, meta = self.placeholder_cache[regular_file]
-                        if previous_mtime < mtime:
-                            meta = None
-                    except KeyError:
-                        meta = None
-                    self.placeholder_cache[regular_file] = (mtime, meta)
-            elif not filename.startswith('.'):#self._isMessage(filename):
-                lock_file = join(filedir, self._lock(filename))
-                regular_files.append((file, lock_file))
-        ready = [ regular_file
-                for regular_file, lock_file in regular_files
-                if lock_file not in lock_files ]
+        ls = self._listing(remote_dir, recursive)
+        self._cachePlaceholders(ls)
+        ready = [ regular_file for regular_file in ls.regular
+                if regular_file not in ls.locks ]
+        if self._manifests:
+            # files locked by a pending manifest
+            ready = [ regular_file for regular_file in ready
+                    if not self._batchOwner(regular_file) ]
         return ready
 
     def listCorrupted(self, remote_dir='', recursive=True):
@@ -645,66 +984,42 @@ class Relay(AbstractRelay):
         """
         if not (self.client or self.lock_timeout):
             return []
-        if remote_dir or (self.listing_cache is None):
-            ls = self._list(remote_dir, recursive=recursive, stats=['mtime'])
-        else:
-            ls = self.listing_cache
+        ls = self._listing(remote_dir, recursive)
         locks = []
-        for file, mtime in ls:
-            if self.isLock(file):
-                lock = self.getLockInfo(join(remote_dir, self.fromLock(file)))
-                if lock.owner:
-                    if lock.owner == self.client:
-                        locks.append(lock)
-                elif mtime and self.lock_timeout:
-                    if isinstance(mtime, time.struct_time):
-                        # for backward compatibility
-                        mtime = calendar.timegm(mtime)
-                    if self.lock_timeout < time.time() - mtime:
-                        locks.append(lock)
+        for regular_file, mtime in ls.locks.items():
+            lock = self.getLockInfo(join(remote_dir, regular_file))
+            if lock.owner:
+                if lock.owner == self.client:
+                    locks.append(lock)
+            elif mtime and self.lock_timeout:
+                if self.lock_timeout < time.time() - mtime:
+                    locks.append(lock)
+        if not remote_dir:
+            # pending manifests left behind by the client
+            for name, (_, manifest) in self._manifests.items():
+                if manifest.pending and manifest.owner == self.client:
+                    locks.append(LockInfo(owner=self.client, target=name, mode='w'))
         return locks
 
     def listTransferred(self, remote_dir='', end2end=True, recursive=True):
         """
         The default implementation manipulates placeholders and locks as individual files.
         """
-        if remote_dir or (self.listing_cache is None):
-            ls = self._list(remote_dir, recursive=recursive, stats=('mtime',))
-        else:
-            ls = self.listing_cache
-        if not ls:
-            return []
-        regular_files = []
-        placeholders = []
-        others = []
-        for file, mtime in ls:
-            filedir, filename = os.path.split(file)
-            if self._isPlaceholder(filename):
-                filename = self._fromPlaceholder(filename)
-                regular_file = '/'.join((filedir, filename)) if filedir else filename
-                placeholders.append(regular_file)
-                if mtime:
-                    try:
-                        previous_mtime, meta = self.placeholder_cache[regular_file]
-                        if previous_mtime < mtime:
-                            meta = None
-                    except KeyError:
-                        meta = None
-                    self.placeholder_cache[regular_file] = (mtime, meta)
+        ls = self._listing(remote_dir, recursive)
+        self._cachePlaceholders(ls)
+        placeholders = list(ls.placeholders)
+        if self._manifests:
+            entries, _ = self._manifestIndex()
+            if remote_dir:
+                prefix = remote_dir.rstrip('/') + '/'
+                manifested = [ f for f in entries if f.startswith(prefix) ]
             else:
-                others.append(file)
-        ls = others
+                manifested = list(entries)
+            placeholders = list(set(placeholders).union(manifested))
         if end2end:
             return placeholders
         else:
-            locks = []
-            others = []
-            for file in ls:
-                if self.isLock(file):
-                    locks.append(self.fromLock(file))
-                elif not file.startswith('.'):
-                    others.append(file)
-            return others + placeholders + locks
+            return list(ls.regular) + placeholders + list(ls.locks)
 
     def size(self, remote_file):
         """
@@ -756,6 +1071,9 @@ class Relay(AbstractRelay):
 
         This implementation relies on `_pop`.
         As a consequence `_pop` should raise an error on trying to get a missing file.
+
+        Every file is downloaded before it is deleted; backends should override this method
+        (see also `__native_unlink__`).
         """
         #trash = self.newTemporaryFile()
         fd, trash = tempfile.mkstemp()
@@ -770,6 +1088,30 @@ class Relay(AbstractRelay):
             os.unlink(trash)
         #self.delTemporaryFile(trash)
 
+    def unlink_many(self, remote_files):
+        """
+        Delete several files.
+
+        An error does not prevent the other files from being deleted; the first error is
+        raised afterwards.
+
+        Backends may override this method so that the files are deleted in fewer requests.
+
+        *new in 0.7.14*
+        """
+        error = None
+        for remote_file in remote_files:
+            try:
+                self.unlink(remote_file)
+            except ExpressInterrupt:
+                raise
+            except Exception as e:
+                self.logger.debug("cannot delete file '%s': %s", remote_file, e)
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
     def hasPlaceholder(self, remote_file):
         """
         Checks for placeholder presence.
@@ -832,7 +1174,23 @@ class Relay(AbstractRelay):
     def getMetadata(self, remote_file, output_file=None, timestamp_format=None):
         """
         This method treats placeholders as files.
+
+        *changed in 0.7.14:* manifests are looked up first; placeholders found in
+        both the last listing and the cache are not looked up again
         """
+        meta = self._manifestMetadata(remote_file)
+        if meta is not None:
+            if output_file:
+                if output_file is True:
+                    output_file = self.newTemporaryFile()
+                with open(output_file, 'w') as f:
+                    f.write(repr(meta))
+                meta = output_file
+            return meta
+        if not output_file:
+            meta = self._cachedMetadata(remote_file)
+            if meta is not None:
+                return meta
         if self.hasPlaceholder(remote_file):
             ts, meta = self.placeholder_cache.get(remote_file, (None, None))
             if output_file is True or meta is None:
@@ -865,6 +1223,110 @@ class Relay(AbstractRelay):
                     pass
             return None
 
+    def _cachedMetadata(self, remote_file):
+        """
+        Meta information for placeholders found in the cache, if the cache is
+        consistent with the last listing.
+        """
+        if self.listing_cache is None:
+            return None
+        # the full listings clear the cache from the deleted placeholders
+        _, meta = self.placeholder_cache.get(remote_file, (None, None))
+        return meta
+
+    def prefetchMetadata(self, remote_files, timestamp_format=None):
+        """
+        Download the listed placeholders that are not cached yet, with :meth:`_getMany`,
+        and fill in the placeholder cache.
+
+        Only the placeholders found by :meth:`listReady` or :meth:`listTransferred`
+        are considered.
+        """
+        missing = []
+        for remote_file in remote_files:
+            mtime, meta = self.placeholder_cache.get(remote_file, (None, None))
+            if mtime and meta is None and self._manifestMetadata(remote_file) is None:
+                missing.append(remote_file)
+        if not missing:
+            return
+        local_dir = tempfile.mkdtemp()
+        try:
+            local_files = self._getMany([ self.placeholder(f) for f in missing ], local_dir)
+            for remote_file in missing:
+                local_placeholder = local_files.get(self.placeholder(remote_file))
+                if not local_placeholder:
+                    continue
+                try:
+                    meta = parse_metadata(local_placeholder, \
+                            target=remote_file, \
+                            log=self.logger.debug, \
+                            timestamp_format=timestamp_format)
+                except ExpressInterrupt:
+                    raise
+                except Exception as e:
+                    self.logger.debug("invalid placeholder for file '%s': %s", remote_file, e)
+                    continue
+                mtime, _ = self.placeholder_cache.get(remote_file, (None, None))
+                if mtime:
+                    self.placeholder_cache[remote_file] = (mtime, meta)
+            self.logger.debug('%s of %s placeholders prefetched', len(local_files), len(missing))
+        finally:
+            shutil.rmtree(local_dir, ignore_errors=True)
+
+    def _getMany(self, remote_files, local_dir):
+        """
+        Download several files into a local directory.
+
+        The default implementation calls :meth:`_get` from up to `metadata_concurrency`
+        threads if the backend is thread-safe, or for one file at a time otherwise.
+        Backends may override this method so that the files are downloaded in fewer
+        requests.
+
+        Files that cannot be downloaded are skipped.
+
+        Arguments:
+
+            remote_files (list of str): paths to files on the remote host.
+
+            local_dir (str): path to an existing local directory.
+
+        Returns:
+
+            dict: paths of the downloaded local files, with the remote files as keys.
+
+        *new in 0.7.14*
+        """
+        pending = list(enumerate(remote_files))
+        local_files = {}
+        lock = threading.Lock()
+        def download():
+            while True:
+                with lock:
+                    if not pending:
+                        break
+                    i, remote_file = pending.pop()
+                local_file = os.path.join(local_dir, str(i))
+                try:
+                    self._get(remote_file, local_file)
+                except ExpressInterrupt:
+                    raise
+                except Exception as e:
+                    self.logger.debug("cannot download '%s': %s", remote_file, e)
+                else:
+                    local_files[remote_file] = local_file
+        nthreads = 1
+        if self.__thread_safe__ and self.metadata_concurrency:
+            nthreads = min(self.metadata_concurrency, len(pending))
+        if nthreads <= 1:
+            download()
+        else:
+            threads = [ threading.Thread(target=download) for _ in range(nthreads) ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return local_files
+
     def updatePlaceholder(self, remote_file, last_modified=None, checksum=None):
         """
         Update a placeholder when the corresponding file is pushed.
@@ -883,6 +1345,7 @@ class Relay(AbstractRelay):
         """
         This method treats placeholders as files.
         """
+        self._modifications += 1
         try:
             self.unlink(self.placeholder(remote_file))
         except ExpressInterrupt:
@@ -898,7 +1361,18 @@ class Relay(AbstractRelay):
     def acquireLock(self, remote_file, mode=None, blocking=True):
         """
         This method treats locks as files.
+
+        *changed in 0.7.14:* files in pending manifests are considered locked
         """
+        owner = self._batchOwner(remote_file)
+        if owner and owner != self.client:
+            if not blocking:
+                return False
+            if blocking is True:
+                blocking = 60
+            while self._batchOwner(remote_file):
+                time.sleep(blocking)
+                self._refreshManifests(self._list('', recursive=False, stats=('mtime',)))
         existing_lock = self.getLockInfo(remote_file)
         if existing_lock:
             if existing_lock.owner == self.client:
@@ -913,6 +1387,7 @@ class Relay(AbstractRelay):
             else:
                 return False
         lock_info = LockInfo(owner=self.client, mode=mode)
+        self._modifications += 1
         self.touch(self.lock(remote_file), content=repr(lock_info))
         return True
 
@@ -920,6 +1395,7 @@ class Relay(AbstractRelay):
         """
         This method treats locks as files.
         """
+        self._modifications += 1
         self.unlink(self.lock(remote_file))
 
     def _push(self, local_file, remote_dest):
@@ -948,6 +1424,131 @@ class Relay(AbstractRelay):
         self.releaseLock(remote_dest)
         return True
 
+    def pushMany(self, files, blocking=True):
+        """
+        In manifest mode, a pending manifest locks all the files at once, the files
+        are uploaded and a complete manifest replaces their placeholders.
+
+        The files that cannot be described in a manifest, or that are locked by
+        other clients while `blocking` is ``True``, are pushed one at a time.
+
+        If the upload of a file fails, the pending manifest is left behind and
+        the whole batch is undone at the next sanity check.
+
+        *new in 0.7.14*
+        """
+        if not self.manifest:
+            return AbstractRelay.pushMany(self, files, blocking=blocking)
+        self.pruneManifests()
+        sent = [False] * len(files)
+        batch, single = {}, []
+        for i, (_, remote_dest, last_modified, checksum) in enumerate(files):
+            if (last_modified or checksum) and valid_target(remote_dest) \
+                    and remote_dest not in batch:
+                batch[remote_dest] = i
+            else:
+                single.append(i)
+        if batch:
+            stamp = int(time.time() * 1000)
+            name = '{}{}.{:x}'.format(self._manifest_prefix, self.client, stamp)
+            # batches can be pushed within the same millisecond
+            while name in self._manifests:
+                stamp += 1
+                name = '{}{}.{:x}'.format(self._manifest_prefix, self.client, stamp)
+            pending_name = name + '.pending'
+            manifest = Manifest(owner=self.client, state='pending')
+            for remote_dest, i in batch.items():
+                _, _, last_modified, checksum = files[i]
+                manifest.add(remote_dest, timestamp=last_modified, checksum=checksum)
+            self._modifications += 1
+            self.touch(pending_name, repr(manifest))
+            self._manifests[pending_name] = (None, manifest)
+            self._manifest_index = None
+            # locks may have been acquired since the last listing
+            for remote_dest in self._lockedByOthers(list(batch), pending_name):
+                del manifest.entries[remote_dest]
+                i = batch.pop(remote_dest)
+                if blocking:
+                    single.append(i)
+            for remote_dest, i in batch.items():
+                local_file, _, last_modified, checksum = files[i]
+                if self.manifest_compat:
+                    lock_info = LockInfo(owner=self.client, mode='w')
+                    self.touch(self.lock(remote_dest), content=repr(lock_info))
+                    if last_modified:
+                        self.updatePlaceholder(remote_dest,
+                                last_modified=last_modified, checksum=checksum)
+                self._push(local_file, remote_dest)
+            if batch:
+                if self.manifest_compat:
+                    self.unlink_many([ self.lock(remote_dest) for remote_dest in batch ])
+                complete = Manifest(owner=self.client, state='complete',
+                        entries=manifest.entries)
+                self.touch(name, repr(complete))
+                self._manifests[name] = (None, complete)
+            self.unlink(pending_name)
+            self._manifests.pop(pending_name, None)
+            self._manifest_index = None
+            for i in batch.values():
+                sent[i] = True
+        for i in single:
+            local_file, remote_dest, last_modified, checksum = files[i]
+            sent[i] = self.push(local_file, remote_dest, last_modified=last_modified,
+                    checksum=checksum, blocking=blocking)
+        return sent
+
+    def _lockedByOthers(self, remote_files, pending_name):
+        """
+        Find the files that are locked, either individually or by another pending
+        manifest than `pending_name`.
+
+        The directories that contain the files are listed again.
+        """
+        dirs = set([ os.path.dirname(remote_file) for remote_file in remote_files ])
+        dirs.add('')
+        lock_files = set()
+        for remote_dir in dirs:
+            try:
+                ls = list(self._list(remote_dir, recursive=False, stats=('mtime',)))
+            except ExpressInterrupt:
+                raise
+            except Exception as e:
+                # new directory?
+                self.logger.debug("cannot list '%s': %s", remote_dir, e)
+                continue
+            if not remote_dir:
+                self._refreshManifests(ls)
+            lock_files.update([ file for file, _ in ls if self.isLock(file) ])
+        batch_locked = set()
+        for name, (_, manifest) in self._manifests.items():
+            if manifest.pending and name != pending_name:
+                batch_locked.update(manifest.entries)
+        locked = [ remote_file for remote_file in remote_files
+                if remote_file in batch_locked or self.lock(remote_file) in lock_files ]
+        if locked:
+            self.logger.debug("locked files: '%s'", "', '".join(locked))
+        return locked
+
+    def _repairBatch(self, pending_name):
+        """
+        Undo an incomplete batch: delete the files and the pending manifest.
+        """
+        _, manifest = self._manifests.pop(pending_name)
+        self._manifest_index = None
+        self._modifications += 1
+        if pending_name[:-len('.pending')] not in self._manifests:
+            targets = list(manifest.entries)
+            if self.manifest_compat:
+                targets += [ self.placeholder(target) for target in manifest.entries ]
+            try:
+                self.unlink_many(targets)
+            except ExpressInterrupt:
+                raise
+            except Exception as e:
+                # some files may not have been uploaded
+                self.logger.debug("%s", e)
+        self.unlink(pending_name)
+
     def _pop(self, remote_file, local_dest, makedirs=True):
         """
         Download a file and delete it from the remote host.
@@ -1000,8 +1601,14 @@ class Relay(AbstractRelay):
             return False
         let = False
         if placeholder:
-            has_placeholder = self.hasPlaceholder(remote_file)
-            if has_placeholder and 1 < placeholder:
+            if self._manifestMetadata(remote_file) is not None:
+                has_placeholder = True
+                # no puller yet
+                let = 1 < placeholder
+            else:
+                has_placeholder = self._cachedMetadata(remote_file) is not None \
+                        or self.hasPlaceholder(remote_file)
+            if has_placeholder and 1 < placeholder and not let:
                 remote_placeholder = self.placeholder(remote_file)
                 local_placeholder = self.newTemporaryFile()
                 kwargs['local_placeholder'] = local_placeholder
@@ -1016,8 +1623,8 @@ class Relay(AbstractRelay):
         if placeholder:
             if has_placeholder:
                 self.markAsRead(remote_file, **kwargs)
-                if 1 < placeholder: # or similarly: if 'local_placeholder' in kwargs:
-                    self.delTemporaryFile(local_placeholder)
+                if 'local_placeholder' in kwargs:
+                    self.delTemporaryFile(kwargs['local_placeholder'])
             else: # older-than-old style placeholding mechanism
                 # could have warned before getting the file
                 self.logger.warning("missing meta information for file: '%s'", remote_file)
@@ -1031,7 +1638,9 @@ class Relay(AbstractRelay):
         if not self.acquireLock(remote_file, mode='r', blocking=blocking):
             return False
         self._get(remote_file, local_dest)
-        if placeholder and self.hasPlaceholder(remote_file):
+        if placeholder and (self._manifestMetadata(remote_file) is not None \
+                or self._cachedMetadata(remote_file) is not None \
+                or self.hasPlaceholder(remote_file)):
             self.markAsRead(remote_file, **kwargs)
         self.releaseLock(remote_file)
         return True
@@ -1041,12 +1650,20 @@ class Relay(AbstractRelay):
         This method treats placeholders as files.
 
         Compatible with both old-style and new-style placeholders.
+
+        *changed in 0.7.14:* if the meta information comes from a manifest,
+        a placeholder is created
         """
         remote_placeholder = self.placeholder(remote_file)
         get = not local_placeholder
         if get:
             local_placeholder = self.newTemporaryFile()
-            self._get(remote_placeholder, local_placeholder)
+            meta = self._manifestMetadata(remote_file)
+            if meta is None:
+                self._get(remote_placeholder, local_placeholder)
+            else:
+                with open(local_placeholder, 'w') as f:
+                    f.write(repr(meta))
             with open(local_placeholder, 'a') as f:
                 f.write('\n{}'.format(self.client))
         self._push(local_placeholder, remote_placeholder)
@@ -1072,6 +1689,9 @@ class Relay(AbstractRelay):
     def repair(self, lock, local_file, checksum=None):
         # TODO: use the checksum to resolve conflicting situations
         remote_file = lock.target
+        if self.isManifest(remote_file):
+            self._repairBatch(remote_file)
+            return
         if lock.mode == 'w':
             if not local_file.exists():
                 self.logger.error("could not find local file")# '%s'", local_file)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Bandwidth shaping of the transfers to and from the relay hosts.
+
+The transfers are charged to token buckets (:class:`~escale.base.timer.TokenBucket`)
+chunk by chunk, so that concurrent transfers that share a bucket (e.g. the
+clients of all the sections for the global ``bandwidth`` option) are interleaved
+and a large file does not delay the small ones for its whole duration.
+
+Backends that transfer files in chunks (e.g. WebDAV) are paced as the data
+flow; the other ones are paced before each upload and after each download.
+
+*new in 0.7.14*
+"""
+
+
+import os
+import threading
+
+from escale.base.timer import TokenBucket, consume_tokens
+
+
+class Shaper(object):
+    """
+    Bandwidth limits applied to the transfers of a relay.
+
+    Attributes:
+
+        upload (list of TokenBucket): buckets charged for the uploads.
+
+        download (list of TokenBucket): buckets charged for the downloads.
+
+        stats (escale.manager.stats.Stats): if defined, the time spent waiting
+            for the buckets is recorded as operations *throttle.upload* and
+            *throttle.download*.
+
+    """
+    __slots__ = ['upload', 'download', 'stats', '_local']
+
+    def __init__(self, upload=[], download=[]):
+        self.upload = [ bucket for bucket in upload if bucket is not None ]
+        self.download = [ bucket for bucket in download if bucket is not None ]
+        self.stats = None
+        self._local = threading.local()
+
+    def __bool__(self):
+        return bool(self.upload or self.download)
+
+    __nonzero__ = __bool__ # Python 2
+
+    def _consume(self, direction, buckets, nbytes):
+        if not (buckets and nbytes):
+            return
+        delay = consume_tokens(buckets, nbytes)
+        if self.stats is not None:
+            self.stats.record('throttle.' + direction, delay, nbytes)
+
+    def consumeUpload(self, nbytes):
+        """
+        Wait for `nbytes` bytes of upload bandwidth.
+        """
+        self._consume('upload', self.upload, nbytes)
+
+    def consumeDownload(self, nbytes):
+        """
+        Wait for `nbytes` bytes of download bandwidth.
+        """
+        self._consume('download', self.download, nbytes)
+
+    def shape(self, relay):
+        """
+        Apply the limits to the transfers of a relay instance.
+
+        Relays with `upload_throttle` and `download_throttle` attributes
+        (e.g. :class:`~escale.relay.webdav.client.Client`) call them chunk by chunk;
+        the :meth:`_push`, :meth:`_get` and :meth:`_pop` primitives of the other
+        relays are wrapped.
+        """
+        if hasattr(relay, 'upload_throttle') and hasattr(relay, 'download_throttle'):
+            if self.upload:
+                relay.upload_throttle = self.consumeUpload
+            if self.download:
+                relay.download_throttle = self.consumeDownload
+            return relay
+        if self.upload and hasattr(relay, '_push'):
+            push = relay._push
+            def _push(local_file, *args, **kwargs):
+                self.consumeUpload(_size(local_file))
+                return push(local_file, *args, **kwargs)
+            relay._push = _push
+        if self.download:
+            for primitive in ('_get', '_pop'):
+                if hasattr(relay, primitive):
+                    setattr(relay, primitive, self._charge_after(getattr(relay, primitive)))
+        return relay
+
+    def _charge_after(self, method):
+        local = self._local
+        def wrapper(remote_file, local_file, *args, **kwargs):
+            if getattr(local, 'downloading', False):
+                # e.g. `_get` implemented with `_pop`; charge once
+                return method(remote_file, local_file, *args, **kwargs)
+            local.downloading = True
+            try:
+                result = method(remote_file, local_file, *args, **kwargs)
+            finally:
+                local.downloading = False
+            self.consumeDownload(_size(local_file))
+            return result
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+
+def _size(local_file):
+    try:
+        return os.path.getsize(local_file)
+    except (TypeError, OSError):
+        return 0
+
+
+def make_shaper(buckets={}, upload_rate=None, download_rate=None):
+    """
+    Combine shared and per-client limits.
+
+    Arguments:
+
+        buckets (dict): shared token buckets, with keys *'total'*, *'upload'*
+            and *'download'* (see :func:`~escale.base.launcher.bandwidth_buckets`).
+
+        upload_rate (float): upload bandwidth of the client, in bytes per second.
+
+        download_rate (float): download bandwidth of the client, in bytes per second.
+
+    Returns:
+
+        Shaper: limits, or ``None`` if none apply.
+    """
+    buckets = buckets or {}
+    total = buckets.get('total')
+    shaper = Shaper(
+        upload=[total, buckets.get('upload'),
+            TokenBucket(upload_rate) if upload_rate else None],
+        download=[total, buckets.get('download'),
+            TokenBucket(download_rate) if download_rate else None])
+    return shaper if shaper else None
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+"""
+Latency and fault injection for load testing.
+
+Any relay backend can be slowed down and made to fail at random, so that the
+recovery mechanisms of the clients can be exercised without a remote host;
+for example with the ``file`` backend:
+
+.. code-block:: ini
+
+    [test]
+    protocol = file
+    simulate latency = 0.05
+    simulate errors = 0.01
+
+*new in 0.7.14*
+"""
+
+
+import os
+import time
+import errno
+import random
+import threading
+
+
+# default simulated errors: resource locked, service unavailable,
+# connection reset by peer and connection timed out
+default_error_codes = [423, 503, errno.ECONNRESET, errno.ETIMEDOUT]
+
+http_reasons = {408: 'Request Timeout', 423: 'Locked', 500: 'Internal Server Error',
+        502: 'Bad Gateway', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+# operations that modify the relay repository; faults may occur
+# after the modification, as if the response were lost
+write_operations = ['_push', 'unlink', 'unlink_many']
+
+# operations that transfer data; paced by the bandwidth limit
+transfer_operations = ['_push', '_get', '_pop']
+
+simulated_operations = ['probe', '_list', 'exists', 'size', '_get', '_pop', '_push',
+        'unlink', 'unlink_many']
+
+
+class SimulatedFault(EnvironmentError):
+    """
+    Injected error.
+
+    The error code is either a system error number (e.g. ``errno.ECONNRESET``)
+    or a HTTP status code (e.g. 503), also available as `actual_code` as in
+    :class:`~escale.relay.webdav.client.UnexpectedResponse`.
+    """
+    @property
+    def actual_code(self):
+        return self.errno
+
+    def __repr__(self):
+        return 'SimulatedFault({}, {})'.format(self.errno, self.strerror)
+
+
+def fault(code, operation=None):
+    """
+    Make a :class:`SimulatedFault` for an error code.
+    """
+    code = int(code)
+    if code in http_reasons:
+        reason = http_reasons[code]
+    elif 400 <= code:
+        reason = 'HTTP error'
+    else:
+        reason = os.strerror(code)
+    if operation:
+        reason = 'simulated {} on {}'.format(reason, operation)
+    else:
+        reason = 'simulated {}'.format(reason)
+    return SimulatedFault(code, reason)
+
+
+class Simulation(object):
+    """
+    Latency, bandwidth limit and random errors injected in the primitives of
+    a relay backend.
+
+    Attributes:
+
+        latency (float): time in seconds added to every request.
+
+        bandwidth (float): transfer rate in bytes per second; unlimited if ``None``.
+
+        error_rate (float): probability for a request to fail.
+
+        error_codes (list of int): errors drawn uniformly on failure;
+            see :func:`fault`.
+
+        listing_delay (float): time in seconds added to every listing request,
+            on top of `latency`.
+
+        stats (escale.manager.stats.Stats): if defined, the injected delays
+            and faults are recorded as operations with the *simulation.* prefix.
+
+    """
+    __slots__ = ['latency', 'bandwidth', 'error_rate', 'error_codes',
+            'listing_delay', 'stats', '_rng', '_lock']
+
+    def __init__(self, latency=0, bandwidth=None, error_rate=0, error_codes=None,
+            listing_delay=0, seed=None):
+        self.latency = float(latency or 0)
+        self.bandwidth = float(bandwidth) if bandwidth else None
+        self.error_rate = float(error_rate or 0)
+        if error_codes:
+            self.error_codes = [ int(code) for code in error_codes ]
+        else:
+            self.error_codes = list(default_error_codes)
+        self.listing_delay = float(listing_delay or 0)
+        self.stats = None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.latency or self.bandwidth or self.error_rate or self.listing_delay)
+
+    __nonzero__ = __bool__ # Python 2
+
+    def _draw(self):
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._rng.random() < self.error_rate:
+                return (self._rng.choice(self.error_codes), self._rng.random() < .5)
+        return None
+
+    def wait(self, operation, nbytes=0):
+        """
+        Sleep for the latency of a request, plus the transfer time of `nbytes`
+        bytes.
+
+        Returns:
+
+            float: time slept in seconds.
+        """
+        delay = self.latency
+        if operation == '_list':
+            delay += self.listing_delay
+        if self.bandwidth and nbytes:
+            delay += float(nbytes) / self.bandwidth
+        if 0 < delay:
+            time.sleep(delay)
+        return delay
+
+    def call(self, operation, func, *args, **kwargs):
+        """
+        Call a relay primitive with delays and faults.
+        """
+        t0 = time.time()
+        failure = self._draw()
+        error = None
+        try:
+            if failure and not (failure[1] and operation in write_operations):
+                self.wait(operation)
+                error = fault(failure[0], operation)
+                raise error
+            if operation == '_push':
+                self.wait(operation, _size(args[0]))
+            result = func(*args, **kwargs)
+            if operation in ('_get', '_pop'):
+                self.wait(operation, _size(args[1]))
+            elif operation != '_push':
+                self.wait(operation)
+            if failure:
+                # the request succeeded but the response is lost
+                error = fault(failure[0], operation)
+                raise error
+            return result
+        finally:
+            if self.stats is not None:
+                self.stats.record('simulation.' + operation, time.time() - t0,
+                        error=error is not None)
+
+    def inject(self, relay):
+        """
+        Wrap the primitives of a relay instance.
+
+        Internal calls of the relay (e.g. :meth:`~escale.relay.Relay.push`
+        calling :meth:`_push`) are also affected.
+        """
+        for operation in simulated_operations:
+            try:
+                method = getattr(relay, operation)
+            except AttributeError:
+                continue
+            setattr(relay, operation, self._wrap(operation, method))
+        relay.simulation = self
+        return relay
+
+    def _wrap(self, operation, method):
+        def wrapper(*args, **kwargs):
+            return self.call(operation, method, *args, **kwargs)
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+
+def _size(local_file):
+    try:
+        return os.path.getsize(local_file)
+    except (TypeError, OSError):
+        return 0
+
+
+def simulated(relay, **simulation):
+    """
+    Relay factory that injects delays and faults in the relays it makes.
+
+    Arguments:
+
+        relay (callable): relay class, e.g. :class:`~escale.relay.LocalMount`.
+
+        simulation (dict): keyword arguments to :class:`Simulation`.
+
+    Returns:
+
+        callable: relay factory with the same signature as `relay`.
+    """
+    def new(*args, **kwargs):
+        return Simulation(**simulation).inject(relay(*args, **kwargs))
+    new.__name__ = 'Simulated' + getattr(relay, '__name__', 'Relay')
+    new.__doc__ = relay.__doc__
+    new.__protocol__ = getattr(relay, '__protocol__', None)
+    return new
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Copyright © 2021, Institut Pasteur
+#   Contributor: François Laurent
+
+# This file is part of the Escale software available at
+# "https://github.com/francoislaurent/escale" and is distributed under
+# the terms of the CeCILL-C license as circulated at the following URL
+# "http://www.cecill.info/licenses.en.html".
+
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL-C license and that you accept its terms.
+
+
+import time
+import threading
+
+
+class UsageTracker(object):
+    """
+    Space used in a relay repository, maintained incrementally.
+
+    The file sizes are set from full listings of the relay repository
+    (:meth:`recount`) and updated on every upload or deletion by the client
+    (:meth:`update` and :meth:`remove`).
+    Uploads and deletions by the other clients are taken into account at the
+    next full listing.
+
+    Attributes:
+
+        max_age (int or float): maximum time in seconds between two full
+            listings; if ``None``, the sizes never expire.
+
+    *new in 0.7.14*
+    """
+    __slots__ = ['max_age', '_sizes', '_total', '_time', '_lock']
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self._sizes = None
+        self._total = 0
+        self._time = None
+        self._lock = threading.Lock()
+
+    def recount(self, files):
+        """
+        Reset the file sizes.
+
+        Arguments:
+
+            files (iterable): pairs of path and size in bytes, for all the
+                files in the relay repository.
+
+        Returns:
+
+            bool: ``False`` if a size is missing; the sizes are left unchanged.
+        """
+        sizes = {}
+        for path, size in files:
+            if size is None:
+                return False
+            sizes[path] = size
+        with self._lock:
+            self._sizes = sizes
+            self._total = sum(sizes.values())
+            self._time = time.time()
+        return True
+
+    def reset(self):
+        """
+        Forget the file sizes, so that the next call to :meth:`expired`
+        returns ``True``.
+        """
+        with self._lock:
+            self._sizes = None
+            self._total = 0
+            self._time = None
+
+    def expired(self):
+        """
+        Tell whether a full listing is due.
+        """
+        if self._sizes is None:
+            return True
+        return bool(self.max_age) and self.max_age < time.time() - self._time
+
+    def update(self, path, size):
+        """
+        Set the size of an uploaded file, in bytes.
+        """
+        with self._lock:
+            if self._sizes is not None:
+                self._total += size - self._sizes.get(path, 0)
+                self._sizes[path] = size
+
+    def remove(self, path):
+        """
+        Forget about a deleted file.
+        """
+        with self._lock:
+            if self._sizes is not None:
+                self._total -= self._sizes.pop(path, 0)
+
+    def size(self, path):
+        """
+        Size of a file in bytes, or ``None`` if unknown.
+        """
+        with self._lock:
+            if self._sizes is None:
+                return None
+            return self._sizes.get(path)
+
+    def used(self):
+        """
+        Used space in megabytes (MB), or ``None`` if unknown.
+        """
+        if self._sizes is None:
+            return None
+        return float(self._total) / 1048576
+
@@ -48,6 +48,65 @@ import time
 import logging
 import OpenSSL.SSL
 import socket
+import threading
+import hashlib
+try:
+    from queue import Queue, Empty
+except ImportError: # Python 2
+    from Queue import Queue, Empty
+
+
+class _ThrottledFile(object):
+    """
+    Read-only file that calls `throttle` with the size of each block read.
+
+    *new in 0.7.14*
+    """
+    __slots__ = ['file', 'throttle', '_size']
+
+    def __init__(self, f, throttle):
+        self.file = f
+        self.throttle = throttle
+        self._size = os.fstat(f.fileno()).st_size - f.tell()
+
+    def __len__(self):
+        # Content-Length
+        return self._size
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        if data:
+            self.throttle(len(data))
+        return data
+
+
+class _PartFile(object):
+    """
+    Read-only view of the next `length` bytes of a file, for ranged uploads.
+
+    *new in 0.7.14*
+    """
+    __slots__ = ['file', 'throttle', '_size', '_left']
+
+    def __init__(self, f, length, throttle=None):
+        self.file = f
+        self.throttle = throttle
+        self._size = self._left = length
+
+    def __len__(self):
+        # Content-Length
+        return self._size
+
+    def read(self, size=-1):
+        if size is None or size < 0 or self._left < size:
+            size = self._left
+        if size <= 0:
+            return b''
+        data = self.file.read(size)
+        self._left -= len(data)
+        if data and self.throttle is not None:
+            self.throttle(len(data))
+        return data
 
 
 class UnexpectedResponse(Exception):
@@ -139,9 +198,14 @@ def _emulate_infinity(ls):
 _str_env_error = re.compile(r"\((?P<code>[1-9][0-9][0-9]?), '(?P<name>E[A-Z]+)'\)")
 
 
+# sessions shared between clients in the same process, per server and credentials
+_shared_sessions = {}
+_shared_sessions_lock = threading.Lock()
+
+
 class Client(object):
     def __init__(self, baseurl, username=None, password=None,
-            certificate=None, verify_ssl=None, ssl_version=None):
+            certificate=None, verify_ssl=None, ssl_version=None, share_session=False):
         self.baseurl = asstr(baseurl)
         if not re.match('https?://[a-z]', baseurl):
             raise ValueError("wrong base url: '{}'", baseurl)
@@ -153,18 +217,39 @@ class Client(object):
             self.basepath = None
         else:
             self.baseurl = '/'.join(parts[:3]+[quote(parts[3])])
-        self.session = requests.session()
-        self.session.stream = True
-        if username and password:
-            self.session.auth = (username, password)
-        if certificate:
-            self.session.cert = certificate
-        if verify_ssl is not None:
-            self.session.verify = verify_ssl
-        if ssl_version:
-            self.session.mount('https://', make_https_adapter(parse_ssl_version(ssl_version))())
+        def make_session():
+            session = requests.session()
+            session.stream = True
+            if username and password:
+                session.auth = (username, password)
+            if certificate:
+                session.cert = certificate
+            if verify_ssl is not None:
+                session.verify = verify_ssl
+            if ssl_version:
+                session.mount('https://', make_https_adapter(parse_ssl_version(ssl_version))())
+            return session
+        if share_session:
+            # connection pools are shared per server and credentials
+            key = ('/'.join(parts[:3]), username, password,
+                    certificate, verify_ssl, ssl_version)
+            with _shared_sessions_lock:
+                try:
+                    self.session = _shared_sessions[key]
+                except KeyError:
+                    self.session = _shared_sessions[key] = make_session()
+        else:
+            self.session = make_session()
         self.infinity_depth = None
         self.download_chunk_size = 1048576
+        # bandwidth shaping (see escale.relay.shaping); called with the size of each chunk
+        self.upload_throttle = None
+        self.download_throttle = None
+        # support for ranged PUT requests (see `upload_part`); unknown until tried
+        self.ranged_put = None
+        # simultaneous ranged GET requests for large files (see `download_parts`)
+        self.download_segments = 1
+        self.ranged_get = None
         self.retry_on_errno = [110]
         self.max_retry = None
         self.timeouts = (6.05, 30)
@@ -291,21 +376,187 @@ class Client(object):
     def upload(self, local_path, remote_path):
         while True:
             with open(local_path, 'rb') as f:
+                if self.upload_throttle is not None:
+                    f = _ThrottledFile(f, self.upload_throttle)
                 r = self.send('PUT', remote_path, (200, 201, 204, 400), data=f, \
                     retry_on_status_codes=(302, 413, 503, 504))
             if r.status_code != 400:
                 # 400 Bad Request is Yandesk speciality
                 break
 
+    def upload_part(self, f, remote_path, start, length, total):
+        """
+        Upload the next `length` bytes of `f` at offset `start` of a remote file
+        of `total` bytes.
+
+        Parts other than the first one are sent with a ``Content-Range`` header,
+        which not all the servers support; see also :attr:`ranged_put`.
+
+        *new in 0.7.14*
+        """
+        headers = {}
+        if start:
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start,
+                    start + length - 1, total)
+        # the request cannot be sent again as the data are consumed
+        self.send('PUT', remote_path, (200, 201, 204),
+                data=_PartFile(f, length, self.upload_throttle),
+                headers=headers, retry_on_status_codes=())
+
+    def head(self, remote_path):
+        """
+        Response headers for a file, or ``None`` if the file does not exist.
+
+        *new in 0.7.14*
+        """
+        r = self.send('HEAD', remote_path, (200, 404))
+        if r.status_code == 404:
+            return None
+        return r.headers
+
     def download(self, remote_path, local_path):
         r = self.send('GET', remote_path, (200,), context=True)
         try:
             with open(local_path, 'wb') as f:
-                for chunk in r.iter_content(self.download_chunk_size):
-                    f.write(chunk)
+                self._receive(r, f)
         finally:
             r.close()
 
+    def download_range(self, remote_path, f, offset, validator=None, chunk_size=None):
+        """
+        Download a remote file from byte `offset` into `f`.
+
+        If the server ignores the requested range, or the remote file no longer
+        matches `validator` (ETag or last modification date), the whole file is
+        received instead and :meth:`restart` is called on `f` first
+        (see :class:`~escale.relay.parts.PartWriter`).
+
+        The data are written by chunks of `chunk_size` bytes, or
+        :attr:`download_chunk_size` by default.
+
+        Returns:
+
+            bool: ``True`` if the download resumed from `offset`.
+
+        *new in 0.7.14*
+        """
+        headers = {'Range': 'bytes={}-'.format(offset)}
+        if validator:
+            headers['If-Range'] = validator
+        r = self.send('GET', remote_path, (200, 206), context=True, headers=headers)
+        try:
+            resumed = r.status_code == 206
+            if not resumed:
+                f.restart()
+            self._receive(r, f, chunk_size)
+        finally:
+            r.close()
+        return resumed
+
+    def download_parts(self, remote_path, f, transfer, segments, validator=None,
+            chunk_size=None):
+        """
+        Download the missing parts of a remote file with up to `segments`
+        simultaneous ranged GET requests, and write them in place.
+
+        Arguments:
+
+            remote_path (str): path to the remote file.
+
+            f (file): destination file, open for writing in binary mode;
+                extended to the size of the remote file.
+
+            transfer (escale.relay.parts.PartialTransfer): progress of the
+                download; the parts beyond the recorded ones are downloaded
+                and recorded with
+                :meth:`~escale.relay.parts.PartialTransfer.complete_part`.
+
+            segments (int): maximum number of simultaneous requests.
+
+            validator (str): ETag or last modification date of the remote file;
+                see also :meth:`download_range`.
+
+            chunk_size (int): see :meth:`download_range`.
+
+        Returns:
+
+            bool: ``False`` if the server ignored the requested ranges.
+
+        *new in 0.7.14*
+        """
+        size, part_size = transfer.size, transfer.part_size
+        todo = Queue()
+        for index in range(transfer.offset // part_size, transfer.parts):
+            todo.put(index)
+        f.truncate(size)
+        f.flush()
+        fd = f.fileno()
+        lock = threading.Lock()
+        if hasattr(os, 'pwrite'):
+            def write(data, position):
+                while data:
+                    n = os.pwrite(fd, data, position)
+                    data, position = data[n:], position + n
+        else: # Python 2 and Windows
+            def write(data, position):
+                with lock:
+                    os.lseek(fd, position, os.SEEK_SET)
+                    while data:
+                        data = data[os.write(fd, data):]
+        errors, ignored = [], []
+        def download_part():
+            while not (errors or ignored):
+                try:
+                    index = todo.get_nowait()
+                except Empty:
+                    return
+                start = index * part_size
+                end = min(size, start + part_size)
+                headers = {'Range': 'bytes={}-{}'.format(start, end - 1)}
+                if validator:
+                    headers['If-Range'] = validator
+                try:
+                    r = self.send('GET', remote_path, (200, 206), context=True,
+                            headers=headers)
+                    try:
+                        if r.status_code != 206:
+                            ignored.append(index)
+                            return
+                        h, position = hashlib.md5(), start
+                        for chunk in r.iter_content(chunk_size or self.download_chunk_size):
+                            if end < position + len(chunk):
+                                raise IOError("too long part in '{}'".format(remote_path))
+                            if self.download_throttle is not None:
+                                self.download_throttle(len(chunk))
+                            write(chunk, position)
+                            h.update(chunk)
+                            position += len(chunk)
+                    finally:
+                        r.close()
+                    if position != end:
+                        raise IOError("incomplete part in '{}': {} bytes out of {}".format(
+                            remote_path, position - start, end - start))
+                    with lock:
+                        transfer.complete_part(index, h.hexdigest())
+                except Exception as e:
+                    errors.append(e)
+                    return
+        workers = [ threading.Thread(target=download_part)
+                for _ in range(min(segments, todo.qsize())) ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+        return not ignored
+
+    def _receive(self, response, f, chunk_size=None):
+        for chunk in response.iter_content(chunk_size or self.download_chunk_size):
+            if self.download_throttle is not None:
+                self.download_throttle(len(chunk))
+            f.write(chunk)
+
     @_emulate_infinity
     def ls(self, remote_path, recursive=False):
         if recursive:
@@ -341,6 +592,24 @@ class Client(object):
         return [ entry for entry in entries if entry.name and entry.name != '.'
                 and relpath(entry.name, remote_path) != '.' ]
 
+    def stat(self, remote_path):
+        """
+        ETag and last modification time of a file or collection, or ``None``
+        if the resource does not exist.
+        """
+        r = self.send('PROPFIND', remote_path, (207, 404),
+                headers={'Depth': '0'}, context=True)
+        try:
+            if r.status_code == 404:
+                return None
+            doctree = xml.fromstring(r.content)
+        finally:
+            r.close()
+        elem = doctree.find('{DAV:}response')
+        if elem is None:
+            return None
+        return (_prop(elem, 'getetag'), _prop(elem, 'getlastmodified'))
+
     def exists(self, remote_path):
         codes = (200, 301, 302, 404, 409, 423) # 302 Moved Temporarily
         response = self.send('HEAD', remote_path, codes)
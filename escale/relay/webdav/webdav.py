@@ -16,6 +16,8 @@ from escale.base.exceptions import *
 from escale.base.essential import *
 from escale.base.timer import *
 from ..relay import Relay
+from ..usage import UsageTracker
+from ..parts import resume_upload, resume_download
 from .client import *
 
 import os
@@ -56,14 +58,27 @@ class WebDAV(Relay, Client):
         retry_after (int): defines interval time between retries in seconds.
             Applies to connection failures (deprecated).
 
+        download_segments (int): maximum number of simultaneous ranged GET
+            requests per large file; requires :attr:`~escale.relay.Relay.part_store`.
+
+        ranged_put (bool): whether the server supports ranged PUT requests;
+            ``None`` until tried.
+
+        ranged_get (bool): whether the server supports ranged GET requests;
+            ``None`` until tried.
+
+    *new in 0.7.14:* `download_segments`, `ranged_put` and `ranged_get`
+
     """
 
     __protocol__ = ['webdav', 'http', 'https']
+    __thread_safe__ = True
+    __native_unlink__ = True
 
     def __init__(self, client, address, repository, username=None, password=None,
         protocol=None, certificate=None, certfile=None, keyfile=None, \
         ssl_version=None, verify_ssl=None, max_retry=None, retry_after=None, \
-        config={}, **super_args):
+        share_connections=False, download_segments=None, config={}, **super_args):
         Relay.__init__(self, client, address, repository, **super_args)
         if PYTHON_VERSION == 3: # deal with encoding issues with requests
             username = username.encode('utf-8').decode('unicode-escape')
@@ -100,7 +115,8 @@ class WebDAV(Relay, Client):
             self.logger.warning('`keyfile` requires `certfile` to be defined as well')
         # init webdav client
         Client.__init__(self, baseurl, username, password,
-                certificate, verify_ssl, ssl_version)
+                certificate, verify_ssl, ssl_version,
+                share_session=share_connections)
         # not implemented
         if max_retry is None:
             if 'max retries' in config:
@@ -109,8 +125,10 @@ class WebDAV(Relay, Client):
                 max_retry = 3
         self.max_retry = max_retry
         self.retry_after = retry_after
+        if download_segments:
+            self.download_segments = download_segments
         #
-        self._used_space = None
+        self.usage = UsageTracker()
         #
         self.quota_error = (32,)
 
@@ -125,11 +143,6 @@ class WebDAV(Relay, Client):
                         self.ui_controller.requestCredential(hostname=self.address)
             self.auth = (self.username, self.password)
 
-    def storageSpace(self):
-        if isinstance(self._used_space, int): # in B
-            self._used_space = float(self._used_space) / 1048576 # in MB
-        return (self._used_space, None)
-
     def exists(self, remote_file, dirname=None):
         if dirname:
             remote_file = join(dirname, remote_file)
@@ -151,23 +164,31 @@ class WebDAV(Relay, Client):
     def _list(self, remote_dir='', recursive=True, stats=[], storage_space=False):
         ls = self.ls(remote_dir, recursive)
         # exclude directories
-        files = [ (file.name, file.size, file.mtime)
-                for file in ls if file.contenttype ]
-        if files:
-            files, sizes, mtimes = zip(*files)
-            if not remote_dir or remote_dir == '/':
-                self._used_space = sum(sizes)
-            if stats:
-                files = [ files ]
+        files = ( file for file in ls if file.contenttype )
+        if not stats:
+            return ( file.name for file in files )
+        def entries():
+            for file in files:
+                entry = [ file.name ]
                 for m in stats:
                     if m == 'mtime':
-                        mtimes = [ time.strptime(t[5:], '%d %b %Y %H:%M:%S GMT') for t in mtimes ]
-                        files.append(mtimes)
+                        entry.append(time.strptime(file.mtime[5:], '%d %b %Y %H:%M:%S GMT'))
                     elif m == 'size':
-                        files.append(sizes)
-                files = zip(*files)
-        #print(('WebDAV._list: remote_dir, files', remote_dir, [ f[0] for f in files ]))
-        return files
+                        entry.append(file.size)
+                yield tuple(entry)
+        return entries()
+
+    def probe(self):
+        # the ETag of a collection changes with its content on most servers,
+        # but not always with the content of its sub-collections
+        try:
+            state = (Client.stat(self, ''), Client.stat(self, self._generation_file))
+        except UnexpectedResponse as e:
+            self.logger.debug("%s", e)
+            return None
+        if state == (None, None):
+            return None
+        return state
 
     def _wait_on_error(self, func, *args, **kwargs):
         error_codes = kwargs.pop('error_codes', [423]+timeout_error_codes)
@@ -198,12 +219,60 @@ class WebDAV(Relay, Client):
         if makedirs:
             remote_dir = os.path.dirname(remote_file)
             self.mkdirs(remote_dir)
+        transfer = None
+        if self.part_store is not None and self.ranged_put is not False:
+            transfer = self.part_store.upload(self, remote_file, local_file)
         try:
-            self.upload(local_file, remote_file)
+            if transfer is None:
+                self.upload(local_file, remote_file)
+            else:
+                self._pushParts(transfer, local_file, remote_file)
         except OSError as e:
             if e.args and e.args[0] in self.quota_error:
                 raise QuotaExceeded
             raise
+        self.usage.update(remote_file, os.path.getsize(local_file))
+
+    def _pushParts(self, transfer, local_file, remote_file):
+        """
+        Upload a large file with a PUT request per part, resuming from the parts
+        found on the server.
+
+        If the server does not support ranged PUT requests, the file is uploaded
+        at once and so will be the next files.
+
+        *new in 0.7.14*
+        """
+        remote_size = None
+        if transfer.offset:
+            headers = self.head(remote_file)
+            if headers is not None:
+                remote_size = int(headers.get('Content-Length') or 0)
+        def send(reader, offset):
+            if offset:
+                self.logger.debug("resuming upload of '%s' from byte %s", remote_file, offset)
+            start = offset
+            while start < transfer.size:
+                length = min(transfer.part_size, transfer.size - start)
+                self.upload_part(reader, remote_file, start, length, transfer.size)
+                if start and self.ranged_put is None:
+                    # check that the part was appended
+                    headers = self.head(remote_file)
+                    self.ranged_put = headers is not None and \
+                        int(headers.get('Content-Length') or 0) == start + length
+                    if not self.ranged_put:
+                        raise UnexpectedResponse('PUT', remote_file, 501, (200, 201, 204))
+                start += length
+        try:
+            resume_upload(transfer, send, local_file, remote_size)
+        except UnexpectedResponse as e:
+            if self.ranged_put or e.actual_code not in (400, 405, 411, 416, 501):
+                raise
+            self.ranged_put = False
+            self.logger.info("server at '%s' does not support ranged PUT requests; uploading files at once",
+                    self.address)
+            transfer.discard()
+            self.upload(local_file, remote_file)
 
     def _get(self, remote_file, local_file, makedirs=True):
         # local destination should be a file
@@ -212,7 +281,57 @@ class WebDAV(Relay, Client):
             local_dir = os.path.dirname(local_file)
             if not os.path.isdir(local_dir):
                 os.makedirs(local_dir)
-        self._wait_on_error(self.download, remote_file, local_file)
+        if self.part_store is None:
+            self._wait_on_error(self.download, remote_file, local_file)
+        else:
+            self._wait_on_error(self._getParts, remote_file, local_file)
+
+    def _getParts(self, remote_file, local_file):
+        """
+        Download a file; large files are received in parts, so that the download
+        can resume from the last good part after an interruption.
+
+        *new in 0.7.14*
+        """
+        r = self.send('GET', remote_file, (200,), context=True)
+        try:
+            headers = r.headers
+            size = headers.get('Content-Length')
+            if size and headers.get('Content-Encoding', 'identity') == 'identity':
+                transfer = self.part_store.download(self, remote_file, int(size),
+                        [headers.get('ETag'), headers.get('Last-Modified')])
+            else:
+                transfer = None
+            if transfer is None:
+                with open(local_file, 'wb') as f:
+                    self._receive(r, f)
+                return
+            # smaller chunks, so that fewer data are lost on interruption
+            chunk_size = min(self.download_chunk_size, transfer.part_size)
+            validator = headers.get('ETag') or headers.get('Last-Modified')
+            def fetch(writer, offset):
+                if offset:
+                    self.logger.debug("resuming download of '%s' from byte %s", remote_file, offset)
+                if 1 < self.download_segments and self.ranged_get is not False:
+                    r.close()
+                    if self.download_parts(remote_file, writer.file, transfer,
+                            self.download_segments, validator, chunk_size):
+                        self.ranged_get = True
+                        return
+                    self.ranged_get = False
+                    self.logger.info("server at '%s' does not support ranged GET requests; downloading files in a single stream",
+                            self.address)
+                    offset = transfer.truncate(0)
+                    writer.file.seek(offset)
+                    self.download_range(remote_file, writer, offset, validator, chunk_size)
+                elif offset:
+                    r.close()
+                    self.download_range(remote_file, writer, offset, validator, chunk_size)
+                else:
+                    self._receive(r, writer, chunk_size)
+            resume_download(transfer, fetch, local_file)
+        finally:
+            r.close()
 
     def unlink(self, remote_file):
         #print('deleting {}'.format(remote_file)) # debug
@@ -227,9 +346,11 @@ class WebDAV(Relay, Client):
                     self.logger.debug('retrying on error: %s', e)
                     continue
             break
+        self.usage.remove(remote_file)
 
     def purge(self, remote_dir=''):
         self.rmdir(remote_dir)
+        self.usage.reset()
 
     def acquireLock(self, remote_file, mode=None, blocking=True):
         while True:
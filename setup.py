@@ -14,7 +14,8 @@ extras_require = {
     'WebDAV':    ['requests', 'pyopenssl'],
 #    'SSH':        ['paramiko'],
     'Blowfish':    ['cryptography'],
-    'Fernet':    ['cryptography']}
+    'Fernet':    ['cryptography'],
+    'xxHash':    ['xxhash']}
 
 if sys.version_info[0] == 3: # Python 3
     try: